@@ -1,13 +1,16 @@
 import time
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 
+from lib.database.data_store import DataStore
 from lib.database.querier import Querier
 from lib.nlg.answer_generator import AnswerGenerator
 from lib.nlu.message import MessageBuilder
 from lib.spacy_components.custom_spacy import CustomSpacy
+from lib.util import metrics
 from lib.util.logger import ServerLogger, MessageLogger
+from lib.util.profiling import RequestProfiler
 from lib.database.dataset_updater import DatasetUpdater
 import threading
 
@@ -15,13 +18,14 @@ app = Flask(__name__)
 cors = CORS(app)
 
 message_builder: MessageBuilder = MessageBuilder()
-querier: Querier = Querier()
+querier: Querier = Querier(data_store=DataStore())
 answer_generator: AnswerGenerator = AnswerGenerator()
 spacy = CustomSpacy.get_spacy()
 server_logger: ServerLogger = ServerLogger(__name__)
 server_logger.info("Successfully started the web server... Starting listening to requests now.")
 message_logger: MessageLogger = MessageLogger(__name__)
 dataset_updater: DatasetUpdater = DatasetUpdater()
+profiler: RequestProfiler = RequestProfiler()
 
 
 def start_dataset_updater_loop():
@@ -35,22 +39,38 @@ t1 = threading.Thread(target=start_dataset_updater_loop)
 t1.start()
 
 
+@app.route('/metrics')
+def get_metrics():
+    """Exposes the latency histograms and counters of this worker in the Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype=metrics.content_type)
+
+
 @app.route('/')
+@metrics.timed("request")
 def get_reply():  # put application's code here
     raw_message: str = request.args.get("msg", default="")
     try:
-        server_logger.info(f"Received a new message {raw_message.__repr__()}.")
-        message = message_builder.create_message(spacy(raw_message)[:])
-        server_logger.info(f"Successfully converted the message to {message}.")
-        query_result = querier.query_intent(message)
-        server_logger.info(f"Successfully queried the message with the result {query_result}.")
-        answer = answer_generator.generate_answer(query_result)
-        server_logger.info(f"Successfully generated the answer {answer.__repr__()}.")
-        message_logger.info(f"QUERY: {raw_message}; ANSWER: {answer}")
-        return jsonify({"msg": answer})
+        server_logger.info("Received a new message %r.", raw_message)
+        with profiler.profile(raw_message, request.headers.get(RequestProfiler.header)) as profile_id:
+            # CoreNLP only needs the text, so it can look for the dates while spaCy parses the message.
+            message_builder.prefetch(raw_message)
+            with metrics.time_stage("spacy"):
+                doc = spacy(raw_message)
+            messages = message_builder.create_messages(doc[:])
+            server_logger.info("Successfully converted the message to %s.", messages)
+            query_results = querier.query_intents(messages)
+            server_logger.info("Successfully queried the messages with the results %s.", query_results)
+            answer = answer_generator.generate_answers(query_results)
+            server_logger.info("Successfully generated the answer %r.", answer)
+        message_logger.info("QUERY: %s; ANSWER: %s", raw_message, answer)
+        response = jsonify({"msg": answer})
+        if profile_id:
+            # Allows finding the saved profile of this request.
+            response.headers["X-Covbot-Profile-Id"] = profile_id
+        return response
     except Exception:
-        server_logger.exception(f"Error occurred while processing the message {raw_message.__repr__()}")
-        message_logger.info(f"QUERY: {raw_message}; ANSWER: ERROR")
+        server_logger.exception("Error occurred while processing the message %r", raw_message)
+        message_logger.info("QUERY: %s; ANSWER: ERROR", raw_message)
         raise
 
 
@@ -1,26 +1,53 @@
+""" Bulk answering script
+
+Without arguments, this script answers the queries in tests/annotated_queries.json one after another and prints
+them together with their answers.
+
+With --input, it answers all queries from a JSONL, CSV or JSON file on a pool of worker processes and streams one
+JSON line per query ({query, messages, result_codes, answer, timings}) to --output, in the order of the input. A query
+with several questions has one message and one result code per question.
+With --resume, the queries that already have a record in the output are skipped.
+
+Example: python bulk_app.py --input logged_queries.jsonl --output answers.jsonl --workers 8 --resume
+"""
+import argparse
 import json
+import os
 import pathlib
+from datetime import date
 
-from lib.database.querier import Querier
-from lib.nlg.answer_generator import AnswerGenerator
-from lib.nlu.message import MessageBuilder
-from lib.spacy_components.custom_spacy import get_spacy
+from lib.benchmark.bulk import run_bulk, QueryAnswerer
 
-message_builder = MessageBuilder()
-querier = Querier()
-answer_generator = AnswerGenerator()
-spacy = get_spacy()
 
-if __name__ == '__main__':
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Answers many queries at once.")
+    parser.add_argument("--input", type=pathlib.Path, help="JSONL, CSV or JSON file containing the queries.")
+    parser.add_argument("--output", type=pathlib.Path, default=pathlib.Path("answers.jsonl"),
+                        help="JSONL file to write the answers to.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Number of queries sent to a worker at once.")
+    parser.add_argument("--resume", action="store_true", help="Continue a run that was interrupted.")
+    parser.add_argument("--db-name", default="covbot")
+    parser.add_argument("--today", type=date.fromisoformat, help="Answer the queries as if it was this day.")
+    parser.add_argument("--quiet", action="store_true", help="Don't show the progress.")
+    return parser.parse_args()
+
+
+def answer_annotated_queries() -> None:
     with open(pathlib.Path.cwd() / "tests" / "annotated_queries.json") as query_file:
         queries = json.load(query_file)
-    sentences = [query["query"] for query in queries]
-
-    for sentence in sentences:
-        print(sentence)
-        new_sent = spacy(sentence)[:]
-        message = message_builder.create_message(new_sent)
-        query_result = querier.query_intent(message)
-        answer = answer_generator.generate_answer(query_result)
-        print(answer)
-        print()
\ No newline at end of file
+
+    answerer = QueryAnswerer()
+    for query in queries:
+        print(query["query"])
+        print(answerer.answer(query["query"])["answer"])
+        print()
+
+
+if __name__ == '__main__':
+    arguments: argparse.Namespace = parse_arguments()
+    if arguments.input is None:
+        answer_annotated_queries()
+    else:
+        run_bulk(arguments.input, arguments.output, arguments.workers, arguments.db_name, arguments.today,
+                 arguments.resume, arguments.chunk_size, not arguments.quiet)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import copy
+import random
+import re
+from typing import List, Dict, Any, Optional
+
+from lib.nlu.slot.location import Location
+
+
+class QueryAugmenter:
+    """Class that creates variants of annotated queries which keep their annotations, to train the IntentClassifier.
+
+    A variant replaces the country of the query with another country, the date with another date of the same type
+    (e.g. "the past week" with "last week") and words of the topic with synonyms (e.g. "vaccinations" with "jabs").
+    None of the replacements changes the topic or the intent, so the annotations stay valid, only the slots are
+    updated. The variants keep the id of the query, so that they can be kept in the same fold as the original.
+    """
+    # Dates that can replace each other without changing the type of the date or the intent of the query.
+    date_groups: List[List[str]] = [
+        ["today", "yesterday"],
+        ["this week", "last week", "the past week", "the last week"],
+        ["this month", "last month", "the past month", "the last month"],
+        ["this year", "last year", "the past year", "the last year"],
+        ["2020", "2021", "2022"],
+    ]
+    synonym_groups: List[List[str]] = [
+        ["cases", "infections"],
+        ["vaccinations", "vaccines", "jabs", "shots", "inoculations", "immunizations"],
+        ["people", "persons", "individuals"],
+    ]
+
+    def __init__(self, seed: int = 0):
+        self._random: random.Random = random.Random(seed)
+        self._countries: List[str] = sorted(Location.get_countries())
+
+    def augment(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates a single variant of an annotated query."""
+        variant: Dict[str, Any] = copy.deepcopy(query)
+        self._replace_location(variant)
+        self._replace_date(variant)
+        for group in self.synonym_groups:
+            variant["query"] = self._replace_words(variant["query"], group, self._random.choice(group))
+        return variant
+
+    def augment_many(self, queries: List[Dict[str, Any]], count: int) -> List[Dict[str, Any]]:
+        """Creates count variants of each query, the duplicates are dropped."""
+        variants: List[Dict[str, Any]] = []
+        for query in queries:
+            texts: set = {query["query"]}
+            for _ in range(count):
+                variant: Dict[str, Any] = self.augment(query)
+                if variant["query"] not in texts:
+                    texts.add(variant["query"])
+                    variants.append(variant)
+        return variants
+
+    def _replace_location(self, query: Dict[str, Any]) -> None:
+        location: Optional[str] = query["slots"]["location"]
+        if location is None or location not in Location.get_countries():
+            return
+        match: Optional[re.Match] = re.search(rf"\b{re.escape(location)}\b", query["query"], re.IGNORECASE)
+        # E.g. "the UK" is annotated as "united kingdom", so the location can't always be found in the query.
+        if match is None:
+            return
+        country: str = self._random.choice(self._countries)
+        replacement: str = country if match.group().islower() else \
+            " ".join(word if word in ["and", "of", "the"] else word.capitalize() for word in country.split())
+        query["query"] = query["query"][:match.start()] + replacement + query["query"][match.end():]
+        query["slots"]["location"] = country
+
+    def _replace_date(self, query: Dict[str, Any]) -> None:
+        timeframe: Optional[Dict[str, str]] = query["slots"]["timeframe"]
+        if timeframe is None:
+            return
+        for group in self.date_groups:
+            if timeframe["text"].lower() in group:
+                replacement: str = self._random.choice(group)
+                if timeframe["text"][0].isupper():
+                    replacement = replacement[0].upper() + replacement[1:]
+                query["query"] = query["query"].replace(timeframe["text"], replacement, 1)
+                timeframe["text"] = replacement
+                return
+
+    @staticmethod
+    def _replace_words(text: str, group: List[str], replacement: str) -> str:
+        """Replaces every word of the group in the text, keeping an upper case first letter."""
+        def replace(match: re.Match) -> str:
+            return replacement[0].upper() + replacement[1:] if match.group()[0].isupper() else replacement
+        return re.sub(r"\b(" + "|".join(group) + r")\b", replace, text, flags=re.IGNORECASE)
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import csv
+import json
+import multiprocessing
+import os
+import pathlib
+import sys
+import time
+from datetime import date
+from typing import Iterator, Optional, Dict, Any, TextIO, Iterable, List
+
+from lib.database.data_store import DataStore
+from lib.database.querier import Querier, QueryResult
+from lib.nlg.answer_generator import AnswerGenerator
+from lib.nlu.message import MessageBuilder, Message
+from lib.spacy_components.custom_spacy import get_spacy
+
+
+def read_queries(path: pathlib.Path) -> Iterator[str]:
+    """Streams the queries from a file.
+
+    JSONL files contain one query per line, either as a string or as an object with a "query" field. CSV files need a
+    "query" column. JSON files are expected to be in the format of tests/annotated_queries.json.
+    """
+    if path.suffix == ".csv":
+        with open(path, newline="", encoding="utf-8") as query_file:
+            for row in csv.DictReader(query_file):
+                yield row["query"]
+    elif path.suffix == ".json":
+        with open(path, encoding="utf-8") as query_file:
+            for query in json.load(query_file):
+                yield query["query"]
+    else:
+        with open(path, encoding="utf-8") as query_file:
+            for line in query_file:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry if isinstance(entry, str) else entry["query"]
+
+
+def serialize_message(message: Message) -> Dict[str, Any]:
+    """Converts a message into the format used in tests/annotated_queries.json."""
+    def name(value) -> Optional[str]:
+        return value.name if value is not None else None
+
+    timeframe: Optional[dict] = None
+    if message.slots.date is not None:
+        timeframe = {"type": message.slots.date.type, "text": message.slots.date.text,
+                     "value": message.slots.date.value.isoformat()}
+        if message.slots.date.end is not None:
+            timeframe["end"] = message.slots.date.end.isoformat()
+
+    return {
+        "topic": name(message.topic),
+        "intent": {
+            "calculation_type": name(message.intent.calculation_type),
+            "value_type": name(message.intent.value_type),
+            "value_domain": name(message.intent.value_domain),
+            "measurement_type": name(message.intent.measurement_type),
+        },
+        "slots": {"timeframe": timeframe, "location": message.slots.location},
+    }
+
+
+class QueryAnswerer:
+    """Class that answers single queries the same way the web server does and records the time of each stage.
+    A query can contain several questions, each of them gets its own message and result code in the record.
+    """
+    def __init__(self, db_name: str = "covbot", today: Optional[date] = None, querier: Optional[Querier] = None):
+        self.today: Optional[date] = today
+        self.spacy = get_spacy()
+        self.message_builder: MessageBuilder = MessageBuilder()
+        self.querier: Querier = querier or Querier(db_name, data_store=DataStore(db_name))
+        self.answer_generator: AnswerGenerator = AnswerGenerator()
+
+    def answer(self, query: str) -> Dict[str, Any]:
+        """Answers a query and returns the record with the messages, the result codes, the answer and the timings."""
+        timings: Dict[str, float] = {}
+        record: Dict[str, Any] = {"query": query, "messages": None, "result_codes": None, "answer": None}
+        start: float = time.perf_counter()
+        last: float = start
+
+        def lap(stage: str) -> None:
+            nonlocal last
+            now: float = time.perf_counter()
+            timings[stage] = round((now - last) * 1000, 3)
+            last = now
+
+        try:
+            self.message_builder.prefetch(query)
+            span = self.spacy(query)[:]
+            lap("spacy_ms")
+            messages: List[Message] = self.message_builder.create_messages(span)
+            record["messages"] = [serialize_message(message) for message in messages]
+            lap("message_ms")
+            query_results: List[QueryResult] = self.querier.query_intents(messages, self.today)
+            record["result_codes"] = [query_result.result_code.name for query_result in query_results]
+            lap("query_ms")
+            record["answer"] = self.answer_generator.generate_answers(query_results)
+            lap("answer_ms")
+        except Exception as exception:
+            # A single broken query shouldn't stop a run over tens of thousands of queries.
+            record["error"] = f"{type(exception).__name__}: {exception}"
+
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        record["timings"] = timings
+        return record
+
+
+# Every worker process has its own answerer, and with it its own spaCy instance and database connection.
+_worker_answerer: Optional[QueryAnswerer] = None
+
+
+def _initialize_worker(db_name: str, today: Optional[date]) -> None:
+    global _worker_answerer
+    _worker_answerer = QueryAnswerer(db_name, today)
+
+
+def _answer_in_worker(query: str) -> Dict[str, Any]:
+    return _worker_answerer.answer(query)
+
+
+def prepare_output(path: pathlib.Path, resume: bool) -> int:
+    """Prepares the output file and returns the number of records that are already in it.
+
+    When resuming, an incomplete last line (from a run that was killed while writing) is removed. Otherwise the
+    output file is emptied.
+    """
+    if not resume or not path.exists():
+        path.write_text("", encoding="utf-8")
+        return 0
+
+    with open(path, "rb+") as output_file:
+        content: bytes = output_file.read()
+        complete_length: int = content.rfind(b"\n") + 1
+        output_file.truncate(complete_length)
+    return content[:complete_length].count(b"\n")
+
+
+class Progress:
+    """Class that shows the progress of a bulk run on a single line."""
+    def __init__(self, total: Optional[int], stream: TextIO = sys.stderr, interval: float = 0.5):
+        self.total: Optional[int] = total
+        self.done: int = 0
+        self.errors: int = 0
+        self._stream: TextIO = stream
+        self._interval: float = interval
+        self._start: float = time.perf_counter()
+        self._last_shown: float = 0.0
+
+    def update(self, record: Dict[str, Any]) -> None:
+        self.done += 1
+        if "error" in record:
+            self.errors += 1
+        if time.perf_counter() - self._last_shown >= self._interval:
+            self.show()
+
+    def show(self, end: str = "") -> None:
+        self._last_shown = time.perf_counter()
+        rate: float = self.done / max(self._last_shown - self._start, 1e-9)
+        line: str = f"\r{self.done}" + (f"/{self.total}" if self.total is not None else "") + \
+                    f" queries, {rate:.1f}/s, {self.errors} errors"
+        if self.total is not None and rate > 0:
+            line += f", {(self.total - self.done) / rate:.0f}s left"
+        self._stream.write(line + end)
+        self._stream.flush()
+
+
+def run_bulk(input_path: pathlib.Path, output_path: pathlib.Path, workers: int = os.cpu_count() or 1,
+             db_name: str = "covbot", today: Optional[date] = None, resume: bool = False, chunk_size: int = 16,
+             show_progress: bool = True) -> int:
+    """Answers all queries from the input file and streams the records to the output file as JSON lines.
+
+    The records are written in the order of the input, so a run can be resumed by skipping as many queries as
+    there are records in the output. Returns the number of records written in this run.
+    """
+    skipped: int = prepare_output(output_path, resume)
+    total: int = sum(1 for _ in read_queries(input_path)) - skipped
+    queries: Iterable[str] = (query for index, query in enumerate(read_queries(input_path)) if index >= skipped)
+    progress: Progress = Progress(total) if show_progress else None
+
+    with open(output_path, "a", encoding="utf-8") as output_file:
+        def write(records: Iterable[Dict[str, Any]]) -> int:
+            written: int = 0
+            for record in records:
+                output_file.write(json.dumps(record) + "\n")
+                # Flushing every record keeps the output resumable at any point.
+                output_file.flush()
+                written += 1
+                if progress:
+                    progress.update(record)
+            return written
+
+        if workers <= 1:
+            answerer: QueryAnswerer = QueryAnswerer(db_name, today)
+            written: int = write(answerer.answer(query) for query in queries)
+        else:
+            with multiprocessing.Pool(workers, _initialize_worker, (db_name, today)) as pool:
+                written: int = write(pool.imap(_answer_in_worker, queries, chunk_size))
+
+    if progress:
+        progress.show(end="\n")
+    return written
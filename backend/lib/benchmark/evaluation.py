@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import multiprocessing
+import time
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+from lib.benchmark.bulk import serialize_message
+from lib.benchmark.statistics import summarize
+from lib.nlu.message import MessageBuilder
+from lib.spacy_components.custom_spacy import get_spacy
+
+# The fields of a message that are compared with the annotations.
+evaluated_fields: List[str] = ["topic", "calculation_type", "value_type", "value_domain", "measurement_type",
+                               "date_type", "location"]
+
+
+def get_evaluated_fields(message: Dict[str, Any]) -> Dict[str, str]:
+    """Extracts the evaluated fields from an annotated query or a serialized message. Missing values become "NONE"."""
+    timeframe: Optional[dict] = message["slots"]["timeframe"]
+    fields: Dict[str, Optional[str]] = {
+        "topic": message["topic"],
+        **{field: message["intent"][field] for field in ["calculation_type", "value_type", "value_domain",
+                                                         "measurement_type"]},
+        "date_type": timeframe["type"] if timeframe else None,
+        "location": message["slots"]["location"].lower() if message["slots"]["location"] else None,
+    }
+    return {field: value if value is not None else "NONE" for field, value in fields.items()}
+
+
+class ConfusionMatrix:
+    """Class that counts how often each gold label was predicted as each label."""
+    def __init__(self):
+        self.counts: Counter = Counter()
+
+    def add(self, gold: str, predicted: str) -> None:
+        self.counts[(gold, predicted)] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def accuracy(self) -> float:
+        correct: int = sum(count for (gold, predicted), count in self.counts.items() if gold == predicted)
+        return correct / self.total if self.total > 0 else 0.0
+
+    @property
+    def labels(self) -> List[str]:
+        return sorted({label for pair in self.counts for label in pair})
+
+    def confusions(self) -> List[Tuple[str, str, int]]:
+        """Returns the (gold, predicted, count) of all wrong predictions, the most frequent ones first."""
+        return sorted(((gold, predicted, count) for (gold, predicted), count in self.counts.items()
+                       if gold != predicted), key=lambda confusion: (-confusion[2], confusion[0], confusion[1]))
+
+    def render(self, max_labels: int = 8) -> str:
+        """Renders the matrix with the gold labels as rows, or only the confusions if there are too many labels."""
+        labels: List[str] = self.labels
+        if len(labels) > max_labels:
+            return "\n".join(f"  {gold} -> {predicted}: {count}" for gold, predicted, count in self.confusions()) \
+                   or "  no confusions"
+
+        width: int = max(len(label) for label in labels) + 2
+        lines: List[str] = [" " * width + "".join(f"{label:>{width}}" for label in labels)]
+        for gold in labels:
+            lines.append(f"{gold:<{width}}" + "".join(f"{self.counts[(gold, predicted)]:>{width}}"
+                                                      for predicted in labels))
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"accuracy": self.accuracy, "total": self.total,
+                "counts": [{"gold": gold, "predicted": predicted, "count": count}
+                           for (gold, predicted), count in sorted(self.counts.items())]}
+
+
+# Every worker process has its own spaCy instance and message builder.
+_worker_message_builder: Optional[MessageBuilder] = None
+
+
+def _initialize_worker() -> None:
+    global _worker_message_builder
+    _worker_message_builder = MessageBuilder()
+    get_spacy()
+
+
+def _build_message_in_worker(query: str) -> Tuple[Optional[Dict[str, Any]], float, Optional[str]]:
+    start: float = time.perf_counter()
+    try:
+        message: Dict[str, Any] = serialize_message(_worker_message_builder.create_message(get_spacy()(query)[:]))
+        return message, time.perf_counter() - start, None
+    except Exception as exception:
+        return None, time.perf_counter() - start, f"{type(exception).__name__}: {exception}"
+
+
+class NluEvaluation:
+    """Class that compares the messages built by the MessageBuilder with the annotations of the queries.
+
+    The queries are processed on a pool of worker processes. For each of the evaluated fields, a confusion matrix is
+    built. The latency of each query covers the whole NLU (spaCy and the MessageBuilder), as seen by the worker.
+    """
+    def __init__(self, workers: int = 1):
+        self.workers: int = workers
+
+    def run(self, annotated_queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Evaluates the annotated queries and returns the accuracies, confusion matrices and latencies."""
+        queries: List[str] = [query["query"] for query in annotated_queries]
+        start: float = time.perf_counter()
+        if self.workers <= 1:
+            _initialize_worker()
+            outcomes: List[tuple] = [_build_message_in_worker(query) for query in queries]
+        else:
+            with multiprocessing.Pool(self.workers, _initialize_worker) as pool:
+                outcomes = pool.map(_build_message_in_worker, queries)
+        wall_time: float = time.perf_counter() - start
+
+        matrices: Dict[str, ConfusionMatrix] = {field: ConfusionMatrix() for field in evaluated_fields}
+        results: List[Dict[str, Any]] = []
+        for annotated_query, (message, duration, error) in zip(annotated_queries, outcomes):
+            gold: Dict[str, str] = get_evaluated_fields(annotated_query)
+            predicted: Dict[str, str] = get_evaluated_fields(message) if message else \
+                {field: "ERROR" for field in evaluated_fields}
+            for field in evaluated_fields:
+                matrices[field].add(gold[field], predicted[field])
+            results.append({
+                "id": annotated_query.get("id"),
+                "query": annotated_query["query"],
+                "latency_ms": duration * 1000,
+                "error": error,
+                "mismatches": {field: {"gold": gold[field], "predicted": predicted[field]}
+                               for field in evaluated_fields if gold[field] != predicted[field]},
+            })
+
+        return {
+            "accuracy": {field: matrix.accuracy for field, matrix in matrices.items()},
+            "exact_match": sum(1 for result in results if not result["mismatches"]) / len(results) if results else 0.0,
+            "confusion_matrices": matrices,
+            "latency": summarize([result["latency_ms"] / 1000 for result in results], wall_time),
+            "queries": results,
+        }
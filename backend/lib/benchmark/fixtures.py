@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import os
+import pathlib
+from datetime import date
+from typing import List, Tuple, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from lib.database.database_manager import DatabaseManager
+
+# The day all recorded CoreNLP responses and the fixture data are based on. The queries are answered as if
+# this was the current day, so that relative dates such as "yesterday" always refer to the same data.
+reference_date: date = date(2022, 2, 24)
+
+# The locations mentioned in the annotated queries, plus the aggregates that are included in the OWID data.
+fixture_locations: List[str] = [
+    "Austria", "Belgium", "China", "Denmark", "Egypt", "England", "Finland", "France", "Germany", "Hong Kong",
+    "Hungary", "Italy", "Russia", "Saudi Arabia", "Serbia", "Spain", "Uganda", "Ukraine", "United Kingdom",
+    "United States", "Africa", "Asia", "Europe", "European Union", "North America", "South America", "World"
+]
+
+
+def create_fixture_datasets(directory: pathlib.Path, seed: int = 0) -> Tuple[pathlib.Path, pathlib.Path]:
+    """Writes deterministic, synthetic data files in the same format as the ones published by OWID.
+
+    The cases are written in the wide format of new_cases.csv (one column per location), the vaccinations in the
+    long format of vaccinations.csv (one row per location and day). Returns the paths of both files.
+    """
+    random_state: np.random.RandomState = np.random.RandomState(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    case_dates: pd.DatetimeIndex = pd.date_range("2020-01-22", reference_date)
+    days: np.ndarray = np.arange(len(case_dates))
+    cases: DataFrame = DataFrame({"date": case_dates.strftime("%Y-%m-%d")})
+    for index, location in enumerate(fixture_locations):
+        scale: float = random_state.uniform(100, 5000) * (20 if location in ["World", "Europe", "Asia"] else 1)
+        # A few waves of infections with some noise on top of it.
+        waves: np.ndarray = np.sin(days / 60 + index) ** 2 + np.exp((days - len(days)) / 40) * 4
+        daily: np.ndarray = np.round(scale * waves * random_state.uniform(0.7, 1.3, len(days)))
+        # The source data contains missing days, which need to be handled by the data pipeline.
+        daily[random_state.uniform(size=len(days)) < 0.03] = np.nan
+        cases[location] = daily
+
+    vaccination_dates: pd.DatetimeIndex = pd.date_range("2020-12-08", reference_date - pd.Timedelta(days=1))
+    vaccinations: List[DataFrame] = []
+    for location in fixture_locations:
+        scale = random_state.uniform(1000, 50000)
+        daily_vaccinations: np.ndarray = np.round(scale * random_state.uniform(0.5, 1.5, len(vaccination_dates)))
+        daily_people_vaccinated: np.ndarray = np.round(daily_vaccinations * random_state.uniform(0.3, 0.9))
+        vaccinations.append(DataFrame({
+            "location": location,
+            "date": vaccination_dates.strftime("%Y-%m-%d"),
+            "total_vaccinations": np.cumsum(daily_vaccinations),
+            "people_vaccinated": np.cumsum(daily_people_vaccinated),
+            "daily_vaccinations": daily_vaccinations,
+            "daily_people_vaccinated": daily_people_vaccinated
+        }))
+
+    cases_path: pathlib.Path = directory / "new_cases.csv"
+    vaccinations_path: pathlib.Path = directory / "vaccinations.csv"
+    cases.to_csv(cases_path, index=False)
+    pd.concat(vaccinations).to_csv(vaccinations_path, index=False)
+
+    return cases_path, vaccinations_path
+
+
+def create_fixture_database(db_name: str, directory: pathlib.Path, seed: int = 0) -> DatabaseManager:
+    """Creates a database with the given name that is filled with the fixture datasets."""
+    cases_path, vaccinations_path = create_fixture_datasets(directory, seed)
+    paths: Dict[str, str] = {"COVBOT_CASES_PATH": str(cases_path), "COVBOT_VACCINATIONS_PATH": str(vaccinations_path)}
+    # The datasets are read from the paths in the environment, which are restored afterwards, so that the fixture
+    # data doesn't leak into later tests or benchmarks of the same process.
+    previous_paths: Dict[str, Optional[str]] = {variable: os.environ.get(variable) for variable in paths}
+    os.environ.update(paths)
+    try:
+        db_manager: DatabaseManager = DatabaseManager(db_name)
+        db_manager.update_database()
+    finally:
+        for variable, previous_path in previous_paths.items():
+            if previous_path is None:
+                os.environ.pop(variable, None)
+            else:
+                os.environ[variable] = previous_path
+    return db_manager
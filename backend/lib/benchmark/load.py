@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import itertools
+import random
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Dict, Iterator
+
+import requests
+
+from lib.benchmark.statistics import summarize
+from lib.nlu.slot.location import Location
+
+_logged_query_pattern: re.Pattern = re.compile(r"QUERY: (.*?); ANSWER: ")
+
+
+def load_logged_queries(path) -> List[str]:
+    """Extracts the queries from the "QUERY: ...; ANSWER: ..." lines written by the MessageLogger."""
+    queries: List[str] = []
+    with open(path, encoding="utf-8") as log_file:
+        for line in log_file:
+            match: Optional[re.Match] = _logged_query_pattern.search(line)
+            if match and match.group(1).strip():
+                queries.append(match.group(1))
+    return queries
+
+
+class SyntheticQueryGenerator:
+    """Class that generates questions by combining topics, question types, locations and relative dates."""
+    topics: List[str] = ["new cases", "positive cases", "infections", "positive tests", "covid cases",
+                         "vaccinations", "vaccines administered", "vaccine shots", "people vaccinated"]
+    dates: List[str] = ["today", "yesterday", "3 days ago", "a week ago", "this week", "last week", "this month",
+                        "last month", "this year", "last year", "in 2021", "on the 2nd of February 2022"]
+    templates: List[str] = [
+        "How many {topic} were there in {location} {date}?",
+        "How many {topic} in {location} {date}",
+        "What is the number of {topic} in {location} {date}?",
+        "How many {topic} have there been in {location} so far?",
+        "What was the highest number of {topic} in {location} {date}?",
+        "What was the lowest number of {topic} in {location} {date}?",
+        "When were the most {topic} recorded in {location}?",
+        "On which day were the fewest {topic} reported in {location}?",
+        "Which country had the most {topic} {date}?",
+        "Where were the least {topic} reported {date}?",
+    ]
+
+    def __init__(self, seed: int = 0):
+        self._random: random.Random = random.Random(seed)
+        self._locations: List[str] = sorted(location.title() for location in Location.get_countries())
+
+    def generate(self) -> str:
+        """Generates a single question."""
+        return self._random.choice(self.templates).format(topic=self._random.choice(self.topics),
+                                                          location=self._random.choice(self._locations),
+                                                          date=self._random.choice(self.dates))
+
+    def generate_many(self, count: int) -> List[str]:
+        """Generates a list of questions."""
+        return [self.generate() for _ in range(count)]
+
+
+@dataclass
+class RequestResult:
+    """Class representing the outcome of a single request.
+    latency: Time from the moment the request was sent until the response was received, in seconds.
+    queue_delay: Time the request waited in the client after it was scheduled and before it was sent, in seconds.
+    status: The HTTP status code, or None if no response was received.
+    error: The type of the error for failed requests.
+    """
+    latency: float
+    queue_delay: float
+    status: Optional[int]
+    error: Optional[str]
+
+
+class LoadGenerator:
+    """Class that sends questions to the GET / endpoint of the web server and measures the responses.
+
+    With a rate, the requests arrive in an open loop: they are scheduled independently of how fast the server
+    answers (with exponentially distributed gaps for poisson arrivals, evenly spaced otherwise). At most concurrency
+    requests are in flight, the others wait in the client until a connection is free. The latency is measured from
+    the moment a request is sent, and the time it waited in the client is reported separately as the queue delay,
+    so that a client that can't keep up with the rate isn't mistaken for a slow server.
+    Without a rate, each of the concurrent clients sends the next request as soon as it got an answer.
+    """
+    def __init__(self, url: str, queries: List[str], concurrency: int = 8, timeout: float = 30, seed: int = 0):
+        self.url: str = url
+        self.queries: List[str] = queries
+        self.concurrency: int = concurrency
+        self.timeout: float = timeout
+        self._random: random.Random = random.Random(seed)
+        self._local: threading.local = threading.local()
+
+    def run(self, duration: float, rate: Optional[float] = None, arrival: str = "poisson") -> Dict[str, object]:
+        """Generates load for the given duration (in seconds) and returns the summary of the run."""
+        results: List[RequestResult] = []
+        results_lock: threading.Lock = threading.Lock()
+
+        def send(query: str, scheduled: float) -> None:
+            result: RequestResult = self._send(query, scheduled)
+            with results_lock:
+                results.append(result)
+
+        start: float = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            if rate is None:
+                def client() -> None:
+                    while time.perf_counter() - start < duration:
+                        send(self._random.choice(self.queries), time.perf_counter())
+                for _ in range(self.concurrency):
+                    executor.submit(client)
+            else:
+                for scheduled in self._schedule(start, duration, rate, arrival):
+                    time.sleep(max(0.0, scheduled - time.perf_counter()))
+                    executor.submit(send, self._random.choice(self.queries), scheduled)
+        wall_time: float = time.perf_counter() - start
+
+        latencies: List[float] = [result.latency for result in results if result.error is None]
+        queue_delays: Dict[str, float] = summarize([result.queue_delay for result in results])
+        errors: Counter = Counter(result.error for result in results if result.error is not None)
+        return {
+            "rate": rate,
+            "concurrency": self.concurrency,
+            "requests": len(results),
+            "error_rate": sum(errors.values()) / len(results) if results else 0.0,
+            "errors": dict(errors),
+            **summarize(latencies, wall_time),
+            **{f"queue_delay_{metric}": queue_delays[metric] for metric in ["mean_ms", "p50_ms", "p95_ms", "p99_ms"]},
+        }
+
+    def _schedule(self, start: float, duration: float, rate: float, arrival: str) -> Iterator[float]:
+        """Yields the points in time at which requests should be sent."""
+        offset: float = 0.0
+        for index in itertools.count(1):
+            # The uniform offsets are computed from the index, adding them up would let rounding errors decide
+            # whether the last request still falls into the duration.
+            offset = offset + self._random.expovariate(rate) if arrival == "poisson" else index / rate
+            if offset >= duration:
+                return
+            yield start + offset
+
+    def _send(self, query: str, scheduled: float) -> RequestResult:
+        """Sends a single question to the server."""
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        sent: float = time.perf_counter()
+        queue_delay: float = max(0.0, sent - scheduled)
+        try:
+            response: requests.Response = self._local.session.get(self.url, params={"msg": query},
+                                                                  timeout=self.timeout)
+        except requests.Timeout:
+            return RequestResult(time.perf_counter() - sent, queue_delay, None, "timeout")
+        except requests.RequestException as exception:
+            return RequestResult(time.perf_counter() - sent, queue_delay, None, type(exception).__name__)
+
+        latency: float = time.perf_counter() - sent
+        if response.status_code != 200:
+            return RequestResult(latency, queue_delay, response.status_code, f"HTTP {response.status_code}")
+        return RequestResult(latency, queue_delay, response.status_code, None)
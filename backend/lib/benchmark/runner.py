@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import csv
+import json
+import pathlib
+import time
+from collections import defaultdict
+from datetime import date
+from typing import List, Dict, Callable, Any
+
+from lib.benchmark.statistics import summarize
+from lib.database.querier import Querier, QueryResult
+from lib.nlg.answer_generator import AnswerGenerator
+from lib.nlu.intent import IntentRecognizer
+from lib.nlu.message import MessageBuilder, Message
+from lib.nlu.slot import SlotsFiller
+from lib.nlu.slot.date import DateRecognizer
+from lib.nlu.topic import TopicRecognizer
+from lib.spacy_components.custom_spacy import get_spacy
+
+
+def load_annotated_queries(path: pathlib.Path) -> List[str]:
+    """Loads the queries from a file in the format of tests/annotated_queries.json."""
+    with open(path) as query_file:
+        return [query["query"] for query in json.load(query_file)]
+
+
+def load_evaluation_queries(path: pathlib.Path) -> List[str]:
+    """Loads the queries from a file in the format of evaluation_queries.csv."""
+    with open(path, newline="") as query_file:
+        return [row["query"] for row in csv.DictReader(query_file)]
+
+
+class PipelineBenchmark:
+    """Class that runs each stage of the pipeline, as well as the whole pipeline, over a list of queries.
+
+    The stages are timed in isolation, each one with the output of the previous stages as its input:
+    spacy (parsing), topic, intent, slots, corenlp (a single uncached date request), message (the whole NLU),
+    query and answer. The end_to_end stage runs everything from the raw query to the answer.
+    """
+    stages: List[str] = ["spacy", "topic", "intent", "slots", "corenlp", "message", "query", "answer", "end_to_end"]
+
+    def __init__(self, db_name: str, today: date):
+        self.today: date = today
+        self.spacy = get_spacy()
+        self.querier: Querier = Querier(db_name)
+        self.answer_generator: AnswerGenerator = AnswerGenerator()
+        # Queries for which one of the stages raised an exception, these are skipped from then on.
+        self.failed_queries: List[str] = []
+
+    def run(self, queries: List[str], repeat: int = 1, warmup: int = 5) -> Dict[str, Dict[str, float]]:
+        """Runs the benchmark and returns the summary (throughput and latency percentiles) of each stage."""
+        durations: Dict[str, List[float]] = defaultdict(list)
+
+        # The first calls are a lot slower (lazy loading, caches of spaCy and SQLite), so they are not measured.
+        self._run_pass(queries[:warmup], defaultdict(list))
+        for _ in range(repeat):
+            self._run_pass(queries, durations)
+
+        return {stage: summarize(durations[stage]) for stage in self.stages}
+
+    def _run_pass(self, queries: List[str], durations: Dict[str, List[float]]) -> None:
+        """Runs all stages once over all queries."""
+        # The recognizers are created for every pass, so that the cached CoreNLP responses from the previous
+        # pass don't make the later passes faster than a real request.
+        topic_recognizer: TopicRecognizer = TopicRecognizer()
+        intent_recognizer: IntentRecognizer = IntentRecognizer()
+        slots_filler: SlotsFiller = SlotsFiller()
+        date_recognizer: DateRecognizer = DateRecognizer()
+        message_builder: MessageBuilder = MessageBuilder()
+        end_to_end_message_builder: MessageBuilder = MessageBuilder()
+
+        def measure(stage: str, function: Callable, *args) -> Any:
+            start: float = time.perf_counter()
+            result: Any = function(*args)
+            durations[stage].append(time.perf_counter() - start)
+            return result
+
+        for query in queries:
+            if query in self.failed_queries:
+                continue
+            try:
+                span = measure("spacy", self.spacy, query)[:]
+                measure("topic", topic_recognizer.recognize_topic, span)
+                measure("intent", intent_recognizer.recognize_intent, span)
+                measure("slots", slots_filler.fill_slots, span)
+                measure("corenlp", date_recognizer.send_request, str(span))
+                message: Message = measure("message", message_builder.create_message, span)
+                query_result: QueryResult = measure("query", self.querier.query_intent, message, self.today)
+                measure("answer", self.answer_generator.generate_answer, query_result)
+                measure("end_to_end", self._answer, end_to_end_message_builder, query)
+            except Exception:
+                self.failed_queries.append(query)
+
+    def _answer(self, message_builder: MessageBuilder, query: str) -> str:
+        """Answers a query the same way the web server does."""
+        message_builder.prefetch(query)
+        message: Message = message_builder.create_message(self.spacy(query)[:])
+        return self.answer_generator.generate_answer(self.querier.query_intent(message, self.today))
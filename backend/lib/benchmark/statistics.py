@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import List, Dict
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Returns the q-th percentile (0 <= q <= 100) of the values, interpolating linearly between them."""
+    if len(values) == 0:
+        return math.nan
+    ordered: List[float] = sorted(values)
+    position: float = (len(ordered) - 1) * q / 100
+    lower: int = math.floor(position)
+    upper: int = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(durations: List[float], wall_time: float = None) -> Dict[str, float]:
+    """Summarizes a list of durations (in seconds) into the throughput and the latency percentiles.
+
+    If the wall time is not given, the throughput is calculated as if the calls had been made one after another.
+    """
+    wall_time = sum(durations) if wall_time is None else wall_time
+    return {
+        "count": len(durations),
+        "throughput_per_second": len(durations) / wall_time if wall_time > 0 else math.nan,
+        "mean_ms": sum(durations) / len(durations) * 1000 if durations else math.nan,
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p95_ms": percentile(durations, 95) * 1000,
+        "p99_ms": percentile(durations, 99) * 1000,
+    }
+
+
+@dataclass
+class Regression:
+    """Class representing a metric that got worse compared to a baseline run.
+    name: The name of the stage (or anything else that was measured).
+    metric: The metric that regressed, e.g. "p95_ms".
+    baseline: The value in the baseline run.
+    current: The value in the current run.
+    """
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+    def __str__(self):
+        change: float = (self.current - self.baseline) / self.baseline * 100 if self.baseline else math.inf
+        return f"{self.name}: {self.metric} went from {self.baseline:.3f} to {self.current:.3f} ({change:+.1f}%)"
+
+
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[Regression]:
+    """Compares the summaries of two runs and returns all metrics that got worse by more than the threshold.
+
+    The threshold is relative, e.g. 0.1 flags latencies that are more than 10% higher and throughputs that are more
+    than 10% lower than in the baseline. Names that only appear in one of the runs are ignored.
+    """
+    regressions: List[Regression] = []
+    for name in sorted(set(current).intersection(baseline)):
+        for metric in ["p50_ms", "p95_ms", "p99_ms"]:
+            if current[name][metric] > baseline[name][metric] * (1 + threshold):
+                regressions.append(Regression(name, metric, baseline[name][metric], current[name][metric]))
+        if current[name]["throughput_per_second"] < baseline[name]["throughput_per_second"] * (1 - threshold):
+            regressions.append(Regression(name, "throughput_per_second", baseline[name]["throughput_per_second"],
+                                          current[name]["throughput_per_second"]))
+    return regressions
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import os
+import pathlib
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, List, Optional, Type
+
+import yaml
+
+# The number of days of the rolling averages that are added to the daily columns.
+rolling_average_windows: List[int] = [7, 14]
+
+column_types: List[str] = ["Integer", "BigInteger", "Float"]
+shapes: List[str] = ["wide", "long"]
+
+
+@dataclass(frozen=True)
+class ValueDomainDefinition:
+    """Class representing a value domain of a dataset, as declared in datasets.yaml.
+    name: The name of the value domain, e.g. "POSITIVE_CASES".
+    daily_column: The column containing the daily values.
+    cumulative_column: The column containing the cumulative values.
+    trigger_words: Words that indicate that a question is about this value domain of the topic.
+    """
+    name: str
+    daily_column: str
+    cumulative_column: str
+    trigger_words: List[str]
+
+    @property
+    def trigger_pattern_name(self) -> str:
+        return f"{self.name.lower()}_trigger"
+
+    @property
+    def measurement_columns(self) -> Dict[str, str]:
+        """Maps the name of each measurement type to the column containing its values."""
+        return {
+            "DAILY": self.daily_column,
+            "CUMULATIVE": self.cumulative_column,
+            **{f"AVERAGE_{window}_DAYS": f"{self.daily_column}_{window}_day_average"
+               for window in rolling_average_windows},
+            "PER_100K": f"{self.daily_column}_per_100k",
+            "CUMULATIVE_PER_100K": f"{self.cumulative_column}_per_100k",
+        }
+
+
+@dataclass(frozen=True)
+class DatasetDefinition:
+    """Class representing a dataset, as declared in datasets.yaml. See there for the meaning of the attributes."""
+    name: str
+    url: str
+    path_variable: str
+    shape: str
+    table: str
+    entity: str
+    topic: str
+    trigger_words: List[str]
+    excluded_locations: List[str]
+    columns: Dict[str, str]
+    cumulative_columns: Dict[str, str]
+    value_domains: List[ValueDomainDefinition]
+    default_topic: bool = False
+
+    @property
+    def local_path(self) -> Optional[pathlib.Path]:
+        path: Optional[str] = os.environ.get(self.path_variable)
+        return pathlib.Path(path) if path is not None else None
+
+    @property
+    def trigger_pattern_name(self) -> str:
+        return f"{self.topic.lower()}_trigger"
+
+    @property
+    def default_value_domain(self) -> ValueDomainDefinition:
+        return next(domain for domain in self.value_domains if not domain.trigger_words)
+
+    @property
+    def daily_columns(self) -> List[str]:
+        return [domain.daily_column for domain in self.value_domains]
+
+    @property
+    def per_capita_columns(self) -> List[str]:
+        return [column for domain in self.value_domains for column in [domain.daily_column, domain.cumulative_column]]
+
+    @property
+    def derived_columns(self) -> List[str]:
+        """The columns with the rolling averages and values per 100k that are added when the data is loaded."""
+        return [column for domain in self.value_domains for measurement_type, column in
+                domain.measurement_columns.items() if measurement_type not in ["DAILY", "CUMULATIVE"]]
+
+    @property
+    def ranking_metrics(self) -> Dict[str, str]:
+        """The columns that locations are ranked by, together with the aggregation of their values in a period."""
+        return {**{column: "sum" for column in self.daily_columns},
+                **{domain.cumulative_column: "max" for domain in self.value_domains}}
+
+
+class DatasetRegistry:
+    """Class containing all datasets declared in datasets.yaml."""
+    def __init__(self, path: pathlib.Path = pathlib.Path(__file__).parent / "datasets.yaml"):
+        with open(path) as dataset_file:
+            declarations: dict = yaml.safe_load(dataset_file)
+        self.datasets: Dict[str, DatasetDefinition] = {name: self._create_dataset(name, declaration)
+                                                       for name, declaration in declarations.items()}
+        if len([dataset for dataset in self.datasets.values() if dataset.default_topic]) > 1:
+            raise ValueError("Only one dataset can be the default topic.")
+
+    @staticmethod
+    def _create_dataset(name: str, declaration: dict) -> DatasetDefinition:
+        """Creates a dataset from its declaration and checks whether the declaration is consistent."""
+        value_domains: List[ValueDomainDefinition] = [
+            ValueDomainDefinition(domain_name, domain["daily"], domain["cumulative"], domain.get("trigger_words", []))
+            for domain_name, domain in declaration["value_domains"].items()
+        ]
+        dataset: DatasetDefinition = DatasetDefinition(
+            name, declaration["url"], declaration["path_variable"], declaration["shape"], declaration["table"],
+            declaration["entity"], declaration["topic"], declaration["trigger_words"],
+            declaration.get("excluded_locations", []), declaration["columns"],
+            declaration.get("cumulative_columns", {}), value_domains, declaration.get("default_topic", False)
+        )
+
+        if dataset.shape not in shapes:
+            raise ValueError(f"The shape of the dataset {name} must be one of {shapes}.")
+        if dataset.shape == "wide" and len(dataset.columns) != 1:
+            raise ValueError(f"The wide dataset {name} must have exactly one column.")
+        unknown_types: List[str] = [column_type for column_type in dataset.columns.values()
+                                    if column_type not in column_types]
+        if unknown_types:
+            raise ValueError(f"The dataset {name} has columns of unknown types: {unknown_types}.")
+        all_columns: List[str] = list(dataset.columns) + list(dataset.cumulative_columns)
+        missing_columns: List[str] = [column for column in list(dataset.cumulative_columns.values()) +
+                                      dataset.per_capita_columns if column not in all_columns]
+        if missing_columns:
+            raise ValueError(f"The dataset {name} refers to columns it doesn't have: {missing_columns}.")
+        if all(domain.trigger_words for domain in value_domains):
+            raise ValueError(f"The dataset {name} needs a value domain without trigger words.")
+        return dataset
+
+    def get_dataset_by_topic(self, topic: str) -> Optional[DatasetDefinition]:
+        """Returns the dataset answering the questions about a topic, or None if there is no such dataset."""
+        return next((dataset for dataset in self.datasets.values() if dataset.topic == topic), None)
+
+    def get_dataset_by_value_domain(self, value_domain: str) -> Optional[DatasetDefinition]:
+        """Returns the dataset that a value domain belongs to, or None if there is no such dataset."""
+        return next((dataset for dataset in self.datasets.values()
+                     if any(domain.name == value_domain for domain in dataset.value_domains)), None)
+
+    def get_default_dataset(self) -> Optional[DatasetDefinition]:
+        """Returns the dataset answering the questions that only mention COVID itself, if there is one."""
+        return next((dataset for dataset in self.datasets.values() if dataset.default_topic), None)
+
+    @property
+    def topics(self) -> List[str]:
+        return [dataset.topic for dataset in self.datasets.values()]
+
+    @property
+    def trigger_words(self) -> List[str]:
+        """The trigger words of all topics and value domains."""
+        return [word for dataset in self.datasets.values() for word in dataset.trigger_words] + \
+            [word for domain in self.value_domains for word in domain.trigger_words]
+
+    @property
+    def value_domains(self) -> List[ValueDomainDefinition]:
+        return [domain for dataset in self.datasets.values() for domain in dataset.value_domains]
+
+
+_registry: Optional[DatasetRegistry] = None
+
+
+def check_members(enum_class: Type[Enum], names: List[str], special_members: List[str]) -> None:
+    """Checks that an enum has a member for exactly the names declared in datasets.yaml, apart from its special
+    members like UNKNOWN.
+    """
+    members: List[str] = [member for member in enum_class.__members__ if member not in special_members]
+    if set(members) != set(names):
+        raise ValueError(f"The members {members} of {enum_class.__name__} don't match the names {names} declared in "
+                         f"datasets.yaml.")
+
+
+def get_dataset_registry() -> DatasetRegistry:
+    """Returns the registry of the datasets declared in datasets.yaml."""
+    global _registry
+    if _registry is None:
+        _registry = DatasetRegistry()
+    return _registry
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import threading
+from datetime import date
+from typing import Dict, Optional, List, Set, Tuple
+
+
+def get_default_recordings_path(tests_path: pathlib.Path) -> pathlib.Path:
+    """Returns the responses of the CoreNLP server that are replayed by default.
+
+    These are the real recordings in corenlp_recordings.json, once they were recorded with
+    scripts/corenlp_stand_in.py record --record-queries. Until then, the synthetic responses in
+    corenlp_synthetic_responses.json are used, which were derived from the gold timeframes of the annotated queries.
+    """
+    recordings_path: pathlib.Path = tests_path / "corenlp_recordings.json"
+    return recordings_path if recordings_path.exists() else tests_path / "corenlp_synthetic_responses.json"
+
+
+class RecordingStore:
+    """Class holding recorded responses of the CoreNLP server.
+
+    CoreNLP resolves relative expressions such as "yesterday" based on the reference date that is sent along with
+    the request, so every response is stored under the sentence and the reference date it was recorded for.
+    The recordings are saved as a JSON list that is sorted by sentence, so that changes to it are easy to review.
+    Responses that weren't returned by a real CoreNLP server, but were derived from annotations, are marked with
+    "synthetic": true, so that results based on them can't be mistaken for results based on real responses.
+    """
+    def __init__(self, path: Optional[pathlib.Path] = None):
+        self.path: Optional[pathlib.Path] = path
+        # Maps each sentence to the responses recorded for it, keyed by the reference date in ISO format.
+        self._recordings: Dict[str, Dict[str, dict]] = {}
+        # The sentences and reference dates of the synthetic responses.
+        self._synthetic: Set[Tuple[str, str]] = set()
+        self._lock: threading.Lock = threading.Lock()
+
+        if path is not None and path.exists():
+            self.load(path)
+
+    def load(self, path: pathlib.Path) -> None:
+        """Loads the recordings from a file, replacing the ones with the same key."""
+        with open(path) as recordings_file:
+            for recording in json.load(recordings_file):
+                self._recordings.setdefault(recording["sentence"], {})[recording["reference_date"]] = \
+                    recording["response"]
+                if recording.get("synthetic", False):
+                    self._synthetic.add((recording["sentence"], recording["reference_date"]))
+                else:
+                    self._synthetic.discard((recording["sentence"], recording["reference_date"]))
+
+    def save(self, path: Optional[pathlib.Path] = None) -> None:
+        """Saves the recordings to a file (by default the one they were loaded from)."""
+        path = self.path if path is None else path
+        with self._lock:
+            recordings: List[dict] = [{"sentence": sentence, "reference_date": reference_date,
+                                       **({"synthetic": True} if (sentence, reference_date) in self._synthetic
+                                          else {}),
+                                       "response": response}
+                                      for sentence, responses in sorted(self._recordings.items())
+                                      for reference_date, response in sorted(responses.items())]
+        with open(path, "w") as recordings_file:
+            json.dump(recordings, recordings_file, indent=2)
+            recordings_file.write("\n")
+
+    def get(self, sentence: str, reference_date: date, exact: bool = False) -> Optional[dict]:
+        """Returns the response recorded for a sentence.
+
+        If the sentence wasn't recorded for the given reference date, the response from any other reference date
+        is returned (unless exact is set), which means that relative dates are resolved based on the day of the
+        recording.
+        """
+        with self._lock:
+            responses: Dict[str, dict] = self._recordings.get(sentence, {})
+            if reference_date.isoformat() in responses:
+                return responses[reference_date.isoformat()]
+            return None if exact else next(iter(responses.values()), None)
+
+    def add(self, sentence: str, reference_date: date, response: dict) -> None:
+        """Adds a new recording of a real response, replacing a synthetic one with the same key."""
+        with self._lock:
+            self._recordings.setdefault(sentence, {})[reference_date.isoformat()] = response
+            self._synthetic.discard((sentence, reference_date.isoformat()))
+
+    @property
+    def synthetic_count(self) -> int:
+        """The number of responses that are synthetic rather than recorded from a real server."""
+        with self._lock:
+            return len(self._synthetic)
+
+    def __len__(self) -> int:
+        return sum(len(responses) for responses in self._recordings.values())
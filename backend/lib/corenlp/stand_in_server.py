@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from datetime import datetime, date
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from lib.corenlp.recordings import RecordingStore
+from lib.util.logger import ServerLogger
+
+
+class StandInServer:
+    """Class representing a small HTTP server that mimics the JSON API of the CoreNLP server.
+
+    It answers requests of the form "POST /?properties={...}" with the sentence in the body. The server has two
+    modes:
+    replay: The responses are taken from a RecordingStore. Sentences without a recording are answered with an
+    empty document, i.e. as if CoreNLP didn't find any entities in them, unless exact is set, in which case
+    they are answered with an error.
+    record: The requests are forwarded to a real CoreNLP server and the responses are added to the RecordingStore.
+
+    In both modes, an artificial latency (plus/minus a random jitter) can be added to every response to simulate
+    a slow CoreNLP server.
+    """
+    def __init__(self, store: RecordingStore, host: str = "127.0.0.1", port: int = 9000, mode: str = "replay",
+                 upstream_url: Optional[str] = None, latency: float = 0, jitter: float = 0, exact: bool = False):
+        if mode not in ["replay", "record"]:
+            raise ValueError(f"Unknown mode {mode}.")
+        if mode == "record" and upstream_url is None:
+            raise ValueError("The record mode needs the URL of a CoreNLP server.")
+
+        self.store: RecordingStore = store
+        self.mode: str = mode
+        self.upstream_url: Optional[str] = upstream_url.rstrip("/") if upstream_url else None
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.exact: bool = exact
+        self.logger: ServerLogger = ServerLogger(__name__)
+        self.misses: int = 0
+        self._server: ThreadingHTTPServer = ThreadingHTTPServer((host, port), self._create_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The URL under which the server can be reached, e.g. to be used as COVBOT_CORENLP_URL."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> StandInServer:
+        """Starts serving requests in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serves requests in the current thread until the process is interrupted."""
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        """Stops the server. In record mode, the recordings are saved."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self.mode == "record" and self.store.path is not None:
+            self.store.save()
+
+    def respond(self, sentence: str, reference_date: date) -> Optional[dict]:
+        """Returns the response for a sentence, or None if there is none and the server is in exact mode."""
+        if self.mode == "record":
+            return self.record(sentence, reference_date)
+
+        response: Optional[dict] = self.store.get(sentence, reference_date, exact=self.exact)
+        if response is None:
+            self.misses += 1
+            self.logger.warning("No recording found for the sentence %r.", sentence)
+            return None if self.exact else {"sentences": []}
+        return response
+
+    def record(self, sentence: str, reference_date: date) -> dict:
+        """Sends a sentence to the real CoreNLP server and records its response."""
+        properties: dict = {
+            "date": datetime.combine(reference_date, datetime.now().time()).isoformat(),
+            "annotators": "tokenize, ssplit, pos, lemma, ner",
+            "outputFormat": "json",
+        }
+        response: dict = requests.post(f"{self.upstream_url}/?properties={json.dumps(properties)}",
+                                       data=sentence.encode("utf-8")).json()
+        self.store.add(sentence, reference_date, response)
+        return response
+
+    def _wait(self) -> None:
+        """Waits for the artificial latency."""
+        delay: float = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _create_handler(self) -> type:
+        """Creates the request handler class bound to this server."""
+        stand_in: StandInServer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                sentence, reference_date = _parse_request(self.path, self.rfile.read(
+                    int(self.headers.get("Content-Length", 0))), self.headers.get("Content-Type", ""))
+                response: Optional[dict] = stand_in.respond(sentence, reference_date)
+                stand_in._wait()
+
+                if response is None:
+                    body: bytes = f"No recording found for {sentence!r}".encode("utf-8")
+                    self.send_response(500)
+                    self.send_header("Content-Type", "text/plain")
+                else:
+                    body = json.dumps(response).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # The default implementation writes every request to stderr.
+                pass
+
+        return Handler
+
+
+def _parse_request(path: str, body: bytes, content_type: str) -> Tuple[str, date]:
+    """Extracts the sentence and the reference date from a request to the CoreNLP API."""
+    properties: dict = json.loads(parse_qs(urlparse(path).query).get("properties", ["{}"])[0])
+    reference_date: date = datetime.fromisoformat(properties["date"]).date() if "date" in properties \
+        else datetime.now().date()
+
+    text: str = body.decode("utf-8")
+    # The DateRecognizer sends the raw text, older clients sent the sentence as form data.
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        text = parse_qs(text).get("data", [""])[0]
+
+    return text, reference_date
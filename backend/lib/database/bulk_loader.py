@@ -0,0 +1,58 @@
+import time
+from typing import List, Iterator
+
+from pandas import DataFrame
+from sqlalchemy import Table, insert, Index
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql.compiler import SQLCompiler
+
+from lib.util.logger import ServerLogger
+
+
+class BulkLoader:
+    """Class that loads dataframes into the tables of the database in bulk.
+
+    The rows are inserted in large batches with executemany on the cursor of the database driver, so neither pandas
+    nor SQLAlchemy process them one by one. The values are passed to the driver as they are, e.g. the days of the
+    entries need to be day numbers already. For MySQL, the driver sends each batch as multi-row INSERTs.
+    The indexes of the table are dropped while the rows are inserted and are built again afterwards, which is faster
+    than updating them with every row. The loader doesn't commit, the rows are inserted in the transaction of the
+    connection that is passed to it. On SQLite, the engines of DatabaseConnection begin that transaction explicitly,
+    so dropping the indexes is rolled back with the rows. On MySQL, dropping and creating the indexes commits that
+    transaction implicitly, so a failed load can't be rolled back there.
+    """
+    def __init__(self, batch_size: int = 50_000):
+        self.logger: ServerLogger = ServerLogger(__name__)
+        self.batch_size: int = batch_size
+
+    def load(self, db_connection: Connection, table: Table, data: DataFrame) -> None:
+        """Inserts the rows of the dataframe, whose columns need to be columns of the table, into the table."""
+        start: float = time.perf_counter()
+        columns: List[str] = list(data.columns)
+        statement: SQLCompiler = insert(table).compile(dialect=db_connection.dialect, column_keys=columns)
+
+        indexes: List[Index] = list(table.indexes)
+        for index in indexes:
+            index.drop(db_connection)
+        for batch in self._get_batches(data, statement):
+            db_connection.exec_driver_sql(str(statement), batch)
+        for index in indexes:
+            index.create(db_connection)
+
+        duration: float = time.perf_counter() - start
+        self.logger.info("Loaded %d rows into %s in %.2f s (%.0f rows/s).", len(data), table.name, duration,
+                         len(data) / duration if duration > 0 else 0)
+
+    def _get_batches(self, data: DataFrame, statement: SQLCompiler) -> Iterator[list]:
+        """Splits the data into batches of parameters for the statement, with None for the missing values."""
+        # The order of the parameters of the statement might differ from the order of the columns.
+        parameter_names: List[str] = list(statement.positiontup) if statement.positional else list(statement.params)
+        for batch_start in range(0, len(data), self.batch_size):
+            batch: DataFrame = data.iloc[batch_start:batch_start + self.batch_size]
+            # tolist converts the values to Python types, which is what the drivers expect.
+            values: List[list] = [[None if value != value else value for value in batch[name].tolist()]
+                                  if batch[name].hasnans else batch[name].tolist() for name in parameter_names]
+            if statement.positional:
+                yield list(zip(*values))
+            else:
+                yield [dict(zip(parameter_names, row)) for row in zip(*values)]
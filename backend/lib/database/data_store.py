@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Set
+
+import numpy as np
+import pandas as pd
+
+from lib.config.dataset_registry import DatasetDefinition
+from lib.database.snapshot import Snapshot
+
+magic: bytes = b"COVBOTDS"
+# A new format gives a new version, even if the data didn't change.
+data_store_format_version: int = 3
+# The offset of every array in the file is a multiple of this, so that the arrays are aligned.
+alignment: int = 64
+# The number of days of a block of the range indexes (see build_range_index).
+block_size: int = 32
+
+
+@dataclass
+class DataTable:
+    """Class representing the read side of a dataset, as it is mapped from the data store.
+
+    The values of each column are stored in a matrix with one row per location and one column per day, from
+    start_date on. Days without an entry are NaN.
+    locations: Maps each normalized location name to the rows of the locations with that name.
+    location_names: The name of the location of each row.
+    present: Matrix that is 1 for every location and day that has an entry in the dataset, even if its values are
+    missing.
+    columns: The matrix of each column, by the name of the column.
+    integer_columns: The columns that contain integers in the database.
+    range_indexes: The indexes of each column for queries over ranges of days, by the name of the column and by
+    "max" and "min" (see build_range_index) as well as "sum" and "count" (see build_prefix_sums).
+    """
+    start_date: date
+    days: int
+    locations: Dict[str, List[int]]
+    location_names: List[str]
+    present: np.ndarray
+    columns: Dict[str, np.ndarray]
+    integer_columns: Set[str]
+    range_indexes: Dict[str, Dict[str, np.ndarray]]
+
+    def get_location_row(self, location_names: List[str]) -> Optional[int]:
+        """Returns the row of the location with one of the normalized names, or None if there isn't exactly one."""
+        rows: List[int] = [row for name in location_names for row in self.locations.get(name, [])]
+        return rows[0] if len(rows) == 1 else None
+
+    def get_day_range(self, timeframe: Optional[Tuple[date, date]]) -> Tuple[int, int]:
+        """Returns the indices of the first and after the last day of the timeframe, limited to the stored days."""
+        if timeframe is None:
+            return 0, self.days
+        start: int = (timeframe[0] - self.start_date).days
+        end: int = (timeframe[1] - self.start_date).days + 1
+        return min(max(start, 0), self.days), min(max(end, 0), self.days)
+
+    def get_date(self, day: int) -> date:
+        return self.start_date + timedelta(days=int(day))
+
+    def to_result(self, column: str, value: float):
+        """Converts a value to the type that the database would return for the column."""
+        return int(value) if column in self.integer_columns else float(value)
+
+    def get_sum(self, column: str, start: int, end: int, rows=slice(None)) -> np.ndarray:
+        """Returns the sum of the values of a column in the days [start, end) of the given (or all) rows.
+
+        The sum of a row without values in the range is NaN, like the SUM of SQL.
+        """
+        indexes: Dict[str, np.ndarray] = self.range_indexes[column]
+        sums: np.ndarray = indexes["sum"][rows, end] - indexes["sum"][rows, start]
+        counts: np.ndarray = indexes["count"][rows, end] - indexes["count"][rows, start]
+        return np.where(counts > 0, sums, np.nan)
+
+    def get_extreme_day(self, column: str, row: int, start: int, end: int, maximum: bool) -> Optional[int]:
+        """Returns the day with the highest (or lowest) value of a column in the days [start, end) of a row.
+
+        If several days have that value, the earliest one is returned. Returns None if there are no values in the
+        range. The blocks that are completely inside of the range are looked up in the range index, only the days
+        before the first and after the last of these blocks are compared directly.
+        """
+        values: np.ndarray = self.columns[column][row]
+
+        def get_key(day: int) -> float:
+            value: float = values[day] if maximum else -values[day]
+            return -np.inf if np.isnan(value) else value
+
+        def scan(first: int, last: int) -> List[int]:
+            if first >= last:
+                return []
+            keys: np.ndarray = values[first:last] if maximum else -values[first:last]
+            return [first + int(np.argmax(np.where(np.isnan(keys), -np.inf, keys)))]
+
+        first_block: int = -(-start // block_size)
+        last_block: int = end // block_size
+        if first_block >= last_block:
+            candidates: List[int] = scan(start, end)
+        else:
+            index: np.ndarray = self.range_indexes[column]["max" if maximum else "min"]
+            level: int = (last_block - first_block).bit_length() - 1
+            candidates = scan(start, first_block * block_size) + \
+                [int(index[level, row, first_block]), int(index[level, row, last_block - (1 << level)])] + \
+                scan(last_block * block_size, end)
+
+        # The candidates are sorted by their day (apart from the two overlapping ones from the index, of which the
+        # first one is the earliest in case of a tie), so only a strictly larger key replaces the best one.
+        best_day: Optional[int] = None
+        for day in candidates:
+            if best_day is None or get_key(day) > get_key(best_day):
+                best_day = day
+        return best_day if best_day is not None and get_key(best_day) != -np.inf else None
+
+
+def build_prefix_sums(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Builds the prefix sums of the values of each row and the prefix counts of the days that have a value.
+
+    Entry [row, day] is the sum (count) of the days before day, so the sum of the days [start, end) is the difference
+    of the entries at end and at start. Missing values (NaN) count as 0 in the sums and aren't counted.
+    """
+    rows: int = values.shape[0]
+    has_value: np.ndarray = ~np.isnan(values)
+    sums: np.ndarray = np.zeros((rows, values.shape[1] + 1))
+    np.cumsum(np.where(has_value, values, 0), axis=1, out=sums[:, 1:])
+    counts: np.ndarray = np.zeros((rows, values.shape[1] + 1), dtype=np.int32)
+    np.cumsum(has_value, axis=1, out=counts[:, 1:])
+    return sums, counts
+
+
+def build_range_index(keys: np.ndarray) -> np.ndarray:
+    """Builds a sparse table over the blocks of block_size days of each row, for the maximum of a range of days.
+
+    Entry [level, row, block] is the earliest day with the largest key in the 2^level blocks starting at block (or in
+    the remaining blocks, if there are fewer). Missing keys (NaN) are never the largest. With this, the largest key in
+    any range of whole blocks is the larger of two entries, which makes range queries take constant time (see
+    DataTable.get_extreme_day). For the minimum, the index is built over the negated values.
+    """
+    rows, days = keys.shape
+    blocks: int = max(-(-days // block_size), 1)
+    padded: np.ndarray = np.full((rows, blocks * block_size), -np.inf)
+    padded[:, :days] = np.where(np.isnan(keys), -np.inf, keys)
+
+    row_indices: np.ndarray = np.arange(rows)[:, None]
+    levels: List[np.ndarray] = [(padded.reshape(rows, blocks, block_size).argmax(axis=2) +
+                                 np.arange(blocks) * block_size).astype(np.int32)]
+    width: int = 1
+    while 2 * width <= blocks:
+        previous: np.ndarray = levels[-1]
+        following: np.ndarray = previous.copy()
+        following[:, :blocks - width] = previous[:, width:]
+        take_following: np.ndarray = padded[row_indices, following] > padded[row_indices, previous]
+        levels.append(np.where(take_following, following, previous))
+        width *= 2
+    return np.stack(levels)
+
+
+class DataStore:
+    """Class providing the read side of all datasets from a single memory-mapped file that all workers share.
+
+    After every ingest, the DatabaseManager publishes a new version of the file (see DataStore.publish) and replaces
+    the file "CURRENT" in the directory of the store, which contains the name of the latest version. Every worker maps
+    the file read-only, so its pages are only kept in memory once. Before each query, refresh checks whether there is
+    a new version. If so, the new version is mapped and replaces the old one in a single assignment, queries that are
+    still using the old version finish with it.
+    """
+    def __init__(self, db_name: str = "covbot", directory: Optional[pathlib.Path] = None):
+        self.directory: pathlib.Path = self.get_directory(db_name) if directory is None else directory
+        self.version: Optional[str] = None
+        self._tables: Dict[str, DataTable] = {}
+        self._current_stat: Optional[Tuple[int, int]] = None
+        self.refresh()
+
+    @staticmethod
+    def get_directory(db_name: str) -> pathlib.Path:
+        """Returns the directory of the data store that belongs to the database with the given name."""
+        return pathlib.Path(os.environ.get("COVBOT_DB_PATH")) / f"{db_name}_store"
+
+    def refresh(self) -> bool:
+        """Maps the latest version of the store if it changed since the last call. Returns whether it changed."""
+        try:
+            stat: os.stat_result = os.stat(self.directory / "CURRENT")
+        except FileNotFoundError:
+            return False
+        if (stat.st_ino, stat.st_mtime_ns) == self._current_stat:
+            return False
+
+        version: str = (self.directory / "CURRENT").read_text().strip()
+        tables: Dict[str, DataTable] = self._map(self.directory / version)
+        self._tables, self.version, self._current_stat = tables, version, (stat.st_ino, stat.st_mtime_ns)
+        return True
+
+    def get_table(self, dataset: str) -> Optional[DataTable]:
+        return self._tables.get(dataset)
+
+    @staticmethod
+    def _map(path: pathlib.Path) -> Dict[str, DataTable]:
+        with open(path, "rb") as file:
+            buffer: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(magic)] != magic:
+            raise ValueError(f"{path} is not a data store.")
+        header_length: int = int.from_bytes(buffer[len(magic):len(magic) + 8], "little")
+        header: dict = json.loads(buffer[len(magic) + 8:len(magic) + 8 + header_length])
+        data_offset: int = len(magic) + 8 + header_length
+
+        def get_array(description: dict) -> np.ndarray:
+            shape: Tuple[int, ...] = tuple(description["shape"])
+            return np.frombuffer(buffer, dtype=description["dtype"], count=int(np.prod(shape)),
+                                 offset=data_offset + description["offset"]).reshape(shape)
+
+        tables: Dict[str, DataTable] = {}
+        for name, table in header["datasets"].items():
+            locations: Dict[str, List[int]] = {}
+            for row, location in enumerate(table["locations_normalized"]):
+                locations.setdefault(location, []).append(row)
+            tables[name] = DataTable(
+                date.fromisoformat(table["start_date"]), table["days"], locations, table["location_names"],
+                get_array(table["arrays"]["present"]),
+                {column: get_array(description) for column, description in table["arrays"].items()
+                 if column != "present"},
+                set(table["integer_columns"]),
+                {column: {kind: get_array(description) for kind, description in indexes.items()}
+                 for column, indexes in table["range_indexes"].items()}
+            )
+        return tables
+
+    @staticmethod
+    def publish(directory: pathlib.Path, snapshots: List[Tuple[DatasetDefinition, Snapshot]]) -> str:
+        """Writes the snapshots of the datasets into a new version of the store and makes it the current one.
+
+        The version is derived from the content hashes of the snapshots, so publishing the same data again doesn't
+        change anything. Returns the version.
+        """
+        version: str = hashlib.sha256(":".join([str(data_store_format_version)] + [
+            snapshot.content_hash for _, snapshot in snapshots]).encode()).hexdigest()[:16]
+        directory.mkdir(parents=True, exist_ok=True)
+        current_path: pathlib.Path = directory / "CURRENT"
+        if current_path.exists() and current_path.read_text().strip() == version:
+            return version
+
+        header: dict = {"version": version, "created": datetime.now().isoformat(), "datasets": {}}
+        arrays: List[np.ndarray] = []
+        offset: int = 0
+
+        def add_array(array: np.ndarray) -> dict:
+            nonlocal offset
+            description: dict = {"offset": offset, "dtype": str(array.dtype), "shape": list(array.shape)}
+            arrays.append(array)
+            offset += -(-array.nbytes // alignment) * alignment
+            return description
+
+        for dataset, snapshot in snapshots:
+            data: pd.DataFrame = snapshot.data
+            locations: pd.DataFrame = data[["location", "location_normalized"]].drop_duplicates("location") \
+                .sort_values("location")
+            rows: np.ndarray = pd.Categorical(data["location"], categories=locations["location"]).codes
+            dates: pd.Series = pd.to_datetime(data["date"])
+            start_date: pd.Timestamp = dates.min()
+            days: np.ndarray = (dates - start_date).dt.days.to_numpy()
+            shape: Tuple[int, int] = (len(locations), int(days.max()) + 1)
+
+            present: np.ndarray = np.zeros(shape, dtype=np.uint8)
+            present[rows, days] = 1
+            table: dict = {
+                "start_date": start_date.date().isoformat(), "days": shape[1],
+                "locations_normalized": locations["location_normalized"].tolist(),
+                "location_names": locations["location"].tolist(),
+                "integer_columns": [column for column, column_type in dataset.columns.items()
+                                    if column_type != "Float"] + list(dataset.cumulative_columns),
+                "arrays": {"present": add_array(present)},
+                "range_indexes": {},
+            }
+            for domain in dataset.value_domains:
+                for column in domain.measurement_columns.values():
+                    values: np.ndarray = np.full(shape, np.nan)
+                    values[rows, days] = data[column].to_numpy(dtype=np.float64, na_value=np.nan)
+                    table["arrays"][column] = add_array(values)
+                    sums, counts = build_prefix_sums(values)
+                    table["range_indexes"][column] = {"max": add_array(build_range_index(values)),
+                                                      "min": add_array(build_range_index(-values)),
+                                                      "sum": add_array(sums), "count": add_array(counts)}
+            header["datasets"][dataset.name] = table
+
+        # The arrays start at the first aligned offset after the header, their offsets are relative to it.
+        encoded_header: bytes = json.dumps(header).encode()
+        encoded_header = encoded_header.ljust(-(-(len(magic) + 8 + len(encoded_header)) // alignment) * alignment -
+                                              len(magic) - 8)
+
+        temporary_path: pathlib.Path = directory / f".tmp-{uuid.uuid4().hex}"
+        with open(temporary_path, "wb") as file:
+            file.write(magic + len(encoded_header).to_bytes(8, "little") + encoded_header)
+            for array in arrays:
+                file.write(np.ascontiguousarray(array).tobytes())
+                file.write(b"\0" * (-array.nbytes % alignment))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, directory / version)
+
+        temporary_path = directory / f".CURRENT-{uuid.uuid4().hex}"
+        temporary_path.write_text(version)
+        previous: Optional[str] = current_path.read_text().strip() if current_path.exists() else None
+        os.replace(temporary_path, current_path)
+
+        # The workers that haven't refreshed yet still map the previous version. Removing older versions is safe,
+        # since a mapped file stays valid until it's unmapped.
+        for path in directory.iterdir():
+            if path.name not in [version, previous, "CURRENT"] and not path.name.startswith("."):
+                path.unlink()
+        return version
@@ -1,51 +1,123 @@
+from datetime import datetime
+from typing import Dict, Optional, List, Tuple
+
+import pandas as pd
 from pandas import DataFrame
+from sqlalchemy import delete, select, func, Table, insert
 from sqlalchemy.engine import Engine, Connection
 from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import Session
 
+from lib.config.dataset_registry import get_dataset_registry, DatasetDefinition
+from lib.database.bulk_loader import BulkLoader
+from lib.database.data_store import DataStore
 from lib.database.database_connection import DatabaseConnection
 from lib.database.dataset_handler import DatasetHandler
-from lib.database.entities import create_tables, Vaccination, Case, drop_tables
+from lib.database.entities import create_tables, drop_tables, Ranking, Base, dataset_entities, DatasetVersion, \
+    LocationDimension
+from lib.database.snapshot import Snapshot
 from lib.util.logger import ServerLogger
 
 
 class DatabaseManager:
     """Class that provides helper methods to manage the Covbot database."""
-    def __init__(self, db_name="covbot"):
+    def __init__(self, db_name="covbot", connection: Optional[DatabaseConnection] = None):
         self.logger: ServerLogger = ServerLogger(__name__)
-        self.connection: DatabaseConnection = DatabaseConnection()
+        self.connection: DatabaseConnection = DatabaseConnection() if connection is None else connection
         self.db_name: str = db_name
         self.engine: Engine = self.connection.create_engine(self.db_name)
         self.dataset_handler: DatasetHandler = DatasetHandler()
+        self.bulk_loader: BulkLoader = BulkLoader()
 
     def update_database(self) -> None:
-        """Updates the data on COVID cases and vaccinations. The database already needs to exist."""
+        """Updates the data of all datasets in the registry. The database already needs to exist."""
         self.logger.info("Updating the data in the database...")
-        self.update_covid_cases()
-        self.update_vaccinations()
-
-    def update_covid_cases(self) -> None:
-        """Updates the data on COVID cases. The database already needs to exist."""
-        covid_cases: DataFrame = self.dataset_handler.load_covid_cases()
-        db_connection: Connection = self.engine.connect()
-
-        self.logger.info("Deleting previous covid cases entries...")
-        drop_tables(self.engine, [Case.__table__])
-        create_tables(self.engine, [Case.__table__])
-        self.logger.info("Updating the daily detected covid cases...")
-        covid_cases.to_sql(name="cases", con=db_connection, if_exists="append", index=False)
-        self.logger.info("Daily detected covid cases were updated.")
-
-    def update_vaccinations(self) -> None:
-        """Updates the data on vaccinations. The database already needs to exist."""
-        vaccinations: DataFrame = self.dataset_handler.load_vaccinations()
-        db_connection: Connection = self.engine.connect()
-
-        self.logger.info("Deleting previous vaccinations entries...")
-        drop_tables(self.engine, [Vaccination.__table__])
-        create_tables(self.engine, [Vaccination.__table__])
-        self.logger.info("Updating daily vaccinations...")
-        vaccinations.to_sql(name="vaccinations", con=db_connection, if_exists="append", index=False)
-        self.logger.info("Daily vaccinations were updated.")
+        for dataset in get_dataset_registry().datasets.values():
+            self.update_dataset(dataset, publish=False)
+        self.publish_data_store()
+
+    def update_dataset(self, dataset: DatasetDefinition, force: bool = False, publish: bool = True) -> None:
+        """Replaces the data of a dataset and its rankings with the data from its snapshot.
+
+        The data is only loaded into the database if it differs from the data that was loaded the last time, unless
+        force is set. Afterwards, the data store is published, unless publish is unset.
+        """
+        snapshot: Snapshot = self.dataset_handler.load_snapshot(dataset)
+        if not force and self.get_loaded_content_hash(dataset) == snapshot.content_hash:
+            self.logger.info("The %s are already up to date.", dataset.name)
+        else:
+            self._load_snapshot(dataset, snapshot)
+        if publish:
+            self.publish_data_store()
+        # The connections aren't needed until the next update.
+        self.engine.dispose()
+
+    def _load_snapshot(self, dataset: DatasetDefinition, snapshot: Snapshot) -> None:
+        """Replaces the data of a dataset and its rankings in the database with the data of a snapshot.
+
+        On SQLite, everything is written in a single transaction, including dropping and creating the tables and
+        indexes (see DatabaseConnection), so a failed update leaves the previous data in place. MySQL commits implicitly before and after each DDL statement (dropping and creating the tables and indexes),
+        so there a failed update can leave the tables partly loaded. The version of the dataset is written last in
+        both cases. It is therefore only updated once the data and the rankings were loaded completely, and the next
+        update loads the snapshot again.
+        """
+        table: Table = dataset_entities[dataset.name].__table__
+        rankings: DataFrame = self.dataset_handler.build_rankings(snapshot.data, dataset.ranking_metrics)
+
+        with self.engine.begin() as db_connection:
+            self.logger.info("Deleting previous %s entries...", dataset.name)
+            drop_tables(db_connection, [table])
+            create_tables(db_connection, [table])
+            self.logger.info("Updating the %s...", dataset.name)
+            locations: DataFrame = self._update_locations(snapshot.data, db_connection)
+            self.bulk_loader.load(db_connection, table, self.dataset_handler.build_entries(snapshot.data, locations))
+            self._replace_rankings(rankings, dataset.ranking_metrics, db_connection)
+            db_connection.execute(delete(DatasetVersion.__table__).where(DatasetVersion.dataset == dataset.name))
+            db_connection.execute(insert(DatasetVersion.__table__).values(
+                dataset=dataset.name, source_hash=snapshot.source_hash, content_hash=snapshot.content_hash,
+                loaded=datetime.now()))
+        self.logger.info("The %s were updated.", dataset.name)
+
+    def _update_locations(self, data: DataFrame, db_connection: Connection) -> DataFrame:
+        """Adds the locations of the data that aren't in the location dimension yet and returns all locations."""
+        Base.metadata.create_all(db_connection, [LocationDimension.__table__])
+        locations: DataFrame = pd.read_sql(select(LocationDimension.__table__), db_connection)
+        new_locations: DataFrame = self.dataset_handler.build_locations(data, locations)
+        if len(new_locations) > 0:
+            self.logger.info("Adding %d new locations...", len(new_locations))
+            self.bulk_loader.load(db_connection, LocationDimension.__table__, new_locations)
+        return pd.concat([locations, new_locations], ignore_index=True)
+
+    def publish_data_store(self) -> None:
+        """Publishes the snapshots of all datasets as the new version of the data store of the database."""
+        snapshots: List[Tuple[DatasetDefinition, Snapshot]] = [
+            (dataset, self.dataset_handler.load_snapshot(dataset))
+            for dataset in get_dataset_registry().datasets.values()
+        ]
+        version: str = DataStore.publish(DataStore.get_directory(self.db_name), snapshots)
+        self.logger.info("Published version %s of the data store.", version)
+
+    def get_loaded_content_hash(self, dataset: DatasetDefinition) -> Optional[str]:
+        """Returns the content hash of the snapshot that the data of a dataset in the database was loaded from."""
+        Base.metadata.create_all(self.engine, [DatasetVersion.__table__])
+        with Session(self.engine) as session:
+            version: Optional[DatasetVersion] = session.get(DatasetVersion, dataset.name)
+            return version.content_hash if version is not None else None
+
+    def update_rankings(self, data: DataFrame, metrics: Dict[str, str]) -> None:
+        """Replaces the rankings of the given metrics with the ones built from the data."""
+        rankings: DataFrame = self.dataset_handler.build_rankings(data, metrics)
+        with self.engine.begin() as db_connection:
+            self._replace_rankings(rankings, metrics, db_connection)
+
+    def _replace_rankings(self, rankings: DataFrame, metrics: Dict[str, str], db_connection: Connection) -> None:
+        self.logger.info("Updating the rankings of %s...", ", ".join(metrics))
+        Base.metadata.create_all(db_connection, [Ranking.__table__])
+        db_connection.execute(delete(Ranking.__table__).where(Ranking.metric.in_(list(metrics))))
+        # The ids of the rankings of other metrics are still in the table.
+        first_id: int = db_connection.execute(select(func.coalesce(func.max(Ranking.id), 0))).scalar() + 1
+        self.bulk_loader.load(db_connection, Ranking.__table__, rankings.assign(id=rankings["id"] + first_id - 1))
+        self.logger.info("The rankings were updated.")
 
     def create_tables(self) -> None:
         """Creates all necessary tables."""
@@ -1,67 +1,170 @@
-import os
-from datetime import datetime, timedelta
-from typing import List
+import pathlib
+from typing import List, Dict, Optional
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
+from lib.config.dataset_registry import DatasetDefinition, rolling_average_windows
+from lib.database.entities import LocationKind, day_number_epoch
+from lib.database.snapshot import SnapshotStore, Snapshot
 from lib.nlu.slot.location import Location
 from lib.util.logger import ServerLogger
 
 
 class DatasetHandler:
     """Class responsible for handling and updating the datasets pulled from the Github repository by OWID."""
-    def __init__(self):
+    rolling_average_windows: List[int] = rolling_average_windows
+
+    def __init__(self, snapshot_store: Optional[SnapshotStore] = None):
         self.logger: ServerLogger = ServerLogger(__name__)
+        self.snapshot_store: SnapshotStore = SnapshotStore() if snapshot_store is None else snapshot_store
+
+    def load_dataset(self, dataset: DatasetDefinition) -> DataFrame:
+        """Loads a dataset and returns it as a dataframe with the columns of its entity."""
+        return self.load_snapshot(dataset).data
 
-    def load_covid_cases(self) -> DataFrame:
-        """Loads the covid cases from the data file and returns it as a dataframe."""
-        path: str = os.environ.get("COVBOT_CASES_PATH")
-        data: DataFrame = pd.read_csv(path).set_index("date").stack().reset_index()
-        data.columns = ["date", "location", "cases"]
+    def load_snapshot(self, dataset: DatasetDefinition) -> Snapshot:
+        """Loads the snapshot of a dataset. It is only rebuilt from the data file if any of its sources changed."""
+        source_hash: str = self.snapshot_store.get_source_hash(dataset)
+        snapshot: Optional[Snapshot] = self.snapshot_store.load(dataset, source_hash)
+        if snapshot is None:
+            self.logger.info("Building the snapshot of the %s...", dataset.name)
+            snapshot = self.snapshot_store.save(dataset, self.build_dataset(dataset), source_hash)
+        return snapshot
 
-        data["location_normalized"] = data.apply(lambda row:
-                                                Location.normalize_location_name(row["location"]), axis=1)
+    def build_dataset(self, dataset: DatasetDefinition) -> DataFrame:
+        """Builds a dataset from its data file and returns it as a dataframe with the columns of its entity."""
+        if dataset.shape == "wide":
+            # One column per location, e.g. "date,Afghanistan,Africa,Albania,..."
+            data: DataFrame = pd.read_csv(dataset.local_path).set_index("date").stack().reset_index()
+            data.columns = ["date", "location"] + list(dataset.columns)
+        else:
+            data = pd.read_csv(dataset.local_path, usecols=["location", "date"] + list(dataset.columns))
 
-        exclude_locations = ["upper middle income", "summer olympics 2020", "lower middle income",
-                             "low income", "international", "high income"]
-        data = data[~data["location_normalized"].isin(exclude_locations)]
-        data = self._add_cumulative_cases(data)
+        # There are only a few hundred different locations, so every name is only normalized once.
+        locations: pd.Series = pd.Series(data["location"].unique())
+        data["location_normalized"] = data["location"].map(
+            dict(zip(locations, locations.map(Location.normalize_location_name))))
+
+        data = data[~data["location_normalized"].isin(dataset.excluded_locations)]
+        data = self._add_cumulative_values(data, dataset.cumulative_columns)
+        data = self._add_rolling_averages(data, dataset.daily_columns)
+        data = self._add_per_capita_values(data, dataset.per_capita_columns)
 
         data["id"] = data.index + 1
         return data
 
-    def load_vaccinations(self) -> pd.DataFrame:
-        """Loads the vaccinations from the data file and returns it as a dataframe."""
-        path: str = os.environ.get("COVBOT_VACCINATIONS_PATH")
-        relevant_columns: List[str] = ["location", "date", "total_vaccinations", "people_vaccinated",
-                                       "daily_vaccinations",
-                                       "daily_people_vaccinated"]
-        data = pd.read_csv(path)[relevant_columns]
-        data.columns = relevant_columns
+    @staticmethod
+    def build_locations(data: DataFrame, locations: DataFrame) -> DataFrame:
+        """Builds the entries of the location dimension for the locations of the data that aren't in locations yet.
 
-        data["location_normalized"] = data.apply(lambda row:
-                                                Location.normalize_location_name(row["location"]), axis=1)
+        The locations have the columns of the LocationDimension entity, the new ones get the ids after the existing
+        ones, so the entries of other datasets keep referring to the right locations.
+        """
+        new_locations: DataFrame = data[["location", "location_normalized"]].drop_duplicates("location")
+        new_locations = new_locations[~new_locations["location"].isin(locations["name"])].sort_values("location")
+        kinds: Dict[str, int] = {**{name: LocationKind.CONTINENT.value for name in Location.get_continents()},
+                                 **{name: LocationKind.WORLD.value for name in Location.get_world()}}
+        first_id: int = int(locations["id"].max()) + 1 if len(locations) > 0 else 1
+        return DataFrame({
+            "id": np.arange(first_id, first_id + len(new_locations)),
+            "name": new_locations["location"].to_numpy(),
+            "name_normalized": new_locations["location_normalized"].to_numpy(),
+            "kind": new_locations["location_normalized"].map(kinds).fillna(LocationKind.COUNTRY.value)
+            .astype("int64").to_numpy(),
+        })
 
-        exclude_locations: List[str] = ["lower middle income", "low income", "high income",
-                                        "upper middle income"]
-        data = data[~data["location_normalized"].isin(exclude_locations)]
-        data = self._add_cumulative_vaccinations(data)
+    @staticmethod
+    def build_entries(data: DataFrame, locations: DataFrame) -> DataFrame:
+        """Builds the entries of a dataset as they are stored in its table from the preprocessed data.
 
-        data["id"] = data.index + 1
-        return data
+        The names of the locations are replaced with their ids in the locations, which need to contain all of them,
+        and the dates with their day numbers.
+        """
+        entries: DataFrame = data.drop(columns=["date", "location", "location_normalized"])
+        entries["day"] = (pd.to_datetime(data["date"]) - pd.Timestamp(day_number_epoch)).dt.days.to_numpy()
+        entries["location_id"] = data["location"].map(
+            pd.Series(locations["id"].to_numpy(), index=locations["name"])).to_numpy()
+        return entries
+
+    def build_rankings(self, data: DataFrame, metrics: Dict[str, str]) -> DataFrame:
+        """Ranks the countries for each of the metrics in every day, week, month and year, as well as overall.
+
+        The metrics map the name of a column to the aggregation used to combine its values in a period, "sum" for
+        daily values and "max" for cumulative values. The result has the columns of the Ranking entity.
+        """
+        data = data[~data["location_normalized"].isin(Location.get_continents().union(Location.get_world()))]
+        dates: pd.Series = pd.to_datetime(data["date"])
+        period_starts: Dict[str, pd.Series] = {
+            "DAY": dates,
+            "WEEK": dates - pd.to_timedelta(dates.dt.weekday, unit="D"),
+            "MONTH": dates - pd.to_timedelta(dates.dt.day - 1, unit="D"),
+            "YEAR": dates - pd.to_timedelta(dates.dt.dayofyear - 1, unit="D"),
+        }
+
+        rankings: List[DataFrame] = []
+        for metric, aggregation in metrics.items():
+            values: DataFrame = data[["location", "location_normalized", metric]].dropna(subset=[metric])
+            for period_type in list(period_starts) + ["ALL"]:
+                keys: list = [] if period_type == "ALL" else \
+                    [period_starts[period_type][values.index].rename("period_start")]
+                ranking: DataFrame = values.groupby(keys + ["location", "location_normalized"])[metric] \
+                    .agg(aggregation).rename("value").reset_index()
+                # Sorting by the location first makes the order of locations with the same value deterministic.
+                ranking = ranking.sort_values("location", kind="stable")
+                if period_type == "ALL":
+                    ranking["period_start"] = None
+                    ranking["rank"] = ranking["value"].rank(method="first", ascending=False)
+                else:
+                    ranking["period_start"] = ranking["period_start"].dt.date
+                    ranking["rank"] = ranking.groupby("period_start")["value"].rank(method="first", ascending=False)
+                ranking["metric"] = metric
+                ranking["period_type"] = period_type
+                rankings.append(ranking)
+
+        result: DataFrame = pd.concat(rankings, ignore_index=True)
+        result["rank"] = result["rank"].astype("int64")
+        result["value"] = result["value"].round().astype("int64")
+        result["id"] = result.index + 1
+        return result[["id", "metric", "period_type", "period_start", "rank", "location", "location_normalized",
+                       "value"]]
+
+    def _add_rolling_averages(self, df: DataFrame, columns: List[str]) -> DataFrame:
+        """Adds the 7- and 14-day averages of the columns, e.g. "cases_7_day_average", to the dataframe.
+
+        The windows are calendar days, so a missing day doesn't stretch the window. Days without a value are left out
+        of the average instead of being counted as 0.
+        """
+        df = df.sort_values(["location", "date"], kind="stable").reset_index(drop=True)
+        dated: DataFrame = df[["location"] + columns].assign(parsed_date=pd.to_datetime(df["date"]))
+        for window in self.rolling_average_windows:
+            averages: DataFrame = dated.groupby("location").rolling(f"{window}D", on="parsed_date",
+                                                                    min_periods=1)[columns].mean()
+            # The groups come out in the same order as the rows, since the dataframe is sorted by location.
+            for column in columns:
+                df[f"{column}_{window}_day_average"] = averages[column].to_numpy()
+        return df
+
+    def _add_per_capita_values(self, df: DataFrame, columns: List[str]) -> DataFrame:
+        """Adds the values of the columns per 100,000 people, e.g. "cases_per_100k", to the dataframe.
+
+        Locations that aren't in the population table (population.csv) get no per capita values.
+        """
+        population: pd.Series = df["location_normalized"].map(self.load_population())
+        for column in columns:
+            df[f"{column}_per_100k"] = df[column] / population * 100_000
+        return df
+
+    @staticmethod
+    def load_population() -> pd.Series:
+        """Loads the population of each location from population.csv, indexed by the normalized location name."""
+        return pd.read_csv(pathlib.Path(__file__).parent / "population.csv",
+                           index_col="location_normalized")["population"]
 
-    def _add_cumulative_cases(self, df: DataFrame) -> DataFrame:
-        """Adds the cumulative cases to the dataframe."""
-        df["date_in_seconds"] = df.apply(lambda row: datetime.strptime(row["date"], "%Y-%m-%d").timestamp(), axis=1)
-        df = df.set_index(["location", "date_in_seconds"]).sort_index()
-        df["cumulative_cases"] = df["cases"].fillna(0).groupby("location").cumsum()
-        return df.reset_index().drop("date_in_seconds", axis=1)
-
-    def _add_cumulative_vaccinations(self, df: DataFrame) -> DataFrame:
-        """Adds the cumulative vaccinations to the dataframe."""
-        df["date_in_seconds"] = df.apply(lambda row: datetime.strptime(row["date"], "%Y-%m-%d").timestamp(), axis=1)
-        df = df.set_index(["location", "date_in_seconds"]).sort_index()
-        df["total_vaccinations"] = df["daily_vaccinations"].fillna(0).groupby("location").cumsum()
-        df["people_vaccinated"] = df["daily_people_vaccinated"].fillna(0).groupby("location").cumsum()
-        return df.reset_index().drop("date_in_seconds", axis=1)
+    def _add_cumulative_values(self, df: DataFrame, cumulative_columns: Dict[str, str]) -> DataFrame:
+        """Adds the cumulative columns, which map their name to the column they are the cumulative sum of."""
+        df = df.sort_values(["location", "date"], kind="stable").reset_index(drop=True)
+        for cumulative_column, column in cumulative_columns.items():
+            df[cumulative_column] = df[column].fillna(0).groupby(df["location"]).cumsum()
+        return df
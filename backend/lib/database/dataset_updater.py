@@ -1,10 +1,10 @@
+import functools
 import hashlib
-import os
-import pathlib
 import time
 
 import requests
 
+from lib.config.dataset_registry import get_dataset_registry
 from lib.database.database_manager import DatabaseManager
 from lib.util.logger import ServerLogger
 
@@ -23,17 +23,12 @@ class DatasetUpdater:
 
         self.tracked_files = [
             {
-                "name": "vaccinations",
-                "url": "https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/vaccinations/vaccinations.csv",
-                "local_path": pathlib.Path(os.environ.get("COVBOT_VACCINATIONS_PATH")),
-                "on_update": self.db_manager.update_vaccinations
-            },
-            {
-                "name": "cases",
-                "url": "https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/jhu/new_cases.csv",
-                "local_path": pathlib.Path(os.environ.get("COVBOT_CASES_PATH")),
-                "on_update": self.db_manager.update_covid_cases
+                "name": dataset.name,
+                "url": dataset.url,
+                "local_path": dataset.local_path,
+                "on_update": functools.partial(self.db_manager.update_dataset, dataset)
             }
+            for dataset in get_dataset_registry().datasets.values()
         ]
         self.logger = ServerLogger(__name__)
 
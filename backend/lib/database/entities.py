@@ -1,60 +1,167 @@
 from __future__ import annotations
 
-from sqlalchemy import Column, Integer, String, Date, BigInteger
-from sqlalchemy.engine.base import Engine
-from sqlalchemy.orm import declarative_base
+from datetime import date, timedelta
+from enum import IntEnum
+from typing import Dict, Optional, Union
+
+from sqlalchemy import Column, Integer, String, Date, BigInteger, Index, Float, DateTime, ForeignKey, SmallInteger
+from sqlalchemy.engine.base import Engine, Connection
+from sqlalchemy.orm import declarative_base, declared_attr
+from sqlalchemy.types import TypeDecorator
+
+from lib.config.dataset_registry import get_dataset_registry, DatasetDefinition
 
 # declarative base class
 Base = declarative_base()
 
+column_types: Dict[str, type] = {"Integer": Integer, "BigInteger": BigInteger, "Float": Float}
+
+# The day with the day number 0.
+day_number_epoch: date = date(1970, 1, 1)
+
+
+class DayNumber(TypeDecorator):
+    """Type of the columns that store a day as the number of days since day_number_epoch.
+
+    The values are dates in Python, so the columns can be compared with dates. In the database they are integers,
+    which are smaller and faster to compare than dates, which SQLite stores as text.
+    """
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[date], dialect) -> Optional[int]:
+        return (value - day_number_epoch).days if value is not None else None
+
+    def process_result_value(self, value: Optional[int], dialect) -> Optional[date]:
+        return day_number_epoch + timedelta(days=value) if value is not None else None
+
 
-class Case(Base):
-    """Class representing a case entry as it is saved in the database."""
-    __tablename__ = "cases"
+class LocationKind(IntEnum):
+    """Class representing the kind of a location, as it is stored in the location dimension."""
+    COUNTRY = 0
+    CONTINENT = 1
+    WORLD = 2
+
+
+class LocationDimension(Base):
+    """Class representing a location, as it is saved in the database.
+
+    The entries of the datasets refer to their location by its id, so the names are only stored once.
+    name: The name of the location as it is shown to the user, e.g. "United States".
+    name_normalized: The normalized name of the location (see Location.normalize_location_name).
+    kind: The LocationKind of the location. Anything that is neither a continent nor the world counts as a country.
+    """
+    __tablename__ = "locations"
+    __table_args__ = (Index("ix_locations_name_normalized", "name_normalized"),)
 
     id: Column = Column(Integer, primary_key=True)
-    date: Column = Column(Date)
-    location: Column = Column(String(256))
-    location_normalized: Column = Column(String(256))
-    cases: Column = Column(BigInteger)
-    cumulative_cases: Column = Column(BigInteger)
+    name: Column = Column(String(256))
+    name_normalized: Column = Column(String(256))
+    kind: Column = Column(SmallInteger)
 
     def __repr__(self):
-        return f"Case(id={self.id}, date={self.date}, location={self.location}, " \
-               f"location_normalized={self.location_normalized}, cases={self.cases}, " \
-               f"cumulative_cases={self.cumulative_cases})"
+        return f"LocationDimension(id={self.id}, name={self.name}, kind={LocationKind(self.kind).name})"
+
 
+class DatasetEntry:
+    """Class containing the columns that the entries of all datasets have in common.
+    day: The day of the entry, stored as its day number.
+    location_id: The id of the location of the entry in the location dimension.
+    """
+    id: Column = Column(Integer, primary_key=True)
+    day: Column = Column(DayNumber)
 
-class Vaccination(Base):
-    """Class representing a vaccination entry as it is saved in the database."""
-    __tablename__ = "vaccinations"
+    @declared_attr
+    def location_id(cls) -> Column:
+        # Columns with foreign keys can't be shared by the entities, every entity needs its own copy.
+        return Column(Integer, ForeignKey("locations.id"))
+
+    def __repr__(self):
+        values: str = ", ".join(f"{column.name}={getattr(self, column.name)}" for column in self.__table__.columns)
+        return f"{type(self).__name__}({values})"
+
+
+def create_dataset_entity(dataset: DatasetDefinition) -> type:
+    """Creates the class representing an entry of a dataset as it is saved in the database.
+
+    Besides the columns of the dataset, the entity has the cumulative columns and the rolling averages and values per
+    100k that are added when the data is loaded.
+    """
+    attributes: dict = {
+        "__tablename__": dataset.table,
+        "__doc__": f"Class representing an entry of the {dataset.name} dataset as it is saved in the database.",
+        "__table_args__": (Index(f"ix_{dataset.table}_location_day", "location_id", "day"),),
+        **{column: Column(column_types[column_type]) for column, column_type in dataset.columns.items()},
+        **{column: Column(BigInteger) for column in dataset.cumulative_columns},
+        **{column: Column(Float) for column in dataset.derived_columns},
+    }
+    return type(dataset.entity, (DatasetEntry, Base), attributes)
+
+
+# The entities of all datasets in the registry, by the name of the dataset.
+dataset_entities: Dict[str, type] = {name: create_dataset_entity(dataset)
+                                     for name, dataset in get_dataset_registry().datasets.items()}
+Case = dataset_entities["cases"]
+Vaccination = dataset_entities["vaccinations"]
+
+
+class Ranking(Base):
+    """Class representing the rank of a location for a metric in a certain period, as it is saved in the database.
+
+    The rankings are built when the data is loaded (see DatasetHandler.build_rankings), so that the locations with
+    the highest or lowest values in a period can be looked up without sorting the whole table.
+    metric: The name of the column in the table of the dataset, e.g. "daily_vaccinations".
+    period_type: "DAY", "WEEK", "MONTH", "YEAR" or "ALL" for the whole time span.
+    period_start: The first day of the period, None for "ALL".
+    rank: The rank of the location in the period, 1 being the location with the highest value.
+    """
+    __tablename__ = "rankings"
+    __table_args__ = (Index("ix_rankings_lookup", "metric", "period_type", "period_start", "rank"),)
 
     id: Column = Column(Integer, primary_key=True)
-    date: Column = Column(Date)
+    metric: Column = Column(String(64))
+    period_type: Column = Column(String(8))
+    period_start: Column = Column(Date)
+    rank: Column = Column(Integer)
     location: Column = Column(String(256))
     location_normalized: Column = Column(String(256))
-    total_vaccinations: Column = Column(BigInteger)
-    people_vaccinated: Column = Column(BigInteger)
-    daily_vaccinations: Column = Column(Integer)
-    daily_people_vaccinated: Column = Column(Integer)
+    value: Column = Column(BigInteger)
+
+    def __repr__(self):
+        return f"Ranking(id={self.id}, metric={self.metric}, period_type={self.period_type}, " \
+               f"period_start={self.period_start}, rank={self.rank}, location={self.location}, value={self.value})"
+
+
+class DatasetVersion(Base):
+    """Class representing the version of a dataset that was loaded into the database.
+    content_hash: The content hash of the snapshot that the data was loaded from (see SnapshotStore).
+    """
+    __tablename__ = "dataset_versions"
+
+    dataset: Column = Column(String(64), primary_key=True)
+    source_hash: Column = Column(String(64))
+    content_hash: Column = Column(String(64))
+    loaded: Column = Column(DateTime)
 
     def __repr__(self):
-        return f"Case(id={self.id}, date={self.date}, location={self.location}, " \
-               f"location_normalized={self.location_normalized}, total_vaccinations={self.total_vaccinations}, " \
-               f"people_vaccinated={self.people_vaccinated}, daily_vaccinations={self.daily_vaccinations}, " \
-               f"daily_people_vaccinated={self.daily_people_vaccinated})"
+        return f"DatasetVersion(dataset={self.dataset}, content_hash={self.content_hash}, loaded={self.loaded})"
 
 
-def create_tables(engine: Engine, tables=None) -> None:
+def create_tables(engine: Union[Engine, Connection], tables=None) -> None:
     """Creates (all) tables in the database."""
     if tables is None:
-        tables = [Vaccination.__table__, Case.__table__]
+        tables = _get_all_tables()
     drop_tables(engine, tables)
     Base.metadata.create_all(engine, tables)
 
 
-def drop_tables(engine: Engine, tables=None) -> None:
+def drop_tables(engine: Union[Engine, Connection], tables=None) -> None:
     """Drops (all) tables in the database."""
     if tables is None:
-        tables = [Vaccination.__table__, Case.__table__]
+        tables = _get_all_tables()
     Base.metadata.drop_all(engine, tables)
+
+
+def _get_all_tables() -> list:
+    return [LocationDimension.__table__] + [entity.__table__ for entity in dataset_entities.values()] + \
+        [Ranking.__table__, DatasetVersion.__table__]
@@ -1,20 +1,23 @@
 from __future__ import annotations
 
-import calendar
 from dataclasses import dataclass
 from datetime import datetime, timedelta, date
 from enum import Enum
-from typing import Union, Optional, List
+from typing import Union, Optional, List, Tuple, Dict, Set, Callable
 
-from sqlalchemy import and_, func, not_
+import numpy as np
+from sqlalchemy import and_, func, select, bindparam
 from sqlalchemy import desc, asc
-from sqlalchemy.engine import Engine
-from sqlalchemy.orm import Session, Query
+from sqlalchemy.engine import Engine, Result
+from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import InstrumentedAttribute
-from sqlalchemy.sql import functions
+from sqlalchemy.sql import functions, Select
 
+from lib.config.dataset_registry import get_dataset_registry, DatasetDefinition
+from lib.database.data_store import DataStore, DataTable
 from lib.database.database_connection import DatabaseConnection
-from lib.database.entities import Case, Vaccination
+from lib.database.entities import Ranking, dataset_entities, DatasetEntry, LocationDimension, LocationKind
+from lib.database.statement_cache import StatementCache
 from lib.nlu.intent.calculation_type import CalculationType
 from lib.nlu.intent.measurement_type import MeasurementType
 from lib.nlu.intent.value_domain import ValueDomain
@@ -24,6 +27,7 @@ from lib.nlu.slot.date import Date
 from lib.nlu.slot.location import Location
 from lib.nlu.topic.topic import Topic
 from lib.spacy_components.custom_spacy import get_spacy
+from lib.util import metrics
 
 
 class QueryResultCode(Enum):
@@ -62,47 +66,70 @@ class QueryResult:
     message: Contains the message object that was passed to the querier. This is needed because the AnswerGenerator
     needs to access parts of it for the generation process.
     result_code: The QueryResultCode from the performed query operation.
-    result: The actual result value from the query operation.
+    result: The actual result value from the query operation. For rankings of several locations, it is a list of
+    (location, value) pairs.
     information: Any other additional information that is needed for the AnswerGenerator to generate the answer.
     For example, when asking when the highest number of cases was recorded, the result will be the actual date, but we
     also want to pass the location where the highest number was recorded.
     """
     message: Message
     result_code: QueryResultCode
-    result: Optional[Union[str, int, datetime.date]]
+    result: Optional[Union[str, int, datetime.date, List[Tuple[str, int]]]]
     # In case of an error, we can add a dict with additional information
     information: dict
 
 
 class Querier:
     """Class containing helper methods to perform query-related operations."""
-    def __init__(self, db_name="covbot", engine=None, session=None):
-        self.engine: Engine = DatabaseConnection().create_engine(db_name) if engine is None else engine
+    def __init__(self, db_name="covbot", engine=None, session=None, data_store: Optional[DataStore] = None):
+        self.engine: Engine = DatabaseConnection().create_engine(db_name, read_only=True) if engine is None \
+            else engine
         self.session: Session = Session(self.engine, future=True) if session is None else session
-        self.case_query: Query = self.session.query(Case)
-        self.vaccination_query: Query = self.session.query(Vaccination)
-
-        self.table_dict: dict = {
-            Topic.CASES: Case,
-            Topic.VACCINATIONS: Vaccination
-        }
-
-        self.column_dict: dict = {
-            MeasurementType.DAILY: {
-                ValueDomain.POSITIVE_CASES: Case.cases,
-                ValueDomain.ADMINISTERED_VACCINES: Vaccination.daily_vaccinations,
-                ValueDomain.VACCINATED_PEOPLE: Vaccination.daily_people_vaccinated
-            },
-            MeasurementType.CUMULATIVE: {
-                ValueDomain.POSITIVE_CASES: Case.cumulative_cases,
-                ValueDomain.ADMINISTERED_VACCINES: Vaccination.total_vaccinations,
-                ValueDomain.VACCINATED_PEOPLE: Vaccination.people_vaccinated
-            }
-        }
+        # The session is the one that actually sends the statements, its engine might differ from self.engine.
+        metrics.time_sql_statements(self.session.get_bind())
+
+        self.statement_cache: StatementCache = StatementCache()
+
+        # If there is a data store, the numbers are looked up in it instead of the database.
+        self.data_store: Optional[DataStore] = data_store
+
+        datasets: Dict[str, DatasetDefinition] = get_dataset_registry().datasets
+        self.table_dict: dict = {Topic[dataset.topic]: dataset_entities[name] for name, dataset in datasets.items()}
+        self.dataset_dict: Dict[Topic, str] = {Topic[dataset.topic]: name for name, dataset in datasets.items()}
+
+        # Maps the measurement type and the value domain to the column containing the values.
+        self.column_dict: dict = {measurement_type: {} for measurement_type in MeasurementType
+                                  if measurement_type != MeasurementType.UNKNOWN}
+        for name, dataset in datasets.items():
+            for domain in dataset.value_domains:
+                for measurement_type, column in domain.measurement_columns.items():
+                    self.column_dict[MeasurementType[measurement_type]][ValueDomain[domain.name]] = \
+                        getattr(dataset_entities[name], column)
 
     # We allow setting a custom value as the "today" value so that testing becomes easier
+    @metrics.timed("query")
     def query_intent(self, msg: Message, today: datetime.date = None) -> QueryResult:
-
+        """Given a message, it queries the database and returns the result in the form of a QueryResult object."""
+        if self.data_store is not None:
+            self.data_store.refresh()
+        query_result: QueryResult = self._query_intent(msg, today)
+        metrics.query_results.inc(code=query_result.result_code.name)
+        return query_result
+
+    def query_intents(self, messages: List[Message], today: datetime.date = None) -> List[QueryResult]:
+        """Queries the messages of all the questions in a user message, in the same order.
+
+        Questions that result in the same message (e.g. "How many cases are there in Austria and how many cases are
+        there in Austria?") are only queried once.
+        """
+        results: List[QueryResult] = []
+        for index, msg in enumerate(messages):
+            # Messages contain dates and are therefore not hashable, but there are only a few of them.
+            previous: Optional[int] = next((other for other in range(index) if messages[other] == msg), None)
+            results.append(results[previous] if previous is not None else self.query_intent(msg, today))
+        return results
+
+    def _query_intent(self, msg: Message, today: datetime.date = None) -> QueryResult:
         if today is None:
             today = datetime.now().date()
 
@@ -113,174 +140,387 @@ class Querier:
         if validation_result:
             return validation_result
 
-        table: Union[Case, Vaccination] = self.table_dict[msg.topic]
+        table: DatasetEntry = self.table_dict[msg.topic]
         considered_column = self.column_dict[msg.intent.measurement_type][
             msg.intent.value_domain]
 
+        data_table: Optional[DataTable] = self.data_store.get_table(self.dataset_dict[msg.topic]) \
+            if self.data_store is not None else None
         if msg.intent.value_type == ValueType.NUMBER:
+            if data_table is not None:
+                result: Optional[QueryResult] = self._query_number_from_store(data_table, considered_column.key, msg)
+                if result is not None:
+                    return result
             return self._query_number(table, considered_column, msg)
         elif msg.intent.value_type == ValueType.LOCATION:
+            if data_table is not None:
+                result = self._query_location_from_store(data_table, considered_column.key, msg)
+                if result is not None:
+                    return result
             return self._query_location(table, considered_column, msg)
         elif msg.intent.value_type == ValueType.DAY:
+            if data_table is not None:
+                result = self._query_date_from_store(data_table, considered_column.key, msg)
+                if result is not None:
+                    return result
             return self._query_date(table, considered_column, msg)
         else:
             return QueryResult(msg, QueryResultCode.UNSUPPORTED_ACTION, None, {})
 
-    def _query_location(self, table: Union[Case, Vaccination], considered_column: InstrumentedAttribute,
+    def _query_location(self, table: DatasetEntry, considered_column: InstrumentedAttribute,
                         msg: Message) -> QueryResult:
-        """Performs the query given that we are trying to query a location."""
-        time_condition: List[bool] = self._get_timeframe_from_condition(table, msg)
-        location_condition: List[bool] = self._get_location_from_condition(table, msg)
+        """Performs the query given that we are trying to query a location.
 
-        if self.session.query(func.count(table.id)).where(and_(*time_condition, *location_condition)).scalar() == 0:
-            return QueryResult(msg, QueryResultCode.NO_DATA_AVAILABLE_FOR_DATE, None, {})
+        The locations are looked up in the rankings built when the data was loaded. If there are no rankings for the
+        considered column (e.g. because the data was added without the DatabaseManager), they are calculated with
+        an aggregate query instead.
+        """
+        if msg.intent.calculation_type not in [CalculationType.MAXIMUM, CalculationType.MINIMUM]:
+            return QueryResult(msg, QueryResultCode.UNSUPPORTED_ACTION, None, {})
 
-        if msg.intent.calculation_type in [CalculationType.MAXIMUM, CalculationType.MINIMUM]:
-            sort_order = asc if msg.intent.calculation_type == CalculationType.MINIMUM else desc
-            # We only support querying the location for daily values, e.g. asking "Which country had the most
-            # performed vaccinations last week" won't work, since we have to calculate the sum manually.
-            if msg.slots.date is None or msg.slots.date.type == "DAY":
-                query = self.session.query(table).where(and_(*time_condition, *location_condition)).order_by(
-                    sort_order(considered_column)).limit(1)
-                result = query.all()
-
-                if len(result) == 0:
-                    return QueryResult(msg, QueryResultCode.UNEXPECTED_RESULT, None, {})
-                else:
-                    return QueryResult(msg, QueryResultCode.SUCCESS, result[0].location, {})
-            else:
-                return QueryResult(msg, QueryResultCode.NO_MAX_MIN_FOR_COUNTRY_SUPPORTED, None, {})
+        period_type, period_start = self._get_period(msg)
+        limit: int = msg.slots.count if msg.slots.count is not None else 1
+        highest_first: bool = msg.intent.calculation_type == CalculationType.MAXIMUM
+        metric: str = considered_column.key
+
+        has_rankings: bool = period_type != "RANGE" and self._execute(
+            ("has_rankings",), lambda: select(Ranking.id).where(Ranking.metric == bindparam("metric")).limit(1),
+            metric=metric).first() is not None
+        if has_rankings:
+            def build_ranking_statement() -> Select:
+                # The overall rankings have no period start, which needs to be compared with "IS NULL".
+                period_condition = Ranking.period_start == None if period_type == "ALL" else \
+                    Ranking.period_start == bindparam("period_start")
+                return select(Ranking.location, Ranking.value).where(and_(
+                    Ranking.metric == bindparam("metric"), Ranking.period_type == bindparam("period_type"),
+                    period_condition
+                )).order_by(asc(Ranking.rank) if highest_first else desc(Ranking.rank)).limit(bindparam("limit"))
+
+            result = self._execute(("ranking", period_type == "ALL", highest_first), build_ranking_statement,
+                                   metric=metric, period_type=period_type, period_start=period_start,
+                                   limit=limit).all()
         else:
-            return QueryResult(msg, QueryResultCode.UNSUPPORTED_ACTION, None, {})
+            # Cumulative values of a period are represented by their last (highest) value.
+            aggregation = functions.max if msg.intent.measurement_type == MeasurementType.CUMULATIVE or \
+                period_type == "ALL" else functions.sum
+            timeframe_kind: str = self._get_timeframe_kind(msg)
+
+            def build_aggregate_statement() -> Select:
+                value = aggregation(considered_column)
+                return self._select(table, LocationDimension.name, value).where(and_(
+                    *self._get_timeframe_from_condition(table, timeframe_kind),
+                    *self._get_location_from_condition("COUNTRIES"), considered_column != None
+                )).group_by(LocationDimension.name).order_by(desc(value) if highest_first else asc(value),
+                                                             LocationDimension.name).limit(bindparam("limit"))
+
+            result = self._execute(("location", table, metric, aggregation.__name__, timeframe_kind, highest_first),
+                                   build_aggregate_statement, msg, limit=limit).all()
+
+        if len(result) == 0:
+            return self._handle_no_location_data_available(table, msg, considered_column)
+        if msg.slots.count is None:
+            return QueryResult(msg, QueryResultCode.SUCCESS, result[0][0], {})
+        return QueryResult(msg, QueryResultCode.SUCCESS, [(location, value) for location, value in result], {})
+
+    def _query_location_from_store(self, data_table: DataTable, column: str, msg: Message) -> Optional[QueryResult]:
+        """Ranks the locations by the sum of their daily values in a custom range with the prefix sums of the store.
+
+        Returns None for all other location queries, which are answered with the rankings.
+        """
+        if msg.slots.date is None or msg.slots.date.type != "RANGE" or \
+                msg.intent.measurement_type != MeasurementType.DAILY or \
+                msg.intent.calculation_type not in [CalculationType.MAXIMUM, CalculationType.MINIMUM]:
+            return None
+
+        start, end = data_table.get_day_range(self._get_timeframe(msg))
+        sums: np.ndarray = data_table.get_sum(column, start, end)
+        excluded: Set[str] = Location.get_continents().union(Location.get_world())
+        rows: np.ndarray = np.array([row for name, rows in data_table.locations.items() if name not in excluded
+                                     for row in rows if not np.isnan(sums[row])], dtype=int)
+        if len(rows) == 0:
+            return None
+
+        # Sorted by the sum and then by the name of the location, like the aggregate query in _query_location.
+        location_names: np.ndarray = np.array(data_table.location_names)[rows]
+        keys: np.ndarray = -sums[rows] if msg.intent.calculation_type == CalculationType.MAXIMUM else sums[rows]
+        limit: int = msg.slots.count if msg.slots.count is not None else 1
+        ranked: np.ndarray = np.lexsort((location_names, keys))[:limit]
+        if msg.slots.count is None:
+            return QueryResult(msg, QueryResultCode.SUCCESS, str(location_names[ranked[0]]), {})
+        return QueryResult(msg, QueryResultCode.SUCCESS, [
+            (str(location_names[index]), data_table.to_result(column, sums[rows[index]])) for index in ranked], {})
+
+    def _handle_no_location_data_available(self, table: DatasetEntry, msg: Message,
+                                           considered_column: InstrumentedAttribute) -> QueryResult:
+        """Returns the result for a location query in a period without data, together with the latest date."""
+        latest: Optional[date] = self._execute(
+            ("latest_date", table, considered_column.key),
+            lambda: self._select(table, functions.max(table.day)).where(and_(
+                *self._get_location_from_condition("COUNTRIES"), considered_column != None)),
+            msg).scalar()
+        if latest is None:
+            return QueryResult(msg, QueryResultCode.UNEXPECTED_RESULT, None, {})
+        return QueryResult(msg, QueryResultCode.NO_DATA_AVAILABLE_FOR_DATE, None,
+                           {"latest": Date("DAY", latest, ""), "location": "World"})
 
-    def _query_date(self, table: Union[Case, Vaccination], considered_column: InstrumentedAttribute,
+    @staticmethod
+    def _get_period(msg: Message) -> Tuple[str, Optional[date]]:
+        """Returns the type and the first day of the period in the date slot, as used by the rankings."""
+        if msg.slots.date is None:
+            return "ALL", None
+
+        date_value: date = msg.slots.date.value
+        if msg.slots.date.type == "DAY":
+            return "DAY", date_value
+        elif msg.slots.date.type == "WEEK":
+            return "WEEK", date_value - timedelta(days=date_value.weekday())
+        elif msg.slots.date.type == "MONTH":
+            return "MONTH", date_value.replace(day=1)
+        elif msg.slots.date.type == "YEAR":
+            return "YEAR", date(date_value.year, 1, 1)
+        elif msg.slots.date.type == "RANGE":
+            # There are no rankings for custom ranges.
+            return "RANGE", date_value
+        else:
+            raise NotImplementedError()
+
+    def _query_date(self, table: DatasetEntry, considered_column: InstrumentedAttribute,
                     msg: Message) -> QueryResult:
         """Performs the query given that we are trying to query a date."""
-        location_condition: List[bool] = self._get_location_from_condition(table, msg)
+        location_kind: str = self._get_location_kind(msg)
+        # The day is searched in the time frame of the date slot, e.g. "When were the most cases last month?".
+        timeframe_kind: str = self._get_timeframe_kind(msg)
 
-        if self.session.query(func.count(table.id)).where(and_(*location_condition)).scalar() == 0:
+        if self._count_entries(table, msg, location_kind, "ALL") == 0:
             return QueryResult(msg, QueryResultCode.NOT_EXISTING_LOCATION, None, {"location": msg.slots.location})
 
+        if self._count_entries(table, msg, location_kind, timeframe_kind) == 0:
+            return self._handle_no_data_available_for_date(table, msg, location_kind, considered_column)
+
         # In theory we could also RAW_VALUE for queries like "When did Austria have 50.000 cases", but this would
         # probably require a lot of additional program logic, so for now only maximum and minimum is supported.
         if msg.intent.calculation_type in [CalculationType.MAXIMUM, CalculationType.MINIMUM]:
             sort_order = asc if msg.intent.calculation_type == CalculationType.MINIMUM else desc
-            query = self.session.query(table).where(and_(*location_condition)).order_by(
-                sort_order(considered_column)).limit(1)
-            result = query.all()
-
-            if len(result) == 0:
+            # Days without a value are ignored, and of several days with the same value, the earliest one is taken.
+            result = self._execute(
+                ("date", table, considered_column.key, msg.intent.calculation_type, location_kind, timeframe_kind),
+                lambda: self._select(table, table.day, LocationDimension.name).where(and_(
+                    *self._get_timeframe_from_condition(table, timeframe_kind),
+                    *self._get_location_from_condition(location_kind), considered_column != None
+                )).order_by(sort_order(considered_column), asc(table.day)).limit(1),
+                msg).first()
+
+            if result is None:
+                if timeframe_kind != "ALL":
+                    return self._handle_no_data_available_for_date(table, msg, location_kind, considered_column)
                 return QueryResult(msg, QueryResultCode.UNEXPECTED_RESULT, None, {})
             else:
-                return QueryResult(msg, QueryResultCode.SUCCESS, Date("DAY", result[0].date, ""), {"location": result[0].location})
+                return QueryResult(msg, QueryResultCode.SUCCESS, Date("DAY", result.day, ""),
+                                   {"location": result.name})
         else:
             return QueryResult(msg, QueryResultCode.UNSUPPORTED_ACTION, None, {})
 
-    def _handle_no_data_available_for_date(self, table: Union[Case, Vaccination], msg: Message,
-                                           location_condition: List[bool], considered_column: InstrumentedAttribute)\
-            -> QueryResult:
-        last_date = self.session.query(table).where(and_(*location_condition + [not_(considered_column == None)])) \
-            .order_by(desc(table.date)).limit(1).all()
+    def _query_date_from_store(self, data_table: DataTable, column: str, msg: Message) -> Optional[QueryResult]:
+        """Performs the same query as _query_date on the data store, see _query_number_from_store."""
+        location_names: List[str] = list(Location.get_world()) if msg.slots.location is None else [msg.slots.location]
+        if not any(name in data_table.locations for name in location_names):
+            return QueryResult(msg, QueryResultCode.NOT_EXISTING_LOCATION, None, {"location": msg.slots.location})
+        row: Optional[int] = data_table.get_location_row(location_names)
+        if row is None:
+            return None
+        if msg.intent.calculation_type not in [CalculationType.MAXIMUM, CalculationType.MINIMUM]:
+            return QueryResult(msg, QueryResultCode.UNSUPPORTED_ACTION, None, {})
+
+        start, end = data_table.get_day_range(self._get_timeframe(msg))
+        day: Optional[int] = data_table.get_extreme_day(column, row, start, end,
+                                                        msg.intent.calculation_type == CalculationType.MAXIMUM)
+        if day is not None:
+            return QueryResult(msg, QueryResultCode.SUCCESS, Date("DAY", data_table.get_date(day), ""),
+                               {"location": data_table.location_names[row]})
+        days_with_values: np.ndarray = np.flatnonzero(~np.isnan(data_table.columns[column][row]))
+        if self._get_timeframe(msg) is None or len(days_with_values) == 0:
+            return QueryResult(msg, QueryResultCode.UNEXPECTED_RESULT, None, {})
+        return QueryResult(msg, QueryResultCode.NO_DATA_AVAILABLE_FOR_DATE, None, {
+            "latest": Date("DAY", data_table.get_date(days_with_values[-1]), ""),
+            "location": data_table.location_names[row]})
+
+    def _handle_no_data_available_for_date(self, table: DatasetEntry, msg: Message, location_kind: str,
+                                           considered_column: InstrumentedAttribute) -> QueryResult:
+        # Note the condition needs to be "!= None" instead of "is not None", otherwise it will be interpreted
+        # incorrectly
+        last_date = self._execute(
+            ("latest", table, considered_column.key, location_kind),
+            lambda: self._select(table, table.day, LocationDimension.name).where(and_(
+                *self._get_location_from_condition(location_kind), considered_column != None
+            )).order_by(desc(table.day)).limit(1),
+            msg).first()
+        if last_date is None:
+            return QueryResult(msg, QueryResultCode.UNEXPECTED_RESULT, None, {})
         return QueryResult(msg, QueryResultCode.NO_DATA_AVAILABLE_FOR_DATE,
-                           None, {"latest": Date("DAY", last_date[0].date, ""), "location": last_date[0].location})
+                           None, {"latest": Date("DAY", last_date.day, ""), "location": last_date.name})
 
-    def _query_number(self, table: Union[Case, Vaccination], considered_column: InstrumentedAttribute,
+    def _query_number(self, table: DatasetEntry, considered_column: InstrumentedAttribute,
                       msg: Message) -> QueryResult:
         """Performs the query given that we are trying to query a number."""
         # If no timeframe is given, we assume that the user is asking for today
-        time_condition: List[bool] = self._get_timeframe_from_condition(table, msg)
-        location_condition: List[bool] = self._get_location_from_condition(table, msg)
+        location_kind: str = self._get_location_kind(msg)
+        timeframe_kind: str = self._get_timeframe_kind(msg)
 
-        if self.session.query(func.count(table.id)).where(and_(*location_condition)).scalar() == 0:
+        if self._count_entries(table, msg, location_kind, "ALL") == 0:
             return QueryResult(msg, QueryResultCode.NOT_EXISTING_LOCATION, None, {"location": msg.slots.location})
 
-        if self.session.query(func.count(table.id)).where(and_(*location_condition, *time_condition)).scalar() == 0:
+        if self._count_entries(table, msg, location_kind, timeframe_kind) == 0:
             # We fetch the most recent date, since many queries were asking about "today" or "yesterday", but this
             # data often is not available.
-            # Also note the condition needs to be "== None" instead of "is None", otherwise it will be interpreted
-            # incorrectly
-            return self._handle_no_data_available_for_date(table, msg, location_condition, considered_column)
-
-        def get_query(query_list: list):
-            return self.session.query(*query_list).where(and_(
-                *time_condition, *location_condition
-            ))
+            return self._handle_no_data_available_for_date(table, msg, location_kind, considered_column)
 
-        if msg.intent.calculation_type == CalculationType.RAW_VALUE:
-            query = get_query([considered_column, table.location]).order_by(desc(table.date))
-        elif msg.intent.calculation_type == CalculationType.SUM:
-            query = get_query([functions.sum(considered_column), table.location]).group_by(table.location)
-        elif msg.intent.calculation_type == CalculationType.MAXIMUM:
-            query = get_query([functions.max(considered_column), table.location]).group_by(table.location)
-        elif msg.intent.calculation_type == CalculationType.MINIMUM:
-            query = get_query([functions.min(considered_column), table.location]).group_by(table.location)
-        else:
+        calculation_type: CalculationType = msg.intent.calculation_type
+        aggregations: dict = {CalculationType.SUM: functions.sum, CalculationType.MAXIMUM: functions.max,
+                              CalculationType.MINIMUM: functions.min}
+        if calculation_type != CalculationType.RAW_VALUE and calculation_type not in aggregations:
             return QueryResult(msg, QueryResultCode.UNSUPPORTED_ACTION, None, {})
 
-        if msg.intent.calculation_type == CalculationType.RAW_VALUE:
-            query = query.limit(1)
+        def build_statement() -> Select:
+            conditions: List[bool] = self._get_timeframe_from_condition(table, timeframe_kind) + \
+                self._get_location_from_condition(location_kind)
+            if calculation_type == CalculationType.RAW_VALUE:
+                return self._select(table, considered_column, LocationDimension.name).where(and_(*conditions)) \
+                    .order_by(desc(table.day)).limit(1)
+            return self._select(table, aggregations[calculation_type](considered_column), LocationDimension.name) \
+                .where(and_(*conditions)).group_by(LocationDimension.name)
 
-        result = query.all()
+        result = self._execute(("number", table, considered_column.key, calculation_type, location_kind,
+                                timeframe_kind), build_statement, msg).all()
 
         if len(result) > 1:
             return QueryResult(msg, QueryResultCode.UNEXPECTED_RESULT, None, {})
         else:
             if result[0][0] is None:
-                return self._handle_no_data_available_for_date(table, msg, location_condition, considered_column)
+                return self._handle_no_data_available_for_date(table, msg, location_kind, considered_column)
             else:
                 return QueryResult(msg, QueryResultCode.SUCCESS, result[0][0], {"location": result[0][1]})
 
-    def _get_location_from_condition(self, table: Union[Case, Vaccination], msg: Message) -> List[bool]:
-        """Extracts the condition for the location slot."""
+    def _query_number_from_store(self, data_table: DataTable, column: str, msg: Message) -> Optional[QueryResult]:
+        """Performs the same query as _query_number on the data store.
+
+        Returns None if the query can't be answered from the data store, e.g. because several locations have the same
+        normalized name.
+        """
+        location_names: List[str] = list(Location.get_world()) if msg.slots.location is None else [msg.slots.location]
+        if not any(name in data_table.locations for name in location_names):
+            return QueryResult(msg, QueryResultCode.NOT_EXISTING_LOCATION, None, {"location": msg.slots.location})
+        row: Optional[int] = data_table.get_location_row(location_names)
+        if row is None:
+            return None
+
+        start, end = data_table.get_day_range(self._get_timeframe(msg))
+        if msg.intent.calculation_type == CalculationType.RAW_VALUE:
+            # The value of the latest day with an entry, even if the value itself is missing.
+            present_days: np.ndarray = np.flatnonzero(data_table.present[row, start:end])
+            value: float = data_table.columns[column][row, start + present_days[-1]] if len(present_days) > 0 \
+                else np.nan
+        elif msg.intent.calculation_type == CalculationType.SUM:
+            value = data_table.get_sum(column, start, end, row)
+        elif msg.intent.calculation_type in [CalculationType.MAXIMUM, CalculationType.MINIMUM]:
+            day: Optional[int] = data_table.get_extreme_day(
+                column, row, start, end, msg.intent.calculation_type == CalculationType.MAXIMUM)
+            value = data_table.columns[column][row, day] if day is not None else np.nan
+        else:
+            return QueryResult(msg, QueryResultCode.UNSUPPORTED_ACTION, None, {})
+
+        if not np.isnan(value):
+            return QueryResult(msg, QueryResultCode.SUCCESS, data_table.to_result(column, value),
+                               {"location": data_table.location_names[row]})
+        # The latest day with a value, see _handle_no_data_available_for_date.
+        days_with_values: np.ndarray = np.flatnonzero(~np.isnan(data_table.columns[column][row]))
+        if len(days_with_values) == 0:
+            return None
+        return QueryResult(msg, QueryResultCode.NO_DATA_AVAILABLE_FOR_DATE, None, {
+            "latest": Date("DAY", data_table.get_date(days_with_values[-1]), ""),
+            "location": data_table.location_names[row]})
+
+    def _execute(self, key: tuple, build: Callable[[], Select], msg: Optional[Message] = None,
+                 **parameters) -> Result:
+        """Executes the statement with the given key from the statement cache, building it with build if necessary.
+
+        If there is a message, its location and the first and last day of its time frame are passed as the bind
+        parameters "location", "start" and "end".
+        """
+        if msg is not None:
+            timeframe: Optional[Tuple[date, date]] = self._get_timeframe(msg)
+            parameters = {"location": msg.slots.location, "start": timeframe[0] if timeframe else None,
+                          "end": timeframe[1] if timeframe else None, **parameters}
+        return self.session.execute(self.statement_cache.get(key, build), parameters)
+
+    def _count_entries(self, table: DatasetEntry, msg: Message, location_kind: str, timeframe_kind: str) -> int:
+        """Counts the entries in the table for the location and the time frame of the message."""
+        return self._execute(
+            ("count", table, location_kind, timeframe_kind),
+            lambda: self._select(table, func.count(table.id)).where(and_(
+                *self._get_location_from_condition(location_kind),
+                *self._get_timeframe_from_condition(table, timeframe_kind)
+            )),
+            msg).scalar()
+
+    @staticmethod
+    def _select(table: DatasetEntry, *columns) -> Select:
+        """Selects the columns from the entries of the table, joined with their locations."""
+        return select(*columns).join_from(table, LocationDimension)
+
+    @staticmethod
+    def _get_location_kind(msg: Message) -> str:
+        """Returns the kind of condition for the location slot, see _get_location_from_condition."""
         # If we are querying the location, we just ignore whatever is in there since we don't need it.
-        # But we have to make sure that we don't get any continents or data on the whole world.
-        # e.g. When asking "Where have most cases been recorded?" we don't want it to return the whole
-        # world as a location. This is why we need to return the condition that excludes this locations.
         if msg.intent.value_type == ValueType.LOCATION:
-            return [not_(table.location_normalized.in_(list(Location.get_continents().union(Location.get_world()))))]
+            return "COUNTRIES"
+        return "WORLD" if msg.slots.location is None else "LOCATION"
 
-        if msg.slots.location is None:
-            return [table.location_normalized.in_(list(Location.get_world()))]
+    @staticmethod
+    def _get_location_from_condition(location_kind: str) -> List[bool]:
+        """Builds the condition on the locations joined by _select, the location is the bind parameter "location"."""
+        # When querying the location, we have to make sure that we don't get any continents or data on the whole
+        # world. e.g. When asking "Where have most cases been recorded?" we don't want it to return the whole
+        # world as a location. This is why we need to return the condition that only includes countries.
+        if location_kind == "COUNTRIES":
+            return [LocationDimension.kind == LocationKind.COUNTRY.value]
+
+        if location_kind == "WORLD":
+            return [LocationDimension.kind == LocationKind.WORLD.value]
         else:
             # Otherwise, we limit the country.
-            return [table.location_normalized == msg.slots.location]
+            return [LocationDimension.name_normalized == bindparam("location")]
+
+    def _get_timeframe_kind(self, msg: Message) -> str:
+        """Returns the kind of condition for the date slot, see _get_timeframe_from_condition."""
+        timeframe: Optional[Tuple[date, date]] = self._get_timeframe(msg)
+        if timeframe is None:
+            return "ALL"
+        return "DAY" if timeframe[0] == timeframe[1] else "PERIOD"
 
-    def _get_timeframe_from_condition(self, table: Union[Case, Vaccination], msg: Message) -> List[bool]:
-        """Extracts the time frame for the date slot."""
-        # If we are asking for the day, we just ignore any timeframes found, since the task of the query
-        # is to find the date.
-        if msg.intent.value_type == ValueType.DAY:
+    @staticmethod
+    def _get_timeframe_from_condition(table: DatasetEntry, timeframe_kind: str) -> List[bool]:
+        """Builds the condition for the date slot, the first and last day are the bind parameters "start" and "end"."""
+        if timeframe_kind == "ALL":
             return []
+        if timeframe_kind == "DAY":
+            return [table.day == bindparam("start")]
+        return [table.day >= bindparam("start"), table.day <= bindparam("end")]
+
+    @staticmethod
+    def _get_timeframe(msg: Message) -> Optional[Tuple[date, date]]:
+        """Returns the first and the last day of the time frame in the date slot, or None if there is no limit."""
         if msg.slots.date is None:
             # If we are looking for the cumulative value, we assume by default that we are looking for the value
             # from today. However, this is already taken into account by the fact that we sort the entries descending
             # by date, so we don't need any special condition for that.
-            return []
+            return None
 
-        date_type: str = msg.slots.date.type
-        date_value: datetime.date = msg.slots.date.value
-
-        # Generate the timeframe depending on what kind of time period we are dealing with.
-        if date_type == "DAY":
-            return [table.date == date_value]
-        elif date_type == "WEEK":
-            start = date_value - timedelta(days=date_value.weekday())
-            end = start + timedelta(days=6)
-            return [table.date >= start, table.date <= end]
-        elif date_type == "MONTH":
-            start = date_value.replace(day=1)
-            end = date_value.replace(day=calendar.monthrange(date_value.year, date_value.month)[1])
-            return [table.date >= start, table.date <= end]
-        elif date_type == "YEAR":
-            start = date(date_value.year, 1, 1)
-            end = date(date_value.year, 12, 31)
-            return [table.date >= start, table.date <= end]
-        else:
-            raise NotImplementedError()
+        return msg.slots.date.get_timeframe()
 
     def _validate_msg(self, msg: Message, today: datetime.date) -> Optional[QueryResult]:
         """Checks the validity of the message."""
         msg_validation: MessageValidationCode = Message.validate_message(msg)
+        metrics.message_validations.inc(code=msg_validation.name)
 
         if msg_validation != MessageValidationCode.VALID:
             return QueryResult(msg, QueryResultCode.INVALID_MESSAGE, None, {"message_validation_code": msg_validation})
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Dict, List
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from lib.config.dataset_registry import DatasetDefinition
+
+# Snapshots written by an older version of the preprocessing are rebuilt.
+snapshot_format_version: int = 1
+
+
+@dataclass
+class Snapshot:
+    """Class representing a preprocessed dataset, as it is stored by the SnapshotStore.
+    source_hash: The hash of everything the data is derived from (see SnapshotStore.get_source_hash).
+    content_hash: The hash of the data itself.
+    data: The preprocessed data. The numeric columns are memory mapped from the snapshot.
+    """
+    dataset: str
+    source_hash: str
+    content_hash: str
+    data: DataFrame
+
+
+class SnapshotStore:
+    """Class that stores the preprocessed datasets as versioned columnar snapshots.
+
+    The snapshot of a dataset is a directory with one .npy file per column and a meta.json describing the columns.
+    Columns containing strings (e.g. the locations and dates) are dictionary encoded, their values are stored in the
+    meta.json. The file "CURRENT" in the directory of the dataset points to the latest snapshot. It is replaced
+    atomically, so a snapshot is never read while it is being written.
+    """
+    def __init__(self, directory: Optional[pathlib.Path] = None):
+        if directory is None:
+            directory = pathlib.Path(os.environ.get("COVBOT_SNAPSHOT_PATH") or
+                                     pathlib.Path(os.environ.get("COVBOT_DB_PATH")) / "snapshots")
+        self.directory: pathlib.Path = directory
+
+    @staticmethod
+    def get_source_hash(dataset: DatasetDefinition) -> str:
+        """Hashes the data file, the declaration of the dataset and the population table."""
+        source_hash = hashlib.sha256(f"{snapshot_format_version}:{dataset!r}".encode())
+        for path in [dataset.local_path, pathlib.Path(__file__).parent / "population.csv"]:
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 20), b""):
+                    source_hash.update(chunk)
+        return source_hash.hexdigest()
+
+    def load(self, dataset: DatasetDefinition, source_hash: Optional[str] = None) -> Optional[Snapshot]:
+        """Loads the latest snapshot of a dataset. Returns None if there is none or if it has another source hash."""
+        try:
+            with open(self.directory / dataset.name / "CURRENT") as current_file:
+                current: dict = json.load(current_file)
+        except FileNotFoundError:
+            return None
+        if current["format_version"] != snapshot_format_version or \
+                (source_hash is not None and current["source_hash"] != source_hash):
+            return None
+
+        path: pathlib.Path = self.directory / dataset.name / current["version"]
+        with open(path / "meta.json") as meta_file:
+            meta: dict = json.load(meta_file)
+        columns: Dict[str, np.ndarray] = {}
+        for column in meta["columns"]:
+            values: np.ndarray = np.load(path / f"{column['name']}.npy", mmap_mode="r")
+            if "values" in column:
+                # Missing values have the code -1, which takes the None at the end.
+                values = np.array(column["values"] + [None], dtype=object).take(values)
+            columns[column["name"]] = values
+        return Snapshot(dataset.name, meta["source_hash"], meta["content_hash"], DataFrame(columns, copy=False))
+
+    def save(self, dataset: DatasetDefinition, data: DataFrame, source_hash: str) -> Snapshot:
+        """Stores the preprocessed data of a dataset as its latest snapshot and removes the older snapshots."""
+        dataset_directory: pathlib.Path = self.directory / dataset.name
+        temporary_path: pathlib.Path = dataset_directory / f".tmp-{uuid.uuid4().hex}"
+        temporary_path.mkdir(parents=True)
+
+        content_hash = hashlib.sha256()
+        columns: List[dict] = []
+        for name in data.columns:
+            column: dict = {"name": name}
+            values: np.ndarray = data[name].to_numpy()
+            if values.dtype == object:
+                codes, uniques = pd.factorize(data[name])
+                values = codes.astype(np.int32)
+                column["values"] = uniques.tolist()
+                content_hash.update(json.dumps(column["values"]).encode())
+            column["dtype"] = str(values.dtype)
+            content_hash.update(name.encode())
+            content_hash.update(np.ascontiguousarray(values).tobytes())
+            np.save(temporary_path / f"{name}.npy", values)
+            columns.append(column)
+
+        meta: dict = {"dataset": dataset.name, "format_version": snapshot_format_version,
+                      "source_hash": source_hash, "content_hash": content_hash.hexdigest(),
+                      "created": datetime.now().isoformat(), "rows": len(data), "columns": columns}
+        with open(temporary_path / "meta.json", "w") as meta_file:
+            json.dump(meta, meta_file)
+
+        version: str = f"{datetime.now():%Y%m%d%H%M%S}-{meta['content_hash'][:12]}"
+        try:
+            os.replace(temporary_path, dataset_directory / version)
+        except OSError:
+            # Another process just stored the same snapshot.
+            shutil.rmtree(temporary_path, ignore_errors=True)
+        self._write_current(dataset_directory, {"version": version, "format_version": snapshot_format_version,
+                                                "source_hash": source_hash, "content_hash": meta["content_hash"]})
+        self._remove_old_snapshots(dataset_directory, version)
+        return self.load(dataset)
+
+    @staticmethod
+    def _write_current(dataset_directory: pathlib.Path, current: dict) -> None:
+        temporary_path: pathlib.Path = dataset_directory / f".CURRENT-{uuid.uuid4().hex}"
+        with open(temporary_path, "w") as current_file:
+            json.dump(current, current_file)
+        os.replace(temporary_path, dataset_directory / "CURRENT")
+
+    @staticmethod
+    def _remove_old_snapshots(dataset_directory: pathlib.Path, version: str) -> None:
+        """Removes all snapshots but the latest. Processes that still map their files can keep using them."""
+        for path in dataset_directory.iterdir():
+            if path.is_dir() and path.name != version and not path.name.startswith(".tmp-"):
+                shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+from sqlalchemy.sql import Executable
+
+from lib.util.metrics import record_cache_lookup
+
+
+class StatementCache:
+    """Class that keeps the SQL statements of the Querier, so that each statement is only built once.
+
+    The statements are keyed by the shape of the intent they answer (e.g. the table, the column, the calculation type
+    and the kind of time frame), everything that differs between intents of the same shape, like the location or the
+    dates, is a bind parameter. Since the same statement object is executed again, SQLAlchemy finds its compiled form
+    in the compiled cache of the engine without having to compile it or to generate its cache key again.
+    """
+    def __init__(self):
+        self._statements: Dict[Hashable, Executable] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: Hashable, build: Callable[[], Executable]) -> Executable:
+        """Returns the statement with the given key, building it with build if it isn't in the cache yet."""
+        statement: Optional[Executable] = self._statements.get(key)
+        hit: bool = statement is not None
+        if not hit:
+            with self._lock:
+                statement = self._statements.setdefault(key, build())
+        record_cache_lookup("sql_statement", hit)
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return statement
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        """The share of the lookups that found their statement in the cache, None if there were no lookups."""
+        lookups: int = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else None
+
+    def __len__(self) -> int:
+        return len(self._statements)
@@ -1,17 +1,26 @@
 import decimal
+import itertools
+import math
 import pathlib
 import random
-import re
-from typing import Tuple
+from datetime import datetime
+from typing import Tuple, Dict, List, Union
 
 import yaml
 
+from lib.config.dataset_registry import get_dataset_registry
 from lib.database.querier import QueryResultCode, QueryResult
-from lib.nlu.intent import Intent, ValueType
+from lib.nlg.answer_template import AnswerTemplate
+from lib.nlu.intent import Intent, ValueType, ValueDomain, CalculationType, MeasurementType
 from lib.nlu.message import Message, MessageValidationCode
 from lib.nlu.slot import Slots
 from lib.nlu.slot.date import Date
 from lib.nlu.slot.location import Location
+from lib.nlu.topic import Topic
+from lib.util.metrics import timed
+
+IntentKey = Tuple[ValueDomain, ValueType, CalculationType, MeasurementType]
+RankingKey = Tuple[ValueDomain, CalculationType, MeasurementType]
 
 
 class AnswerGenerator:
@@ -29,62 +38,188 @@ class AnswerGenerator:
     also inside the <> brackets. This means that in the event that no location parameter is passed to the answer
     generator, the "in" will be omitted as well. So two possible answer generated from this pattern might be
     "There have been 1,000 cases." and "There have been 1,000 cases in Austria.".
+
+    The patterns are compiled into AnswerTemplate objects when the answer generator is created. Creating it fails
+    if there is no pattern for an intent that can occur in a valid message.
     """
     def __init__(self):
         with open(pathlib.Path(__file__).parent / "answers.yaml") as answers_file:
             self.answers: dict = yaml.safe_load(answers_file)
 
+        # All patterns are compiled once here, so that generating an answer is just a lookup and a format call.
+        self._templates: Dict[str, List[AnswerTemplate]] = {
+            code.name: self._compile(self.answers[code.name]) for code in [
+                QueryResultCode.NO_DATA_AVAILABLE_FOR_DATE, QueryResultCode.UNEXPECTED_RESULT,
+                QueryResultCode.FUTURE_DATA_REQUESTED, QueryResultCode.UNSUPPORTED_ACTION,
+                QueryResultCode.NO_MAX_MIN_FOR_COUNTRY_SUPPORTED, QueryResultCode.NOT_EXISTING_LOCATION]
+        }
+        # Used if the query succeeded, but the value is missing, e.g. the average at the start of the data.
+        self._templates["NO_VALUE_AVAILABLE"] = self._compile(self.answers["NO_VALUE_AVAILABLE"])
+        self._invalid_message_templates: Dict[str, List[AnswerTemplate]] = {
+            name: self._compile(patterns)
+            for name, patterns in self.answers[QueryResultCode.INVALID_MESSAGE.name].items()
+        }
+        self._success_templates: Dict[IntentKey, List[AnswerTemplate]] = self._compile_success_templates(
+            self.answers[QueryResultCode.SUCCESS.name])
+        self._ranking_templates: Dict[RankingKey, List[AnswerTemplate]] = self._compile_ranking_templates(
+            self.answers["RANKING"])
+
+    @staticmethod
+    def _compile(patterns: List[str]) -> List[AnswerTemplate]:
+        """Compiles a list of answer patterns."""
+        return [AnswerTemplate(pattern) for pattern in patterns]
+
+    def _compile_success_templates(self, success_answers: dict) -> Dict[IntentKey, List[AnswerTemplate]]:
+        """Compiles the success answer patterns and makes sure that every valid intent has at least one pattern."""
+        templates: Dict[IntentKey, List[AnswerTemplate]] = {}
+        for value_domain, value_types in success_answers.items():
+            for value_type, calculation_types in value_types.items():
+                for calculation_type, measurement_types in calculation_types.items():
+                    for measurement_type, patterns in measurement_types.items():
+                        key: IntentKey = (ValueDomain[value_domain], ValueType[value_type],
+                                          CalculationType[calculation_type], MeasurementType[measurement_type])
+                        templates[key] = self._compile(patterns)
+
+        for key in self.get_valid_intent_keys():
+            if len(templates.get(key, [])) == 0:
+                raise ValueError(f"There is no answer pattern for the intent {tuple(part.name for part in key)} "
+                                 f"in answers.yaml.")
+            for template in templates[key]:
+                # The result is the only field that is always passed on to the success patterns.
+                if not template.required_fields.issubset({"result"}):
+                    raise ValueError(f"The answer pattern {template.pattern!r} needs the fields "
+                                     f"{sorted(template.required_fields)}, but only the result is always available. "
+                                     f"Wrap the other fields in <>.")
+
+        return templates
+
+    def _compile_ranking_templates(self, ranking_answers: dict) -> Dict[RankingKey, List[AnswerTemplate]]:
+        """Compiles the answer patterns for rankings of several locations and makes sure that none is missing."""
+        templates: Dict[RankingKey, List[AnswerTemplate]] = {
+            (ValueDomain[value_domain], CalculationType[calculation_type], MeasurementType[measurement_type]):
+                self._compile(patterns)
+            for value_domain, calculation_types in ranking_answers.items()
+            for calculation_type, measurement_types in calculation_types.items()
+            for measurement_type, patterns in measurement_types.items()
+        }
+
+        for key in itertools.product([domain for domain in ValueDomain if domain != ValueDomain.UNKNOWN],
+                                     [CalculationType.MAXIMUM, CalculationType.MINIMUM],
+                                     [MeasurementType.DAILY, MeasurementType.CUMULATIVE]):
+            if len(templates.get(key, [])) == 0:
+                raise ValueError(f"There is no ranking answer pattern for {tuple(part.name for part in key)} "
+                                 f"in answers.yaml.")
+            for template in templates[key]:
+                if not template.required_fields.issubset({"result", "count"}):
+                    raise ValueError(f"The ranking answer pattern {template.pattern!r} needs the fields "
+                                     f"{sorted(template.required_fields)}, but only the result and the count are "
+                                     f"always available.")
+        return templates
+
+    @staticmethod
+    def get_valid_intent_keys() -> List[IntentKey]:
+        """Returns all combinations of intent fields that can occur in a valid message, with or without a date."""
+        valid_keys: List[IntentKey] = []
+        for key in itertools.product([domain for domain in ValueDomain if domain != ValueDomain.UNKNOWN],
+                                     [value_type for value_type in ValueType if value_type != ValueType.UNKNOWN],
+                                     [calculation for calculation in CalculationType
+                                      if calculation != CalculationType.UNKNOWN],
+                                     [measurement for measurement in MeasurementType
+                                      if measurement != MeasurementType.UNKNOWN]):
+            topic: Topic = Topic[get_dataset_registry().get_dataset_by_value_domain(key[0].name).topic]
+            intent: Intent = Intent(key[2], key[1], key[0], key[3])
+            for date in [None, Date("DAY", datetime.now().date(), "today")]:
+                if Message.validate_message(Message(topic, intent, Slots(date, None))) == MessageValidationCode.VALID:
+                    valid_keys.append(key)
+                    break
+        return valid_keys
+
+    @timed("answer_generation")
     def generate_answer(self, query_result: QueryResult) -> str:
         """Generates an answer based on a QueryResult object."""
         if query_result.result_code == QueryResultCode.NO_DATA_AVAILABLE_FOR_DATE:
             # Latest date contains the most recent date for which we have information available.
-            return random.choice(self.answers[query_result.result_code.NO_DATA_AVAILABLE_FOR_DATE.name]).format(
-                date=query_result.message.slots.date,
-                latest_date=Date.generate_date_message(query_result.information["latest"], include_preposition=False),
-                location=Location.add_prepositions_to_location_name(query_result.information["location"]),
-                topic=query_result.message.topic.name.lower()
-            )
+            return random.choice(self._templates[query_result.result_code.name]).format({
+                "date": query_result.message.slots.date,
+                "latest_date": Date.generate_date_message(query_result.information["latest"],
+                                                          include_preposition=False),
+                "location": Location.add_prepositions_to_location_name(query_result.information["location"]),
+                "topic": query_result.message.topic.name.lower()
+            })
         elif query_result.result_code in [QueryResultCode.UNEXPECTED_RESULT,
                                           QueryResultCode.FUTURE_DATA_REQUESTED,
                                           QueryResultCode.UNSUPPORTED_ACTION,
                                           QueryResultCode.NO_MAX_MIN_FOR_COUNTRY_SUPPORTED]:
-            return random.choice(self.answers[query_result.result_code.name])
+            return random.choice(self._templates[query_result.result_code.name]).format({})
         elif query_result.result_code == QueryResultCode.NOT_EXISTING_LOCATION:
-            return random.choice(self.answers[query_result.result_code.name]).format(location=query_result.message.slots.location)
+            return random.choice(self._templates[query_result.result_code.name]).format(
+                {"location": query_result.message.slots.location})
         elif query_result.result_code == QueryResultCode.INVALID_MESSAGE:
             # Check whether the invalid message is due to a user error or a not considered case server-side.
             if query_result.information["message_validation_code"] in MessageValidationCode.get_user_query_error_codes():
-                return random.choice(self.answers[query_result.result_code.name][query_result.information["message_validation_code"].name])
+                return random.choice(self._invalid_message_templates[
+                                         query_result.information["message_validation_code"].name]).format({})
             else:
                 # An unconsidered case occurred, maybe a special combination of the various fields for the intent.
-                return random.choice(self.answers[query_result.result_code.name]["INTERNAL_ERROR"])
+                return random.choice(self._invalid_message_templates["INTERNAL_ERROR"]).format({})
         elif query_result.result_code == QueryResultCode.SUCCESS:
             return self._generate_success_answer(query_result)
         else:
             raise NotImplementedError()
 
+    def generate_answers(self, query_results: List[QueryResult]) -> str:
+        """Generates a single answer to a message with several questions, answering them in order."""
+        answers: List[str] = []
+        for index, query_result in enumerate(query_results):
+            # The same question asked twice is only answered once, see Querier.query_intents.
+            if all(query_result is not previous for previous in query_results[:index]):
+                answers.append(self.generate_answer(query_result))
+        return " ".join(answers)
+
     def _generate_success_answer(self, query_result: QueryResult) -> str:
         """Generates an answer based on the assumption that the query was successful."""
-        message: Message = query_result.message
+        intent: Intent = query_result.message.intent
+        if not self._has_value(query_result.result):
+            return self._generate_no_value_answer(query_result)
         sub_fields: dict = self._get_sub_fields_from_slots_for_success_message(query_result)
 
-        unformatted_answer: str = random.choice(self.answers["SUCCESS"][message.intent.value_domain.name]
-                                 [message.intent.value_type.name][message.intent.calculation_type.name]
-                                 [message.intent.measurement_type.name])
-
-        # Remove opional fields if they are not in the parameters
-        if "location" not in sub_fields:
-            unformatted_answer = re.sub(r"<[^<]*{location}[^>]*>", "", unformatted_answer)
-        if "date" not in sub_fields:
-            unformatted_answer = re.sub(r"<[^<]*{date}[^>]*>", "", unformatted_answer)
-
-        unformatted_answer = re.sub(r"<|>", "", unformatted_answer)
-
-        try:
-            return unformatted_answer.format(**sub_fields)
-        except KeyError:
-            # We tried to format with a key that doesn't exist in the answer pattern
-            raise NotImplementedError()
+        if isinstance(query_result.result, list):
+            # A ranking of several locations, e.g. "What are the top 5 countries by vaccinations?".
+            templates: List[AnswerTemplate] = self._ranking_templates[(intent.value_domain, intent.calculation_type,
+                                                                       intent.measurement_type)]
+        else:
+            templates = self._success_templates[(intent.value_domain, intent.value_type, intent.calculation_type,
+                                                 intent.measurement_type)]
+        return random.choice(templates).format(sub_fields)
+
+    @staticmethod
+    def _is_missing(value) -> bool:
+        """Checks whether a value is a missing number, e.g. the NaN of an average without enough days of data."""
+        return isinstance(value, (int, float, decimal.Decimal)) and not math.isfinite(value)
+
+    def _has_value(self, result) -> bool:
+        """Checks whether the result of a successful query contains at least one value that can be answered with."""
+        if isinstance(result, list):
+            return any(not self._is_missing(value) for _, value in result)
+        return not self._is_missing(result)
+
+    def _generate_no_value_answer(self, query_result: QueryResult) -> str:
+        """Generates the answer for a successful query whose value is missing."""
+        fields: dict = {"topic": query_result.message.topic.name.lower()}
+        if query_result.information.get("location"):
+            fields["location"] = Location.add_prepositions_to_location_name(query_result.information["location"])
+        if query_result.message.slots.date:
+            fields["date"] = Date.generate_date_message(query_result.message.slots.date)
+        return random.choice(self._templates["NO_VALUE_AVAILABLE"]).format(fields)
+
+    @staticmethod
+    def format_number(number: Union[int, float, decimal.Decimal]) -> str:
+        """Formats a number with thousands separators. Averages and values per 100k keep one decimal place.
+        The number needs to be finite, missing values are answered with the NO_VALUE_AVAILABLE answer instead.
+        """
+        if number == int(number):
+            return f"{int(number):,}"
+        return f"{number:,.1f}"
 
     def _get_sub_fields_from_slots_for_success_message(self, query_result: QueryResult) -> dict:
         """Extracts the additional information from the query results into a dict."""
@@ -93,9 +228,17 @@ class AnswerGenerator:
         value_dict = dict()
 
         if result is not None:
-            # Format integers properly
-            if isinstance(result, (int, float, decimal.Decimal)):
-                value_dict["result"] = f"{int(result):,}"
+            if isinstance(result, list):
+                # e.g. "Austria (1,200), Germany (1,000) and Ukraine (800)"
+                # Locations without a value, e.g. without a population for the values per 100k, are left out.
+                entries: List[str] = [
+                    f"{Location.add_prepositions_to_location_name(location)} ({self.format_number(value)})"
+                    for location, value in result if not self._is_missing(value)]
+                value_dict["result"] = entries[0] if len(entries) == 1 else \
+                    ", ".join(entries[:-1]) + " and " + entries[-1]
+                value_dict["count"] = len(entries)
+            elif isinstance(result, (int, float, decimal.Decimal)):
+                value_dict["result"] = self.format_number(result)
             else:
                 value_dict["result"] = str(result)
 
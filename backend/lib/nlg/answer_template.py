@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import itertools
+import re
+from typing import Dict, FrozenSet, List
+
+
+class AnswerTemplate:
+    """Class representing a compiled answer pattern from the answers.yaml file.
+
+    When the template is created, the pattern is split into its required fields (the ones outside of <>) and its
+    optional fields (the ones inside of <>). For every combination of optional fields that might be present, a
+    ready-made format string is prepared, in which the optional sections of the absent fields are already removed.
+    Formatting an answer then only needs a dictionary lookup and a call to str.format.
+    """
+    _optional_section: re.Pattern = re.compile(r"<([^<>]*)>")
+    _field: re.Pattern = re.compile(r"{(\w+)}")
+
+    def __init__(self, pattern: str):
+        self.pattern: str = pattern
+        sections: List[str] = self._optional_section.findall(pattern)
+
+        self.optional_fields: FrozenSet[str] = frozenset(field for section in sections
+                                                         for field in self._field.findall(section))
+        self.required_fields: FrozenSet[str] = frozenset(self._field.findall(self._optional_section.sub("", pattern)))
+
+        self.variants: Dict[FrozenSet[str], str] = {}
+        for size in range(len(self.optional_fields) + 1):
+            for present_fields in itertools.combinations(sorted(self.optional_fields), size):
+                self.variants[frozenset(present_fields)] = self._create_variant(frozenset(present_fields))
+
+    def _create_variant(self, present_fields: FrozenSet[str]) -> str:
+        """Creates the format string for the case that exactly the given optional fields are present."""
+        def replace_section(match: re.Match) -> str:
+            # A section is only kept if all the fields it contains are present.
+            if set(self._field.findall(match.group(1))).issubset(present_fields):
+                return match.group(1)
+            return ""
+
+        return self._optional_section.sub(replace_section, self.pattern)
+
+    def format(self, fields: dict) -> str:
+        """Formats the answer with the given fields. Fields that don't appear in the pattern are ignored."""
+        missing_fields: FrozenSet[str] = self.required_fields.difference(fields)
+        if missing_fields:
+            raise KeyError(f"Missing the required fields {sorted(missing_fields)} for the pattern {self.pattern!r}.")
+        return self.variants[self.optional_fields.intersection(fields)].format(**fields)
+
+    def __repr__(self):
+        return f"AnswerTemplate({self.pattern!r})"
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import os
+import pathlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from spacy.tokens import Span
+
+from lib.nlu.intent.calculation_type import CalculationType
+from lib.nlu.intent.intent import Intent, IntentRecognizer
+from lib.nlu.intent.measurement_type import MeasurementType
+from lib.nlu.intent.value_domain import ValueDomain
+from lib.nlu.intent.value_type import ValueType
+from lib.nlu.topic.topic import Topic
+from lib.util.logger import ServerLogger
+from lib.util.metrics import timed
+
+# The trained model that is used by default, see scripts/train_classifier.py.
+default_model_path: pathlib.Path = pathlib.Path(__file__).parent / "intent_classifier.npz"
+
+
+@dataclass
+class ClassifierPrediction:
+    """Class representing the topic and the intent that the IntentClassifier predicted for a span.
+    confidences: The probability of the predicted label of each field, e.g. {"topic": 0.97, "value_type": 0.88, ...}.
+    """
+    topic: Topic
+    intent: Intent
+    confidences: Dict[str, float]
+
+    @property
+    def confidence(self) -> float:
+        """The confidence of the least certain field."""
+        return min(self.confidences.values())
+
+
+class IntentClassifier:
+    """Class that predicts the topic and the intent of spans with a linear classifier, as an alternative to the rules.
+
+    Each span is described by binary features: the stems of its words, its dependency relations (e.g.
+    "dep=nsubj:report>case"), its question words, the labels of the entities spaCy found in it and the text patterns
+    of the IntentRecognizer. Every field (the topic and the four fields of the intent) has a softmax layer over these
+    features. The weights of all fields are one matrix, so a batch of spans is classified with a single matrix
+    product. The classifier is trained offline with scripts/train_classifier.py and only needs NumPy at runtime.
+    """
+    fields: List[str] = ["topic", "calculation_type", "value_type", "value_domain", "measurement_type"]
+
+    def __init__(self, features: List[str], labels: Dict[str, List[str]], weights: np.ndarray, bias: np.ndarray,
+                 threshold: float = 0.6):
+        self.features: List[str] = features
+        self.labels: Dict[str, List[str]] = labels
+        self.weights: np.ndarray = weights
+        self.bias: np.ndarray = bias
+        # Predictions with a lower confidence are left to the rules.
+        self.threshold: float = threshold
+        self._feature_index: Dict[str, int] = {feature: index for index, feature in enumerate(features)}
+        # The columns of the weights that belong to each field.
+        self._slices: Dict[str, slice] = {}
+        start: int = 0
+        for field in self.fields:
+            self._slices[field] = slice(start, start + len(labels[field]))
+            start += len(labels[field])
+
+    @staticmethod
+    def from_environment() -> Optional[IntentClassifier]:
+        """Loads the classifier if COVBOT_NLU_ENGINE is set to "classifier", otherwise only the rules are used.
+
+        The model is loaded from COVBOT_CLASSIFIER_PATH (by default lib/nlu/intent_classifier.npz). The confidence
+        below which the rules are used instead is COVBOT_CLASSIFIER_THRESHOLD.
+        """
+        if os.environ.get("COVBOT_NLU_ENGINE", "rules") != "classifier":
+            return None
+        path: pathlib.Path = pathlib.Path(os.environ.get("COVBOT_CLASSIFIER_PATH") or default_model_path)
+        if not path.exists():
+            ServerLogger(__name__).warning("There is no trained classifier at %s, only the rules are used.", path)
+            return None
+        classifier: IntentClassifier = IntentClassifier.load(path)
+        classifier.threshold = float(os.environ.get("COVBOT_CLASSIFIER_THRESHOLD", classifier.threshold))
+        return classifier
+
+    @staticmethod
+    def extract_features(span: Span) -> List[str]:
+        """Extracts the binary features of a span."""
+        features: List[str] = []
+        question_words: List[str] = []
+        for token in span:
+            if token.is_punct or token.is_space:
+                continue
+            stem: str = token._.stem
+            features.append(f"stem={stem}")
+            features.append(f"dep={token.dep_}:{token.head._.stem}>{stem}")
+            if token.tag_ in ["WDT", "WP", "WP$", "WRB"]:
+                question_words.append(stem)
+        features.extend(f"wh={word}" for word in question_words)
+        if question_words:
+            features.append(f"first_wh={question_words[0]}")
+        features.extend(f"entity={entity.label_}" for entity in span.ents)
+        text: str = span.text.lower()
+        features.extend(f"text={name}" for name, pattern in IntentRecognizer.text_patterns.items()
+                        if pattern.search(text))
+        return features
+
+    @timed("classifier")
+    def predict(self, spans: List[Span]) -> List[ClassifierPrediction]:
+        """Predicts the topic and the intent of a batch of spans."""
+        return self.predict_features([self.extract_features(span) for span in spans])
+
+    def predict_features(self, batch: List[List[str]]) -> List[ClassifierPrediction]:
+        """Predicts the topic and the intent for the features of a batch of spans."""
+        probabilities: Dict[str, np.ndarray] = self._get_probabilities(self._vectorize(batch))
+        best: Dict[str, np.ndarray] = {field: probabilities[field].argmax(axis=1) for field in self.fields}
+
+        predictions: List[ClassifierPrediction] = []
+        for row in range(len(batch)):
+            labels: Dict[str, str] = {field: self.labels[field][best[field][row]] for field in self.fields}
+            # Labels that aren't declared anymore, e.g. of a removed dataset, become UNKNOWN.
+            predictions.append(ClassifierPrediction(
+                Topic.from_str(labels["topic"]),
+                Intent(CalculationType.from_str(labels["calculation_type"]), ValueType.from_str(labels["value_type"]),
+                       ValueDomain.from_str(labels["value_domain"]),
+                       MeasurementType.from_str(labels["measurement_type"])),
+                {field: float(probabilities[field][row, best[field][row]]) for field in self.fields}))
+        return predictions
+
+    def _vectorize(self, batch: List[List[str]]) -> np.ndarray:
+        """Builds the feature matrix of a batch, features that weren't seen in the training are ignored."""
+        matrix: np.ndarray = np.zeros((len(batch), len(self.features)), dtype=np.float32)
+        for row, features in enumerate(batch):
+            matrix[row, [self._feature_index[feature] for feature in features if feature in self._feature_index]] = 1
+        return matrix
+
+    def _get_probabilities(self, matrix: np.ndarray) -> Dict[str, np.ndarray]:
+        """Returns the probabilities of the labels of each field, one row per span."""
+        scores: np.ndarray = matrix @ self.weights + self.bias
+        probabilities: Dict[str, np.ndarray] = {}
+        for field in self.fields:
+            field_scores: np.ndarray = scores[:, self._slices[field]]
+            exponentials: np.ndarray = np.exp(field_scores - field_scores.max(axis=1, keepdims=True))
+            probabilities[field] = exponentials / exponentials.sum(axis=1, keepdims=True)
+        return probabilities
+
+    @staticmethod
+    def train(batch: List[List[str]], labels: List[Dict[str, str]], epochs: int = 300, learning_rate: float = 0.5,
+              l2: float = 1e-3, min_count: int = 2) -> IntentClassifier:
+        """Trains a classifier on the features of spans and their labels, e.g. {"topic": "CASES", ...}.
+
+        The weights are fitted with full-batch gradient descent on the cross-entropy of all fields, which converges
+        quickly for the few thousand examples of the augmented annotated queries. Features that occur in fewer than
+        min_count examples are dropped.
+        """
+        counts: Dict[str, int] = {}
+        for features in batch:
+            for feature in set(features):
+                counts[feature] = counts.get(feature, 0) + 1
+        field_labels: Dict[str, List[str]] = {field: sorted({example[field] for example in labels})
+                                              for field in IntentClassifier.fields}
+        classifier: IntentClassifier = IntentClassifier(
+            sorted(feature for feature, count in counts.items() if count >= min_count), field_labels,
+            np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.float32))
+
+        matrix: np.ndarray = classifier._vectorize(batch)
+        # The one-hot encoded labels of all fields side by side, like the columns of the weights.
+        targets: np.ndarray = np.hstack([
+            np.eye(len(field_labels[field]), dtype=np.float32)[
+                [field_labels[field].index(example[field]) for example in labels]]
+            for field in IntentClassifier.fields])
+        classifier.weights = np.zeros((matrix.shape[1], targets.shape[1]), dtype=np.float32)
+        classifier.bias = np.zeros(targets.shape[1], dtype=np.float32)
+
+        for _ in range(epochs):
+            probabilities: Dict[str, np.ndarray] = classifier._get_probabilities(matrix)
+            errors: np.ndarray = (np.hstack([probabilities[field] for field in IntentClassifier.fields]) - targets) \
+                / len(batch)
+            classifier.weights -= learning_rate * (matrix.T @ errors + l2 * classifier.weights)
+            classifier.bias -= learning_rate * errors.sum(axis=0)
+        return classifier
+
+    def save(self, path: pathlib.Path) -> None:
+        """Saves the classifier as an .npz file with plain arrays, so that loading it doesn't need pickle."""
+        np.savez_compressed(path, features=np.array(self.features, dtype=str), weights=self.weights, bias=self.bias,
+                            threshold=np.array(self.threshold),
+                            **{f"labels_{field}": np.array(self.labels[field], dtype=str) for field in self.fields})
+
+    @staticmethod
+    def load(path: pathlib.Path) -> IntentClassifier:
+        """Loads a classifier saved with save."""
+        with np.load(path) as model:
+            return IntentClassifier(model["features"].tolist(),
+                                    {field: model[f"labels_{field}"].tolist() for field in IntentClassifier.fields},
+                                    model["weights"], model["bias"], float(model["threshold"]))
+
+    def get_accuracy(self, batch: List[List[str]], labels: List[Dict[str, str]]) -> Dict[str, float]:
+        """Returns the share of the examples for which each field was predicted correctly."""
+        predictions: List[ClassifierPrediction] = self.predict_features(batch)
+        accuracy: Dict[str, float] = {}
+        for field in self.fields:
+            predicted: List[Tuple[str, str]] = [
+                (self.get_label(prediction, field), example[field]) for prediction, example in zip(predictions, labels)]
+            accuracy[field] = sum(1 for label, gold in predicted if label == gold) / len(labels) if labels else 0.0
+        return accuracy
+
+    @staticmethod
+    def get_label(prediction: ClassifierPrediction, field: str) -> str:
+        """Returns the name of the label that was predicted for a field, e.g. "CASES" for the topic."""
+        return prediction.topic.name if field == "topic" else getattr(prediction.intent, field).name
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple, Set
 
 from nltk import PorterStemmer
 from spacy.matcher import DependencyMatcher
+from spacy.tokens import Doc
 from spacy.tokens.span import Span
 
+from lib.config.dataset_registry import get_dataset_registry, DatasetDefinition
 from lib.nlu.intent.calculation_type import CalculationType
 from lib.nlu.intent.measurement_type import MeasurementType
 from lib.nlu.intent.value_domain import ValueDomain
@@ -14,6 +18,7 @@ from lib.nlu.patterns import Pattern
 from lib.nlu.slot.date import DateRecognizer, Date
 from lib.nlu.topic.topic import TopicRecognizer, Topic
 from lib.spacy_components.custom_spacy import get_spacy, CustomSpacy
+from lib.util.metrics import timed
 
 
 @dataclass
@@ -27,137 +32,269 @@ class Intent:
     measurement_type: MeasurementType
 
 
+@dataclass(frozen=True)
+class IntentFeatures:
+    """Class representing everything the intent of a query is derived from.
+    matched_patterns: The names of the patterns (see IntentRecognizer.patterns) that matched the query.
+    date_type: The type of the first date in the query ("DAY", "WEEK", "MONTH", "YEAR") or None if there is no date.
+    topic: The topic of the query.
+    """
+    matched_patterns: FrozenSet[str]
+    date_type: Optional[str]
+    topic: Topic
+
+    def has_any(self, pattern_names: FrozenSet[str]) -> bool:
+        """Checks whether at least one of the given patterns matched."""
+        return not self.matched_patterns.isdisjoint(pattern_names)
+
+
 class IntentRecognizer:
-    """Class providing helper methods to recognize the intent of a query."""
-    def __init__(self):
+    """Class providing helper methods to recognize the intent of a query.
+
+    The intent is recognized in a single pass: All patterns are run once with a shared matcher and the date is
+    recognized once, which results in an IntentFeatures object. The topic and the four fields of the intent are then
+    derived from these features with the decision tables below, without looking at the span again.
+    """
+    patterns: Dict[str, List[dict]] = {
+        "what_day": Pattern.what_day_pattern,
+        "when": Pattern.when_pattern,
+        "where": Pattern.where_pattern,
+        "what_country": Pattern.what_country_pattern,
+        "what_is_country": Pattern.what_is_country_pattern,
+        "top_country": Pattern.top_country_pattern,
+        "bottom_country": Pattern.bottom_country_pattern,
+        "country_count": Pattern.country_count_pattern,
+        "how_many": Pattern.how_many_pattern,
+        "number_of": Pattern.number_of_pattern,
+        "maximum_number": Pattern.maximum_number_pattern,
+        "most_trigger_word": Pattern.most_trigger_word_pattern,
+        "minimum_number": Pattern.minimum_number_pattern,
+        "least_trigger_word": Pattern.least_trigger_word_pattern,
+        "covid": Pattern.covid_pattern,
+        "covid_other_topic": Pattern.covid_other_topic_pattern,
+        "other_topic_covid": Pattern.other_topic_covid_pattern,
+        # The trigger words of the topics and value domains of the datasets, e.g. "cases_trigger" or
+        # "vaccinated_people_trigger".
+        **{definition.trigger_pattern_name: Pattern.get_trigger_pattern(definition.trigger_pattern_name,
+                                                                        definition.trigger_words)
+           for definition in list(get_dataset_registry().datasets.values()) + get_dataset_registry().value_domains
+           if definition.trigger_words},
+    }
+
+    # Patterns that are matched against the lowercased text of the span, since the tokenization of phrases like
+    # "per 100k" or "14-day" varies too much for the dependency patterns.
+    text_patterns: Dict[str, re.Pattern] = {
+        # e.g. "How many cases per 100k people were there in Austria yesterday?"
+        "per_capita": re.compile(r"\bper\s+(100\s?k|100[,.\s]?000|hundred thousand|100 thousand|capita|"
+                                 r"inhabitants?|residents?)\b"),
+        # e.g. "What is the 7-day average of new cases in Austria?". A "mean" needs the number of days, otherwise
+        # "What do you mean by cases?" would ask for an average.
+        "average": re.compile(r"\b(average|avg|rolling)\b|\b(7|seven|14|fourteen)[\s-]*days?[\s-]+mean\b|"
+                              r"\bmean\b.*\b(7|seven|14|fourteen)[\s-]*days?\b"),
+        # e.g. "What is the 14-day average of new cases in Austria?"
+        "two_weeks": re.compile(r"\b(14|fourteen)[\s-]*days?\b|\btwo[\s-]*weeks?\b|\bfortnight(ly)?\b"),
+    }
+
+    # The first row whose patterns match decides the value type.
+    value_type_table: List[Tuple[FrozenSet[str], ValueType]] = [
+        # e.g. "When did Austria have the most Corona cases?"
+        (frozenset({"what_day", "when"}), ValueType.DAY),
+        # e.g. "Where have most Corona cases been reported?" or "What are the top 5 countries by vaccinations?"
+        (frozenset({"where", "what_country", "what_is_country", "top_country", "bottom_country", "country_count"}),
+         ValueType.LOCATION),
+        # e.g. "What is the number of new Corona cases in Austria today?"
+        (frozenset({"how_many", "number_of"}), ValueType.NUMBER),
+        # If we don't have any other clues but there are trigger words, we assume that we are asking for the number
+        # e.g. "vaccinations worldwide today" (query with id 20)
+        (frozenset(dataset.trigger_pattern_name for dataset in get_dataset_registry().datasets.values()),
+         ValueType.NUMBER),
+    ]
+
+    # The first row whose patterns match decides the calculation type.
+    calculation_type_table: List[Tuple[FrozenSet[str], CalculationType]] = [
+        # e.g. "What is the highest number of cases recorded in Austria?".
+        (frozenset({"maximum_number", "most_trigger_word", "top_country"}), CalculationType.MAXIMUM),
+        # e.g. "What is the smallest number of cases recorded in Austria this week?".
+        (frozenset({"minimum_number", "least_trigger_word", "bottom_country"}), CalculationType.MINIMUM),
+    ]
+
+    # Maps (value type, calculation type, whether there is a date) to the measurement type. None stands for any
+    # value, the most specific row wins.
+    measurement_type_table: Dict[Tuple[ValueType, Optional[CalculationType], Optional[bool]], MeasurementType] = {
+        # If there is no date, we are surely asking for the cumulative value, since we are comparing different
+        # countries, e.g. "Which country has the the most vaccinated people?". Otherwise we want the daily value,
+        # e.g. "Which country had the most administered vaccines yesterday?". This is technically not always the
+        # case ("Which country had the most administered vaccines in total yesterday?"), but we are going to
+        # disregard this case for the sake of simplicity.
+        (ValueType.LOCATION, None, False): MeasurementType.CUMULATIVE,
+        (ValueType.LOCATION, None, True): MeasurementType.DAILY,
+        # If we are asking for a certain day, we default to the daily value, e.g. "On which day were most cases
+        # recorded in Austria?". Asking for the day with the highest cumulative value doesn't really make sense,
+        # since it's always going to be the closest date to today.
+        (ValueType.DAY, None, None): MeasurementType.DAILY,
+        # We must be asking for the highest/lowest number in a certain location in some time period,
+        # e.g. "What was the highest number of cases recorded in Austria last week?"
+        (ValueType.NUMBER, CalculationType.MAXIMUM, None): MeasurementType.DAILY,
+        (ValueType.NUMBER, CalculationType.MINIMUM, None): MeasurementType.DAILY,
+        # Without a date, we give the cumulative value of today by default, e.g. "What is the number of cases in
+        # Austria?". Otherwise we are asking for a single day, e.g. "How many new cases were reported yesterday?".
+        (ValueType.NUMBER, CalculationType.RAW_VALUE, False): MeasurementType.CUMULATIVE,
+        (ValueType.NUMBER, CalculationType.RAW_VALUE, True): MeasurementType.DAILY,
+        # For a sum, we never use the cumulative value, since the cumulative value already is a sum by itself.
+        (ValueType.NUMBER, CalculationType.SUM, None): MeasurementType.DAILY,
+    }
+
+    # Maps the measurement type from the table above to the one asked for with "per 100k" or "per capita".
+    per_capita_measurement_types: Dict[MeasurementType, MeasurementType] = {
+        MeasurementType.DAILY: MeasurementType.PER_100K,
+        MeasurementType.CUMULATIVE: MeasurementType.CUMULATIVE_PER_100K,
+    }
+
+    def __init__(self, date_recognizer: Optional[DateRecognizer] = None):
         self._stemmer: PorterStemmer = PorterStemmer()
-        self._topic_recognizer: TopicRecognizer = TopicRecognizer()
-        self._date_recognizer: DateRecognizer = DateRecognizer()
+        self._date_recognizer: DateRecognizer = DateRecognizer() if date_recognizer is None else date_recognizer
+        self._matcher: Optional[DependencyMatcher] = None
+        # The span the features were extracted from last (its document, start and end) and its features.
+        self._last_features: Optional[Tuple[Doc, int, int, IntentFeatures]] = None
 
+    @timed("intent")
     def recognize_intent(self, span: Span) -> Intent:
         """Recognize the intent of a span."""
-        value_domain: ValueDomain = self.recognize_value_domain(span)
-        measurement_type: MeasurementType = self.recognize_measurement_type(span)
-        value_type: ValueType = self.recognize_value_type(span)
-        calculation_type: CalculationType = self.recognize_calculation_type(span)
+        return self.resolve_intent(self.extract_features(span))
 
-        return Intent(calculation_type, value_type, value_domain, measurement_type)
+    @timed("intent")
+    def recognize_topic_and_intent(self, span: Span) -> Tuple[Topic, Intent]:
+        """Recognize the topic and the intent of a span, both from the same features."""
+        features: IntentFeatures = self.extract_features(span)
+        return features.topic, self.resolve_intent(features)
 
-    def recognize_calculation_type(self, span: Span):
-        """Recognize the calculation type of a span."""
-        date: Date = self._date_recognizer.recognize_date(span)
-        value_type: ValueType = self.recognize_value_type(span)
+    def extract_features(self, span: Span) -> IntentFeatures:
+        """Runs all patterns and the date recognition on a span once.
 
-        # e.g. "What is the highest number of cases recorded in Austria?".
-        if Pattern.has_valid_pattern(span, [Pattern.maximum_number_pattern, Pattern.most_trigger_word_pattern]):
-            return CalculationType.MAXIMUM
-        # e.g. "What is the smallest number of cases recorded in Austria this week?".
-        if Pattern.has_valid_pattern(span, [Pattern.minimum_number_pattern, Pattern.least_trigger_word_pattern]):
-            return CalculationType.MINIMUM
+        The features of the last span are kept, so that recognizing several fields of the same span one after
+        another, e.g. with the recognize_* methods below, doesn't run the patterns again.
+        """
+        last_features: Optional[Tuple[Doc, int, int, IntentFeatures]] = self._last_features
+        if last_features is not None and last_features[0] is span.doc and last_features[1:3] == (span.start, span.end):
+            return last_features[3]
+
+        if self._matcher is None:
+            self._matcher = DependencyMatcher(CustomSpacy.get_spacy().vocab)
+            for name, pattern in self.patterns.items():
+                self._matcher.add(name, [pattern])
+
+        strings = self._matcher.vocab.strings
+        text: str = span.text.lower()
+        matched_patterns: FrozenSet[str] = frozenset(
+            [strings[match_id] for match_id, _ in self._matcher(span)] +
+            [name for name, pattern in self.text_patterns.items() if pattern.search(text)])
+        date: Optional[Date] = self._date_recognizer.recognize_date(span)
+
+        # The same rules as in TopicRecognizer, based on the patterns that were already matched.
+        topics: Set[Topic] = {Topic[dataset.topic] for dataset in get_dataset_registry().datasets.values()
+                              if dataset.trigger_pattern_name in matched_patterns}
+        # Special case: "How many people got COVID" vs. "How many people got the COVID vaccine"
+        default_dataset: Optional[DatasetDefinition] = get_dataset_registry().get_default_dataset()
+        if default_dataset is not None and "covid" in matched_patterns and \
+                matched_patterns.isdisjoint({"covid_other_topic", "other_topic_covid"}):
+            topics.add(Topic[default_dataset.topic])
+        topic: Topic = TopicRecognizer.combine_topics(topics)
+
+        features: IntentFeatures = IntentFeatures(matched_patterns, date.type if date is not None else None, topic)
+        self._last_features = (span.doc, span.start, span.end, features)
+        return features
+
+    def resolve_intent(self, features: IntentFeatures) -> Intent:
+        """Derives the intent from the features of a span."""
+        value_type: ValueType = self.resolve_value_type(features)
+        calculation_type: CalculationType = self.resolve_calculation_type(features, value_type)
+        return Intent(calculation_type, value_type, self.resolve_value_domain(features),
+                      self.resolve_measurement_type(features, value_type, calculation_type))
+
+    def resolve_value_type(self, features: IntentFeatures) -> ValueType:
+        """Derives the value type from the features of a span."""
+        for pattern_names, value_type in self.value_type_table:
+            if features.has_any(pattern_names):
+                return value_type
+        return ValueType.UNKNOWN
+
+    def resolve_calculation_type(self, features: IntentFeatures, value_type: ValueType) -> CalculationType:
+        """Derives the calculation type from the features of a span and its value type."""
+        for pattern_names, calculation_type in self.calculation_type_table:
+            if features.has_any(pattern_names):
+                return calculation_type
 
         # If we were asking about a day or a location, it either has to be maximum or minimum, so by now
         # it must be a number.
         if value_type != ValueType.NUMBER:
             return CalculationType.UNKNOWN
 
-        # If we don't have a time frame, the user either forgot to supply it or the user is asking for a cumulative
-        # value (e.g. "How many cases have there been in Austria so far?"). So in this case, we return the raw value.
-        if date is None:
+        # The averages are looked up like a raw value, e.g. "What was the 7-day average of cases last week?" gives
+        # the average of the last day of the week.
+        if "average" in features.matched_patterns:
             return CalculationType.RAW_VALUE
-        # If the supplied date by the user is a single day, we also just need the raw_value from that date
-        # (e.g. "How many cases have there been in Austria on the 25th of December?")
-        if date.type == "DAY":
+
+        # If we don't have a time frame, the user either forgot to supply it or the user is asking for a cumulative
+        # value (e.g. "How many cases have there been in Austria so far?"). If the date is a single day, we also just
+        # need the raw value from that date (e.g. "How many cases have there been in Austria on the 25th of December?")
+        if features.date_type is None or features.date_type == "DAY":
             return CalculationType.RAW_VALUE
-        else:
-            return CalculationType.SUM
+        return CalculationType.SUM
+
+    def resolve_value_domain(self, features: IntentFeatures) -> ValueDomain:
+        """Derives the value domain from the features of a span."""
+        dataset: Optional[DatasetDefinition] = get_dataset_registry().get_dataset_by_topic(features.topic.name)
+        if dataset is None:
+            return ValueDomain.UNKNOWN
+        # Distinguish between e.g. "how many vaccines have been administered" and "how many people have been
+        # vaccinated" by the trigger words of the value domains.
+        for domain in dataset.value_domains:
+            if domain.trigger_words and domain.trigger_pattern_name in features.matched_patterns:
+                return ValueDomain[domain.name]
+        return ValueDomain[dataset.default_value_domain.name]
+
+    def resolve_measurement_type(self, features: IntentFeatures, value_type: ValueType,
+                                 calculation_type: CalculationType) -> MeasurementType:
+        """Derives the measurement type from the features of a span, its value type and its calculation type."""
+        has_date: bool = features.date_type is not None
+        measurement_type: MeasurementType = MeasurementType.UNKNOWN
+        for key in [(value_type, calculation_type, has_date), (value_type, calculation_type, None),
+                    (value_type, None, has_date), (value_type, None, None)]:
+            if key in self.measurement_type_table:
+                measurement_type = self.measurement_type_table[key]
+                break
+
+        if measurement_type == MeasurementType.UNKNOWN:
+            return measurement_type
+        # The rankings of the locations only compare daily and cumulative values, e.g. "Which country has the most
+        # cases per 100k?" would otherwise be answered with the raw cumulative values.
+        if value_type == ValueType.LOCATION:
+            if features.has_any(frozenset({"average", "per_capita"})):
+                return MeasurementType.UNKNOWN
+            return measurement_type
+        # The rolling averages are always averages of the daily values, e.g. "What was the highest 14-day average of
+        # vaccinations in Austria?"
+        if "average" in features.matched_patterns:
+            if "two_weeks" in features.matched_patterns:
+                return MeasurementType.AVERAGE_14_DAYS
+            return MeasurementType.AVERAGE_7_DAYS
+        if "per_capita" in features.matched_patterns:
+            return self.per_capita_measurement_types.get(measurement_type, measurement_type)
+        return measurement_type
+
+    def recognize_calculation_type(self, span: Span) -> CalculationType:
+        """Recognize the calculation type of a span."""
+        features: IntentFeatures = self.extract_features(span)
+        return self.resolve_calculation_type(features, self.resolve_value_type(features))
 
     def recognize_value_domain(self, span: Span) -> ValueDomain:
         """Recognize the value domain of a span."""
-        topic: Topic = self._topic_recognizer.recognize_topic(span)
-        if topic == Topic.CASES:
-            return ValueDomain.POSITIVE_CASES
-        # Distinguish between "how many vaccines have been administered" and "how many people have been vaccinated".
-        elif topic == Topic.VACCINATIONS:
-
-            matcher: DependencyMatcher = DependencyMatcher(CustomSpacy.get_spacy().vocab)
-            matcher.add("human", [Pattern.human_pattern])
-            matcher.add("vaccine", [Pattern.vaccine_trigger_pattern])
-            result: list = matcher(span.as_doc())
-
-            matched_patterns: set = {pattern_id for pattern_id, token_pos in result}
-
-            if len(matched_patterns) > 1:
-                return ValueDomain.VACCINATED_PEOPLE
-            else:
-                return ValueDomain.ADMINISTERED_VACCINES
-        else:
-            return ValueDomain.UNKNOWN
+        return self.resolve_value_domain(self.extract_features(span))
 
     def recognize_measurement_type(self, span: Span) -> MeasurementType:
         """Recognize the measurement type of a span."""
-        date = self._date_recognizer.recognize_date(span)
-        value_type = self.recognize_value_type(span)
-        calculation_type = self.recognize_calculation_type(span)
-
-        if value_type == ValueType.LOCATION:
-            # If there is no date, we are surely asking for the cumulative value, since we are comparing
-            # different countries.
-            # e.g. "Which country has the the most vaccinated people?"
-            if date is None:
-                return MeasurementType.CUMULATIVE
-            # Otherwise we want the daily value.
-            # e.g. "Which country had the most administered vaccines yesterday?"
-            # This is technically not always the case, because we could for example ask
-            # "Which country had the most administered vaccines in total yesterday?", which would
-            # require the cumulative value. But we are going to disregard this case for the sake of simplicity.
-            else:
-                return MeasurementType.DAILY
-        elif value_type == ValueType.DAY:
-            # If we are asking for a certain day, we default to the daily value.
-            # e.g. "On which day were most cases recorded in Austria?"
-            # As above, this also is an simplification, as we could in theory ask something like
-            # "On which day did Austria have the highest number of cases in total", but this question doesn't
-            # really make sense since it's always going to be the closest date to today.
-            return MeasurementType.DAILY
-        elif value_type == ValueType.NUMBER:
-            # In this case, we must be asking for the highest/lowest number in a certain location in some time
-            # period, so we can default to daily.
-            # e.g. "What was the highest number of cases recorded in Austria last week?"
-            if calculation_type in [CalculationType.MAXIMUM, CalculationType.MINIMUM]:
-                return MeasurementType.DAILY
-            elif calculation_type == CalculationType.RAW_VALUE:
-                # If we don't have a date and are looking for the raw value, we give the cumulative value of
-                # today by default.
-                # e.g. "What is the number of cases in Austria?"
-                if date is None:
-                    return MeasurementType.CUMULATIVE
-                # Otherwise, we are either asking for a single day or the sum over a certain time period,
-                # so we return the daily number.
-                # e.g. "How many new cases have been reported in Austria last week?"
-                else:
-                    return MeasurementType.DAILY
-            # For a sum, we never use the cumulative value, since the cumulative value already is a by itself.
-            elif calculation_type == CalculationType.SUM:
-                return MeasurementType.DAILY
-
-        return MeasurementType.UNKNOWN
+        return self.resolve_intent(self.extract_features(span)).measurement_type
 
     def recognize_value_type(self, span: Span) -> ValueType:
         """Recognize the value type of a span."""
-        # Use each of the pre-defined patterns to understand what type of value the user is asking from us.
-        # e.g. "When did Austria have the most Corona cases?"
-        if Pattern.has_valid_pattern(span, [Pattern.what_day_pattern, Pattern.when_pattern]):
-            return ValueType.DAY
-        # e.g. "Where have most Corona cases been reported?"
-        elif Pattern.has_valid_pattern(span, [Pattern.where_pattern, Pattern.what_country_pattern,
-                                            Pattern.what_is_country_pattern]):
-            return ValueType.LOCATION
-        # e.g. "What is the number of new Corona cases in Austria today?"
-        elif Pattern.has_valid_pattern(span, [Pattern.how_many_pattern, Pattern.number_of_pattern]):
-            return ValueType.NUMBER
-        # If we don't have any other clues but there are trigger words, we assume that we are asking for the number
-        # e.g. "vaccinations worldwide today" (query with id 20)
-        elif Pattern.has_valid_pattern(span, [Pattern.case_trigger_pattern, Pattern.vaccine_trigger_pattern]):
-            return ValueType.NUMBER
-
-        return ValueType.UNKNOWN
\ No newline at end of file
+        return self.resolve_value_type(self.extract_features(span))
@@ -10,10 +10,18 @@ class MeasurementType(Enum):
     DAILY: If we are trying to access a daily value.
     CUMULATIVE: If we are trying to access a cumulative value.
     UNKNOWN: Unknown measurement type.
+    AVERAGE_7_DAYS: If we are trying to access the average daily value of the last 7 days.
+    AVERAGE_14_DAYS: If we are trying to access the average daily value of the last 14 days.
+    PER_100K: If we are trying to access a daily value per 100,000 people.
+    CUMULATIVE_PER_100K: If we are trying to access a cumulative value per 100,000 people.
     """
     DAILY = 1
     CUMULATIVE = 2
     UNKNOWN = 3
+    AVERAGE_7_DAYS = 4
+    AVERAGE_14_DAYS = 5
+    PER_100K = 6
+    CUMULATIVE_PER_100K = 7
 
     @staticmethod
     def from_str(measurement_type: str) -> Optional[MeasurementType]:
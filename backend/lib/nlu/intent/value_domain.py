@@ -3,6 +3,8 @@ from __future__ import annotations
 from enum import Enum
 from typing import Optional
 
+from lib.config.dataset_registry import get_dataset_registry, check_members
+
 
 class ValueDomain(Enum):
     """Class representing the value domain, so which domain the question is about.
@@ -22,3 +24,7 @@ class ValueDomain(Enum):
             return ValueDomain[value_domain.upper()]
         except KeyError:
             return ValueDomain["UNKNOWN"]
+
+
+# The value domains are declared together with the datasets in lib/config/datasets.yaml.
+check_members(ValueDomain, [domain.name for domain in get_dataset_registry().value_domains], ["UNKNOWN"])
@@ -5,13 +5,16 @@ from enum import Enum
 from typing import Optional, List
 
 from spacy import Language
-from spacy.tokens import Span
+from spacy.tokens import Span, Token
 
+from lib.nlu.classifier import IntentClassifier, ClassifierPrediction
 from lib.nlu.intent import ValueType, CalculationType, ValueDomain, MeasurementType
 from lib.nlu.intent.intent import Intent, IntentRecognizer
+from lib.nlu.slot.date import DateRecognizer
 from lib.nlu.slot.slots import Slots, SlotsFiller
-from lib.nlu.topic.topic import Topic, TopicRecognizer
+from lib.nlu.topic.topic import Topic
 from lib.spacy_components.custom_spacy import get_spacy
+from lib.util.metrics import classifier_decisions
 
 
 class MessageValidationCode(Enum):
@@ -94,32 +97,43 @@ class Message:
                 # If the timeframe is null, we assume that the user is asking for today.
                 elif msg.intent.measurement_type == MeasurementType.CUMULATIVE:
                     return MessageValidationCode.VALID
+                # Without a timeframe, we give the most recent average or cumulative value per 100k.
+                elif msg.intent.measurement_type in [MeasurementType.AVERAGE_7_DAYS, MeasurementType.AVERAGE_14_DAYS,
+                                                     MeasurementType.CUMULATIVE_PER_100K]:
+                    return MessageValidationCode.VALID
+                elif msg.intent.measurement_type == MeasurementType.PER_100K:
+                    if not has_date:
+                        return MessageValidationCode.NO_TIMEFRAME
+                    else:
+                        return MessageValidationCode.VALID
             elif msg.intent.calculation_type == CalculationType.SUM:
                 # We need a timeframe to return a daily number. If there is no location, we default to the whole
                 # world.
-                if msg.intent.measurement_type == MeasurementType.DAILY:
+                if msg.intent.measurement_type in [MeasurementType.DAILY, MeasurementType.PER_100K]:
                     if not has_date:
                         return MessageValidationCode.NO_TIMEFRAME
                     else:
                         return MessageValidationCode.VALID
-                # We can't possibly want the sum of a cumulative value.
-                elif msg.intent.measurement_type == MeasurementType.CUMULATIVE:
+                # We can't possibly want the sum of a cumulative value or of an average.
+                elif msg.intent.measurement_type in [MeasurementType.CUMULATIVE, MeasurementType.CUMULATIVE_PER_100K,
+                                                     MeasurementType.AVERAGE_7_DAYS, MeasurementType.AVERAGE_14_DAYS]:
                     return MessageValidationCode.INTENT_MISMATCH
             elif msg.intent.calculation_type in [CalculationType.MAXIMUM, CalculationType.MINIMUM]:
                 # We can't possibly want the highest/lowest cumulative value if the value type is a number,
                 # if we are looking for the day or the location with the highest/lowest cumulative value.
-                if msg.intent.measurement_type == MeasurementType.CUMULATIVE:
+                if msg.intent.measurement_type in [MeasurementType.CUMULATIVE, MeasurementType.CUMULATIVE_PER_100K]:
                     return MessageValidationCode.INTENT_MISMATCH
                 # If the timeframe is None, we assume that we are searching for the all-time value. If the location is
                 # None, we default to the whole world.
-                elif msg.intent.measurement_type == MeasurementType.DAILY:
+                elif msg.intent.measurement_type in [MeasurementType.DAILY, MeasurementType.AVERAGE_7_DAYS,
+                                                     MeasurementType.AVERAGE_14_DAYS, MeasurementType.PER_100K]:
                     return MessageValidationCode.VALID
         elif msg.intent.value_type == ValueType.DAY:
             # We can only want the maximum/minimum when searching for a day.
             if msg.intent.calculation_type in [CalculationType.SUM, CalculationType.RAW_VALUE]:
                 return MessageValidationCode.INTENT_MISMATCH
             elif msg.intent.calculation_type in [CalculationType.MAXIMUM, CalculationType.MINIMUM]:
-                if msg.intent.measurement_type in [MeasurementType.DAILY, MeasurementType.CUMULATIVE]:
+                if msg.intent.measurement_type != MeasurementType.UNKNOWN:
                     return MessageValidationCode.VALID
         elif msg.intent.value_type == ValueType.LOCATION:
             # We can only want the maximum/minimum when searching for a location.
@@ -159,16 +173,72 @@ class Message:
 
 
 class MessageBuilder:
-    """Class that provides a helper methods to recognize the message from a span."""
+    """Class that provides a helper methods to recognize the message from a span.
+
+    The recognizers share one DateRecognizer, so that a message needs only a single request to the CoreNLP server,
+    even if it contains several questions. If COVBOT_NLU_ENGINE is set to "classifier", the topic and the intent of
+    all questions of a message are predicted by the IntentClassifier in one batch, and the rules are only used for
+    the questions for which the classifier isn't confident enough. The slots are always filled by the rules.
+    """
+    # Tags of the words that start a question, e.g. "how", "what", "which", "when" or "where".
+    _question_word_tags: List[str] = ["WDT", "WP", "WP$", "WRB"]
+
     def __init__(self):
-        self._topic_recognizer: TopicRecognizer = TopicRecognizer()
-        self._intent_recognizer: IntentRecognizer = IntentRecognizer()
-        self._slots_filler: SlotsFiller = SlotsFiller()
+        self._date_recognizer: DateRecognizer = DateRecognizer()
+        self._intent_recognizer: IntentRecognizer = IntentRecognizer(self._date_recognizer)
+        self._slots_filler: SlotsFiller = SlotsFiller(self._date_recognizer)
+        self._classifier: Optional[IntentClassifier] = IntentClassifier.from_environment()
+
+    def prefetch(self, text: str) -> None:
+        """Starts recognizing the dates in a text before it is parsed, see DateRecognizer.prefetch."""
+        self._date_recognizer.prefetch(text)
 
     def create_message(self, span: Span) -> Message:
         """Builds a message based on a span."""
-        topic: Topic = self._topic_recognizer.recognize_topic(span)
-        intent: Intent = self._intent_recognizer.recognize_intent(span)
-        slots: Slots = self._slots_filler.fill_slots(span)
+        return self._build_messages([span])[0]
+
+    def create_messages(self, span: Span) -> List[Message]:
+        """Builds one message for each of the questions in a span."""
+        messages: List[Message] = self._build_messages(self.split_questions(span))
+        # Parts without a topic, e.g. a "Thanks!" after the question, are dropped if there is a real question.
+        relevant_messages: List[Message] = [message for message in messages if message.topic != Topic.UNKNOWN]
+        return relevant_messages if relevant_messages else messages[:1]
+
+    def _build_messages(self, questions: List[Span]) -> List[Message]:
+        """Builds the messages of a batch of questions."""
+        predictions: List[Optional[ClassifierPrediction]] = self._classifier.predict(questions) \
+            if self._classifier is not None else [None] * len(questions)
+
+        messages: List[Message] = []
+        for question, prediction in zip(questions, predictions):
+            if prediction is not None and prediction.confidence >= self._classifier.threshold:
+                topic, intent = prediction.topic, prediction.intent
+                classifier_decisions.inc(engine="classifier")
+            else:
+                # The topic is derived from the same features as the intent, so the patterns only run once.
+                topic, intent = self._intent_recognizer.recognize_topic_and_intent(question)
+                classifier_decisions.inc(engine="rules")
+            messages.append(Message(topic, intent, self._slots_filler.fill_slots(question)))
+        return messages
 
-        return Message(topic, intent, slots)
+    @staticmethod
+    def split_questions(span: Span) -> List[Span]:
+        """Splits a span into the questions it contains.
+
+        Every sentence is a separate question. Inside a sentence, a new question starts after "and", "or", a comma or
+        a semicolon if the next word is a question word, e.g. "How many cases were there in Austria today and how many
+        vaccinations in Germany?". All the questions are spans of the same document, so it is only parsed once.
+        """
+        questions: List[Span] = []
+        for sentence in span.sents:
+            start: int = sentence.start
+            for token in sentence[:-1]:
+                next_token: Token = token.doc[token.i + 1]
+                if token.i > start and token.lower_ in ["and", "or", ",", ";"] \
+                        and next_token.tag_ in MessageBuilder._question_word_tags:
+                    questions.append(span.doc[start:token.i])
+                    start = token.i + 1
+            questions.append(span.doc[start:sentence.end])
+
+        # Sentences that only consist of punctuation aren't questions.
+        return [question for question in questions if any(not token.is_punct for token in question)] or [span]
@@ -3,6 +3,8 @@ from typing import List
 from nltk import PorterStemmer
 from spacy.matcher import DependencyMatcher
 from spacy.tokens import Span
+
+from lib.config.dataset_registry import get_dataset_registry
 from lib.spacy_components.custom_spacy import CustomSpacy
 
 _stemmer: PorterStemmer = PorterStemmer()
@@ -10,23 +12,13 @@ _stemmer: PorterStemmer = PorterStemmer()
 
 class Pattern:
     """Class that contains the necessary patterns for intent recognition."""
-    _people_trigger_words: list = [_stemmer.stem(word) for word in ["human", "people", "person", "individual"]]
-    _vaccine_trigger_words: list = [_stemmer.stem(word) for word in
-                                    ["shot", "vaccine", "jab", "inoculation", "immunization",
-                                     "administer"]]
-    _cases_trigger_words: list = [_stemmer.stem(word) for word in ["case", "infection", "test", "positive", "negative"]]
+    # The trigger words of the topics besides the default one are needed to tell e.g. "COVID vaccine" apart from
+    # "COVID" (see TopicRecognizer).
+    _other_topic_trigger_words: list = [_stemmer.stem(word) for dataset in get_dataset_registry().datasets.values()
+                                        if not dataset.default_topic for word in dataset.trigger_words]
     _covid_trigger_words: list = [_stemmer.stem(word) for word in ["covid", "covid-19", "covid19"]]
-
-    human_pattern: List[dict] = [{
-        "RIGHT_ID": "human_pattern",
-        "RIGHT_ATTRS": {
-            "_": {
-                "stem": {
-                    "IN": _people_trigger_words
-                }
-            }
-        }
-    }]
+    # The trigger words of all topics and value domains, e.g. for "most vaccinated people".
+    _all_trigger_words: list = [_stemmer.stem(word) for word in get_dataset_registry().trigger_words]
 
     covid_pattern: List[dict] = [{
         "RIGHT_ID": "covid_pattern",
@@ -39,17 +31,6 @@ class Pattern:
         }
     }]
 
-    case_trigger_pattern: List[dict] = [{
-        "RIGHT_ID": "case_trigger_pattern",
-        "RIGHT_ATTRS": {
-            "_": {
-                "stem": {
-                    "IN": _cases_trigger_words
-                }
-            }
-        }
-    }]
-
     country_pattern: List[dict] = [{
         "RIGHT_ID": "country_pattern",
         "RIGHT_ATTRS": {
@@ -124,34 +105,34 @@ class Pattern:
         }
     }]
 
-    vaccine_trigger_pattern: List[dict] = [{
-        "RIGHT_ID": "vaccine_trigger_pattern",
+    other_topic_trigger_pattern: List[dict] = [{
+        "RIGHT_ID": "other_topic_trigger_pattern",
         "RIGHT_ATTRS": {
             "_": {
                 "stem": {
-                    "IN": _vaccine_trigger_words
+                    "IN": _other_topic_trigger_words
                 }
             }
         }
     }]
 
-    covid_vaccine_pattern: List[dict] = covid_pattern + [{
+    covid_other_topic_pattern: List[dict] = covid_pattern + [{
         "LEFT_ID": "covid_pattern",
         "REL_OP": "<",
-        "RIGHT_ID": "covid_vaccine_pattern",
+        "RIGHT_ID": "covid_other_topic_pattern",
         "RIGHT_ATTRS": {
             "_": {
                 "stem": {
-                    "IN": _vaccine_trigger_words
+                    "IN": _other_topic_trigger_words
                 }
             }
         }
     }]
 
-    vaccine_covid_pattern: List[dict] = vaccine_trigger_pattern + [{
-        "LEFT_ID": "vaccine_trigger_pattern",
+    other_topic_covid_pattern: List[dict] = other_topic_trigger_pattern + [{
+        "LEFT_ID": "other_topic_trigger_pattern",
         "REL_OP": ">>",
-        "RIGHT_ID": "vaccine_covid_pattern",
+        "RIGHT_ID": "other_topic_covid_pattern",
         "RIGHT_ATTRS": {
             "_": {
                 "stem": {
@@ -200,6 +181,39 @@ class Pattern:
         }
     ]
 
+    top_country_pattern: List[dict] = country_pattern + [
+        {
+            "LEFT_ID": "country_pattern",
+            "REL_OP": ">",
+            "RIGHT_ID": "top_country_pattern",
+            "RIGHT_ATTRS": {
+                "LOWER": "top"
+            }
+        }
+    ]
+
+    bottom_country_pattern: List[dict] = country_pattern + [
+        {
+            "LEFT_ID": "country_pattern",
+            "REL_OP": ">",
+            "RIGHT_ID": "bottom_country_pattern",
+            "RIGHT_ATTRS": {
+                "LOWER": "bottom"
+            }
+        }
+    ]
+
+    country_count_pattern: List[dict] = country_pattern + [
+        {
+            "LEFT_ID": "country_pattern",
+            "REL_OP": ">",
+            "RIGHT_ID": "country_count_pattern",
+            "RIGHT_ATTRS": {
+                "LIKE_NUM": True
+            }
+        }
+    ]
+
     number_of_pattern: List[dict] = number_pattern + [
         {
             "LEFT_ID": "number_pattern",
@@ -245,7 +259,7 @@ class Pattern:
             "RIGHT_ATTRS": {
                 "_": {
                     "stem": {
-                        "IN": _vaccine_trigger_words + _cases_trigger_words + _people_trigger_words
+                        "IN": _all_trigger_words
                     }
                 }
             }
@@ -260,13 +274,27 @@ class Pattern:
             "RIGHT_ATTRS": {
                 "_": {
                     "stem": {
-                        "IN": _vaccine_trigger_words + _cases_trigger_words + _people_trigger_words
+                        "IN": _all_trigger_words
                     }
                 }
             }
         }
     ]
 
+    @staticmethod
+    def get_trigger_pattern(name: str, trigger_words: List[str]) -> List[dict]:
+        """Creates a pattern matching any token with the same stem as one of the trigger words."""
+        return [{
+            "RIGHT_ID": name,
+            "RIGHT_ATTRS": {
+                "_": {
+                    "stem": {
+                        "IN": [_stemmer.stem(word) for word in trigger_words]
+                    }
+                }
+            }
+        }]
+
     @staticmethod
     def has_valid_pattern(span: Span, pattern: list) -> bool:
         """Checks whether a given span matches a list of patterns."""
@@ -0,0 +1,29 @@
+from typing import Optional, Dict
+
+from spacy.tokens import Span
+
+
+class CountRecognizer:
+    """Class providing helper methods to recognize how many locations a query asks for.
+
+    For example, "What are the top 5 countries by vaccinations last month?" or "Which three countries had the fewest
+    cases?" ask for several locations. Only counts of at least two are recognized, since a single location is the
+    default anyway.
+    """
+    _number_words: Dict[str, int] = {word: number for number, word in enumerate(
+        ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven", "twelve",
+         "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen", "twenty"])}
+    _location_words: list = ["country", "nation", "location", "place"]
+    _ranking_words: list = ["top", "bottom"]
+
+    def recognize_count(self, span: Span) -> Optional[int]:
+        """Returns the number of locations the span asks for, or None if it doesn't ask for several locations."""
+        for token in span:
+            if not token.like_num:
+                continue
+            previous_word: str = token.doc[token.i - 1].lower_ if token.i > 0 else ""
+            if token.head.lemma_.lower() in self._location_words or previous_word in self._ranking_words:
+                count: Optional[int] = int(token.text) if token.text.isdigit() else self._number_words.get(token.lower_)
+                if count is not None and count > 1:
+                    return count
+        return None
@@ -1,28 +1,69 @@
 from __future__ import annotations
 
+import calendar
 import json
 import re
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Tuple, Dict
 
 import requests
 from dateutil.parser import parse
 from spacy.tokens import Span
 
+from lib.nlu.slot.date_gate import DateGate
+from lib.util.logger import ServerLogger
+from lib.util.metrics import timed, record_cache_lookup, time_stage, date_gate_decisions
+
+# The threads sending the requests that are started before the dates are needed, shared by all DateRecognizers.
+_prefetch_pool: Optional[ThreadPoolExecutor] = None
+_prefetch_pool_lock: threading.Lock = threading.Lock()
+
+
+def _get_prefetch_pool() -> ThreadPoolExecutor:
+    global _prefetch_pool
+    with _prefetch_pool_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(int(os.environ.get("COVBOT_CORENLP_WORKERS", "4")),
+                                                thread_name_prefix="corenlp")
+        return _prefetch_pool
+
 
 @dataclass
 class Date:
     """Class representing a date with additional information.
-    type: Considered timeframe, can be "DAY", "WEEK", "MONTH", "YEAR"
+    type: Considered timeframe, can be "DAY", "WEEK", "MONTH", "YEAR" or "RANGE" for a custom range of days
+    (e.g. "between March 3 and April 20").
     value: The actual value of the date as a datetime.date object. In case of a week, month or year, it will
     always be the first day of that time period.
     text: The text from which the date was extracted.
+    end: The last day of a range, None for the other types.
     """
     type: str
     value: datetime.date
     text: Optional[str]
+    end: Optional[datetime.date] = None
+
+    def get_timeframe(self) -> Tuple[datetime.date, datetime.date]:
+        """Returns the first and the last day of the time period."""
+        if self.type == "DAY":
+            return self.value, self.value
+        elif self.type == "WEEK":
+            start = self.value - timedelta(days=self.value.weekday())
+            return start, start + timedelta(days=6)
+        elif self.type == "MONTH":
+            return self.value.replace(day=1), \
+                self.value.replace(day=calendar.monthrange(self.value.year, self.value.month)[1])
+        elif self.type == "YEAR":
+            return self.value.replace(month=1, day=1), self.value.replace(month=12, day=31)
+        elif self.type == "RANGE":
+            return self.value, self.end
+        else:
+            raise NotImplementedError()
 
     @staticmethod
     def generate_date_message(date: Date, today: datetime.date = None, include_preposition = True) -> str:
@@ -98,26 +139,97 @@ class Date:
                 return "next year"
             else:
                 return preposition + f"{date.value.year}"
+        elif date.type == "RANGE":
+            if include_preposition:
+                return custom_strftime("between %B {S} %Y", date.value) + \
+                    custom_strftime(" and %B {S} %Y", date.end)
+            return custom_strftime("%B {S} %Y", date.value) + custom_strftime(" to %B {S} %Y", date.end)
         else:
             raise NotImplementedError()
 
     def __str__(self):
-        return Date.generate_date_message(Date(self.type, self.value, self.text))
+        return Date.generate_date_message(Date(self.type, self.value, self.text, self.end))
 
 
 class DateRecognizer:
-    """Class providing helper methods to recognize dates in text."""
+    """Class providing helper methods to recognize dates in text.
+
+    The request for the dates of a text can be sent with prefetch as soon as the text is known, so that it runs while
+    spaCy parses the text. The recognizer then waits for the response (at most COVBOT_CORENLP_TIMEOUT seconds)
+    instead of sending its own request.
+    CoreNLP is only asked for the dates of texts that pass the DateGate, unless COVBOT_DATE_GATE is set to 0.
+    """
+    def __init__(self, cache_size: int = 256):
+        self.logger: ServerLogger = ServerLogger(__name__)
+        self._url: str = os.environ.get("COVBOT_CORENLP_URL", "http://corenlp:9000").rstrip("/")
+        self._timeout: float = float(os.environ.get("COVBOT_CORENLP_TIMEOUT", "10"))
+        self._use_gate: bool = os.environ.get("COVBOT_DATE_GATE", "1") == "1"
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_size: int = cache_size
+        # The requests that were prefetched and haven't finished yet, guarded by the lock of the cache.
+        self._pending: Dict[Tuple[str, datetime.date], Future] = {}
+        # The prefetched requests that timed out or failed, so that the other questions of the same message don't wait
+        # for them again. They are tried again when the text is prefetched for the next message.
+        self._failed: OrderedDict = OrderedDict()
+        self._cache_lock: threading.Lock = threading.Lock()
+
+    def prefetch(self, text: str) -> None:
+        """Starts the request for the dates in a text in the background, unless the response is already cached."""
+        if self._use_gate and not DateGate.could_contain_date(text):
+            return
+        key: Tuple[str, datetime.date] = self._get_key(text)
+        with self._cache_lock:
+            self._failed.pop(key, None)
+            if key in self._cache or key in self._pending:
+                return
+            # The request can only store its response once the lock is released, after it was added here.
+            self._pending[key] = _get_prefetch_pool().submit(self._fetch_dates, key, True)
+        record_cache_lookup("corenlp", False)
+
     def recognize_date(self, span: Span) -> Optional[Date]:
         """Extracts the first date in a span."""
-        result: List[dict] = self._send_request(str(span))
+        if self._use_gate:
+            could_contain_date: bool = DateGate.span_could_contain_date(span)
+            date_gate_decisions.inc(result="pass" if could_contain_date else "skip")
+            if not could_contain_date:
+                return None
+
+        # The whole text of the document is sent, so that all the parts of a message with several questions share
+        # one request. Only the dates inside of the span are considered.
+        result: List[dict] = [date for date in self._request_dates(span.doc.text)
+                              if span.start_char <= date["begin"] and date["end"] <= span.end_char]
         if len(result) > 0:
             if result[0]["value"] == "P1D":
                 return None
+            elif len(result) > 1 and self._is_range(span.doc.text, result[0], result[1]):
+                return self._parse_range(result[0], result[1])
             else:
                 return self._parse_date(result[0])
         else:
             return None
 
+    @staticmethod
+    def _is_range(text: str, first: dict, second: dict) -> bool:
+        """Checks whether two dates form a range, e.g. "between March 3 and April 20" or "from May to July"."""
+        before: str = text[:first["begin"]]
+        between: str = text[first["end"]:second["begin"]]
+        if re.match(r"^\s*(?:to|until|till|through|-)\s*$", between, re.IGNORECASE):
+            return True
+        return bool(re.match(r"^\s*and\s*$", between, re.IGNORECASE) and
+                    re.search(r"\bbetween\s*$", before, re.IGNORECASE))
+
+    def _parse_range(self, first: dict, second: dict) -> Optional[Date]:
+        """Converts two dates from the Stanford parser to a range from the start of the first to the end of the second.
+
+        If the range can't be parsed, the first date is returned on its own.
+        """
+        start: Optional[Date] = self._parse_date(first)
+        end: Optional[Date] = self._parse_date(second)
+        if start is None or end is None or end.get_timeframe()[1] < start.get_timeframe()[0]:
+            return start
+        return Date("RANGE", start.get_timeframe()[0], f"{first['text']} - {second['text']}",
+                    end.get_timeframe()[1])
+
     def _parse_date(self, date_dict: dict) -> Optional[Date]:
         """Converts the date representation from the Stanford parser to a Date object."""
         if re.match(r"^\d{4}$", date_dict["value"]):
@@ -130,26 +242,98 @@ class DateRecognizer:
             return Date("WEEK", datetime.strptime(date_dict["value"] + ' 1', "%Y-W%W %w").date(), date_dict["text"])
         return None
 
-    def _send_request(self, sentence: str) -> List[dict]:
-        """Sends a request to the server running the Stanford parser and returns the result as a dict."""
+    @staticmethod
+    def _get_key(sentence: str) -> Tuple[str, datetime.date]:
+        # CoreNLP resolves relative dates based on the current day, so it is part of the key.
+        return sentence, datetime.now().date()
+
+    def _request_dates(self, sentence: str) -> List[dict]:
+        """Returns the dates found in a sentence, reusing the response from earlier requests if possible."""
+        # The same sentence is needed several times while building the messages, since the intent and the slots
+        # of each question need the date.
+        key: Tuple[str, datetime.date] = self._get_key(sentence)
+
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                record_cache_lookup("corenlp", True)
+                return self._cache[key]
+            if key in self._failed:
+                return []
+            pending: Optional[Future] = self._pending.get(key)
+
+        if pending is not None:
+            try:
+                with time_stage("corenlp_wait"):
+                    return pending.result(self._timeout)
+            except FutureTimeoutError:
+                # The question is answered without a date rather than not at all.
+                self.logger.warning("CoreNLP didn't respond to %r within %s seconds.", sentence, self._timeout)
+                with self._cache_lock:
+                    self._add_failure(key)
+                return []
+
+        record_cache_lookup("corenlp", False)
+        return self._fetch_dates(key)
+
+    def _fetch_dates(self, key: Tuple[str, datetime.date], prefetched: bool = False) -> List[dict]:
+        """Sends the request for the dates of the sentence in the key and caches the response.
+
+        If the request was prefetched, a failure is logged and remembered instead of raised, like a timeout.
+        """
+        try:
+            dates: List[dict] = self.send_request(key[0])
+        except Exception as exception:
+            if not prefetched:
+                raise
+            self.logger.warning("The request to CoreNLP for %r failed: %r", key[0], exception)
+            with self._cache_lock:
+                # Both happen under the lock, so a lookup either waits for the request or knows that it failed.
+                self._add_failure(key)
+                self._pending.pop(key, None)
+            return []
+
+        with self._cache_lock:
+            self._cache[key] = dates
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            self._pending.pop(key, None)
+        return dates
+
+    def _add_failure(self, key: Tuple[str, datetime.date]) -> None:
+        """Remembers that the request for a key failed, the lock of the cache needs to be held."""
+        self._failed[key] = True
+        if len(self._failed) > self._cache_size:
+            self._failed.popitem(last=False)
+
+    @timed("corenlp")
+    def send_request(self, sentence: str) -> List[dict]:
+        """Sends a request to the server running the Stanford parser and returns the dates it found.
+
+        Unlike recognize_date, this neither uses the cache nor the date gate, so every call sends a request.
+        """
         properties: dict = {
             "date": datetime.now().isoformat(),
             "annotators": "tokenize, ssplit, pos, lemma, ner",
             "outputFormat": "json",
         }
-        res: dict = requests.post(f'http://corenlp:9000/?properties={json.dumps(properties)}',
-                                  data={'data': sentence}).json()
+        # The text is sent as the raw body. CoreNLP annotates the whole body, so the character offsets of the dates
+        # would be shifted by the "data=" of form data.
+        res: dict = requests.post(f'{self._url}/?properties={json.dumps(properties)}',
+                                  data=sentence.encode("utf-8")).json()
 
         dates = list()
         for sentence in res["sentences"]:
             if "entitymentions" in sentence:
                 for entity in sentence["entitymentions"]:
                     if entity["ner"] in ["DATE", "TIME"] and "timex" in entity and "value" in entity["timex"]:
-                        print(entity)
+                        self.logger.debug("Found the date entity %s.", entity)
                         dates.append({
                             "text": entity["text"],
                             "type": "DATE",
-                            "value": entity["timex"]["value"]
+                            "value": entity["timex"]["value"],
+                            "begin": entity["characterOffsetBegin"],
+                            "end": entity["characterOffsetEnd"]
                         })
 
         return dates
@@ -0,0 +1,44 @@
+import re
+from typing import Set
+
+from spacy.tokens import Span
+
+
+class DateGate:
+    """Class that cheaply decides whether a text could contain a date, so that CoreNLP is only asked if it could.
+
+    A text passes the gate if it contains a digit or a word of the lexicon, i.e. the name of a month or a weekday,
+    a unit of time or a relative expression like "yesterday" or "ago". A parsed span also passes if spaCy found
+    a DATE or TIME entity or a number in it. The gate must let every text with a date pass, so the lexicon also
+    contains the words that CoreNLP recognizes as dates even though the DateRecognizer ignores them (e.g. "daily").
+    """
+    _months: Set[str] = {"january", "february", "march", "april", "may", "june", "july", "august", "september",
+                         "october", "november", "december", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep",
+                         "sept", "oct", "nov", "dec"}
+    _weekdays: Set[str] = {"monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday", "mon", "tue",
+                           "tues", "wed", "thu", "thur", "thurs", "fri", "sat", "sun"}
+    _units: Set[str] = {"day", "days", "week", "weeks", "weekend", "weekends", "fortnight", "month", "months",
+                        "quarter", "quarters", "year", "years", "decade", "decades", "century", "hour", "hours",
+                        "minute", "minutes", "morning", "afternoon", "evening", "night", "noon", "midnight",
+                        "spring", "summer", "autumn", "fall", "winter", "christmas", "easter", "halloween",
+                        "thanksgiving", "daily", "weekly", "monthly", "quarterly", "yearly", "annually", "annual",
+                        "nightly", "hourly"}
+    _relative_words: Set[str] = {"today", "tonight", "yesterday", "tomorrow", "ago", "now", "currently", "recently",
+                                 "lately", "present", "past", "future", "since", "until", "till"}
+    _lexicon: Set[str] = _months | _weekdays | _units | _relative_words
+
+    _word_pattern: re.Pattern = re.compile(r"[a-z]+")
+    _digit_pattern: re.Pattern = re.compile(r"\d")
+
+    @staticmethod
+    def could_contain_date(text: str) -> bool:
+        """Checks whether a text could contain a date, using only the text itself."""
+        if DateGate._digit_pattern.search(text):
+            return True
+        return not DateGate._lexicon.isdisjoint(DateGate._word_pattern.findall(text.lower()))
+
+    @staticmethod
+    def span_could_contain_date(span: Span) -> bool:
+        """Checks whether a parsed span could contain a date."""
+        return DateGate.could_contain_date(span.text) or any(token.like_num for token in span) or \
+            any(entity.label_ in ["DATE", "TIME"] for entity in span.ents)
@@ -3,8 +3,10 @@ from typing import Optional
 
 from spacy.tokens import Span
 
+from lib.nlu.slot.count import CountRecognizer
 from lib.nlu.slot.date import Date, DateRecognizer
 from lib.nlu.slot.location import LocationRecognizer
+from lib.util.metrics import timed
 
 
 @dataclass
@@ -12,20 +14,25 @@ class Slots:
     """Class representing the slots of a query.
     date: The date mentioned in the query.
     location: The location mentioned in the query.
+    count: The number of locations asked for, e.g. 5 for "the top 5 countries". None if only one is asked for.
     """
     date: Optional[Date]
     location: Optional[str]
+    count: Optional[int] = None
 
 
 class SlotsFiller:
     """Class providing helper slots to extract the slots from text."""
-    def __init__(self):
-        self._date_recognizer = DateRecognizer()
+    def __init__(self, date_recognizer: Optional[DateRecognizer] = None):
+        self._date_recognizer = DateRecognizer() if date_recognizer is None else date_recognizer
         self._location_recognizer = LocationRecognizer()
+        self._count_recognizer = CountRecognizer()
 
+    @timed("slots")
     def fill_slots(self, span: Span) -> Slots:
         """Returns the filled slots for a span."""
         date = self._date_recognizer.recognize_date(span)
         location = self._location_recognizer.recognize_location(span)
+        count = self._count_recognizer.recognize_count(span)
 
-        return Slots(date, location)
+        return Slots(date, location, count)
@@ -1,19 +1,21 @@
 from __future__ import annotations
 
 from enum import Enum
-from typing import Optional, List
+from typing import Optional, List, Set
 
 from nltk import PorterStemmer
 from spacy.tokens import Token, Span
 
+from lib.config.dataset_registry import get_dataset_registry, DatasetDefinition, check_members
 from lib.nlu.patterns import Pattern
+from lib.util.metrics import timed
 
 
 class Topic(Enum):
     """Class representing the topic of query.
     CASES: The query is about positive COVID cases.
     VACCINATIONS: The query is about vaccinations.
-    AMBIGUOUS: The query contains trigger words for both vaccinations and positive cases.
+    AMBIGUOUS: The query contains trigger words for several topics, e.g. both vaccinations and positive cases.
     UNKNOWN: The topic is unknown.
     """
     CASES = 1
@@ -30,34 +32,51 @@ class Topic(Enum):
             return Topic["UNKNOWN"]
 
 
+# Every dataset in lib/config/datasets.yaml answers the questions about one of the topics.
+check_members(Topic, get_dataset_registry().topics, ["AMBIGUOUS", "UNKNOWN"])
+
+
 class TopicRecognizer:
     """Class providing helper methods for recognizing the topic of a query."""
     def __init__(self):
         self._stemmer: PorterStemmer = PorterStemmer()
 
+    @timed("topic")
     def recognize_topic(self, span: Span) -> Topic:
-        is_topic_vaccine: bool = self.is_topic_vaccine(span)
-        is_topic_cases: bool = self.is_topic_cases(span)
-
-        if is_topic_vaccine:
-            if is_topic_cases:
-                return Topic.AMBIGUOUS
-            else:
-                return Topic.VACCINATIONS
+        return self.combine_topics({Topic[topic] for topic in get_dataset_registry().topics
+                                    if self.is_topic(span, topic)})
+
+    @staticmethod
+    def combine_topics(topics: Set[Topic]) -> Topic:
+        """Determines the topic based on the topics that the query contains trigger words for."""
+        if len(topics) > 1:
+            return Topic.AMBIGUOUS
+        elif len(topics) == 1:
+            return next(iter(topics))
         else:
-            if is_topic_cases:
-                return Topic.CASES
-            else:
-                return Topic.UNKNOWN
+            return Topic.UNKNOWN
+
+    @staticmethod
+    def is_covid_only(span: Span) -> bool:
+        """Checks whether a span is about COVID itself and not e.g. about a COVID vaccine, which means it's about the
+        default topic of the datasets.
+        """
+        # Special case: "How many people got COVID" vs. "How many people got the COVID vaccine"
+        return Pattern.has_valid_pattern(span, [Pattern.covid_pattern]) and not Pattern.has_valid_pattern(
+                span, [Pattern.covid_other_topic_pattern, Pattern.other_topic_covid_pattern])
+
+    def is_topic(self, span: Span, topic: str) -> bool:
+        """Checks whether a span is about a topic of the datasets."""
+        dataset: DatasetDefinition = get_dataset_registry().get_dataset_by_topic(topic)
+        if dataset.default_topic and self.is_covid_only(span):
+            return True
+        return Pattern.has_valid_pattern(span, [Pattern.get_trigger_pattern(dataset.trigger_pattern_name,
+                                                                             dataset.trigger_words)])
 
     def is_topic_vaccine(self, span: Span) -> bool:
         """Checks whether a span is about vaccines."""
-        return Pattern.has_valid_pattern(span, [Pattern.vaccine_trigger_pattern])
+        return self.is_topic(span, Topic.VACCINATIONS.name)
 
     def is_topic_cases(self, span: Span) -> bool:
         """Checks whether a span is about positive COVID cases."""
-        # Special case: "How many people got COVID" vs. "How many people got the COVID vaccine"
-        if Pattern.has_valid_pattern(span, [Pattern.covid_pattern]) and not Pattern.has_valid_pattern(
-                span, [Pattern.covid_vaccine_pattern, Pattern.vaccine_covid_pattern]):
-            return True
-        return Pattern.has_valid_pattern(span, [Pattern.case_trigger_pattern])
+        return self.is_topic(span, Topic.CASES.name)
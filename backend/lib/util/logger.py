@@ -1,12 +1,17 @@
+import atexit
 import logging
 import os
 import pathlib
-from logging.handlers import TimedRotatingFileHandler
+import queue
 import sys
+import threading
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+from typing import Dict, Optional
 
 
 server_log_format: str = "%(asctime)s %(levelname)s - %(module)s: %(message)s"
 log_path: pathlib.Path = pathlib.Path(os.environ.get("COVBOT_LOGS"))
+log_level: int = logging.getLevelName(os.environ.get("COVBOT_LOG_LEVEL", "INFO").upper())
 
 
 class ColoredFormatter(logging.Formatter):
@@ -26,45 +31,102 @@ class ColoredFormatter(logging.Formatter):
         logging.CRITICAL: bold_red + server_log_format + reset
     }
 
+    def __init__(self):
+        super().__init__(server_log_format)
+        # The formatters only depend on the level, so we build them once instead of once per record.
+        self._formatters: Dict[int, logging.Formatter] = {level: logging.Formatter(log_fmt)
+                                                          for level, log_fmt in self.FORMATS.items()}
+
     def format(self, record: logging.LogRecord) -> str:
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter: logging.Formatter = logging.Formatter(log_fmt)
-        return formatter.format(record)
+        formatter: Optional[logging.Formatter] = self._formatters.get(record.levelno)
+        return formatter.format(record) if formatter else super().format(record)
 
 
 class Formatter(logging.Formatter):
     """A formatter that allows printing logs using the custom output format."""
-    def format(self, record: logging.LogRecord) -> str:
-        formatter: logging.Formatter = logging.Formatter(server_log_format)
-        return formatter.format(record)
+    def __init__(self):
+        super().__init__(server_log_format)
 
 
-class ServerLogger(logging.Logger):
-    """Logger that can be used by the Flask webserver to log important information."""
-    def __init__(self, name: str):
-        super().__init__(name)
+class _DeferredQueueHandler(QueueHandler):
+    """Queue handler that leaves most of the formatting of a record to the listener thread.
 
-        rotating_file_handler: TimedRotatingFileHandler = TimedRotatingFileHandler(log_path / "server_log", "D")
-        rotating_file_handler.setLevel(logging.INFO)
+    The message is merged with its arguments in the calling thread, because mutable arguments could change before
+    the listener thread gets to the record. Unlike the default QueueHandler, the record isn't copied and the
+    exception info is left as it is, since our queues never leave the process and the traceback is formatted by
+    the listener thread.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
-        stream_handler: logging.StreamHandler = logging.StreamHandler(sys.stdout)
-        stream_handler.setLevel(logging.INFO)
 
-        stream_handler.setFormatter(ColoredFormatter())
-        rotating_file_handler.setFormatter(Formatter())
+class _LogPipeline:
+    """Class that owns a queue, the handlers writing its records and the listener thread draining it.
 
-        self.addHandler(stream_handler)
-        self.addHandler(rotating_file_handler)
+    All loggers writing to the same destination share one pipeline, so the handlers (and their open files)
+    exist only once per process, no matter how many logger instances are created.
+    """
+    _lock: threading.Lock = threading.Lock()
 
+    def __init__(self, *handlers: logging.Handler):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.handler: QueueHandler = _DeferredQueueHandler(self._queue)
+        self._listener: QueueListener = QueueListener(self._queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+        self._running: bool = True
+        atexit.register(self.stop)
 
-class MessageLogger(logging.Logger):
-    """Logger that can be used to log the queries and their response."""
-    def __init__(self, name: str):
-        super().__init__(name)
+    def stop(self) -> None:
+        """Flushes all pending records and stops the listener thread."""
+        if self._running:
+            self._running = False
+            self._listener.stop()
+
+
+_pipelines: Dict[str, _LogPipeline] = {}
+
+
+def _get_pipeline(name: str) -> _LogPipeline:
+    """Returns the shared pipeline with the given name, creating it on first use."""
+    with _LogPipeline._lock:
+        if name not in _pipelines:
+            if name == "server":
+                rotating_file_handler: TimedRotatingFileHandler = TimedRotatingFileHandler(log_path / "server_log",
+                                                                                           "D")
+                rotating_file_handler.setLevel(log_level)
+                rotating_file_handler.setFormatter(Formatter())
 
-        file_handler: logging.FileHandler = logging.FileHandler(log_path / "messages_log")
-        file_handler.setLevel(logging.INFO)
+                stream_handler: logging.StreamHandler = logging.StreamHandler(sys.stdout)
+                stream_handler.setLevel(log_level)
+                stream_handler.setFormatter(ColoredFormatter())
 
-        file_handler.setFormatter(Formatter())
+                _pipelines[name] = _LogPipeline(stream_handler, rotating_file_handler)
+            elif name == "messages":
+                file_handler: logging.FileHandler = logging.FileHandler(log_path / "messages_log")
+                file_handler.setLevel(logging.INFO)
+                file_handler.setFormatter(Formatter())
 
-        self.addHandler(file_handler)
\ No newline at end of file
+                _pipelines[name] = _LogPipeline(file_handler)
+            else:
+                raise NotImplementedError()
+
+        return _pipelines[name]
+
+
+class ServerLogger(logging.Logger):
+    """Logger that can be used by the Flask webserver to log important information.
+
+    Records are put on a queue and written to stdout and the rotating server log by a background thread.
+    """
+    def __init__(self, name: str):
+        super().__init__(name, log_level)
+        self.addHandler(_get_pipeline("server").handler)
+
+
+class MessageLogger(logging.Logger):
+    """Logger that can be used to log the queries and their response."""
+    def __init__(self, name: str):
+        super().__init__(name, logging.INFO)
+        self.addHandler(_get_pipeline("messages").handler)
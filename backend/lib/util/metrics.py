@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import functools
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Tuple, List, Callable, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+# Bucket boundaries in seconds. The lower ones are needed for the pattern matchers, which usually take less
+# than a millisecond, the upper ones for CoreNLP requests that run into a timeout.
+default_buckets: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                                      5.0, 10.0)
+# The content type of version 0.0.4 of the Prometheus text format.
+content_type: str = "text/plain; version=0.0.4"
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = "") -> str:
+    """Formats the labels of a sample in the Prometheus text format."""
+    labels: List[str] = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    """Class representing a monotonically increasing counter, optionally split up by labels."""
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label_names: Tuple[str, ...] = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increments the counter for the given label values."""
+        key: Tuple[str, ...] = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        """Returns the current value of the counter for the given label values."""
+        return self._values.get(tuple(str(labels[name]) for name in self.label_names), 0)
+
+    def render(self) -> List[str]:
+        """Returns the lines representing the counter in the Prometheus text format."""
+        lines: List[str] = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Class representing a histogram of observed values, optionally split up by labels."""
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = default_buckets):
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label_names: Tuple[str, ...] = label_names
+        self.buckets: Tuple[float, ...] = buckets
+        # For every combination of labels, we keep the (non-cumulative) bucket counts, the sum and the count.
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Records a new observation for the given label values."""
+        key: Tuple[str, ...] = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            bucket_counts, total = self._values[key]
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[index] += 1
+                    break
+            else:
+                bucket_counts[-1] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        """Returns the lines representing the histogram in the Prometheus text format."""
+        lines: List[str] = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total) in sorted(self._values.items()):
+                cumulative_count: int = 0
+                for upper_bound, count in zip(self.buckets + (float("inf"),), bucket_counts):
+                    cumulative_count += count
+                    le: str = "+Inf" if upper_bound == float("inf") else repr(upper_bound)
+                    labels: str = _format_labels(self.label_names, key, 'le="' + le + '"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative_count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total[0]}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative_count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Class that keeps track of all metrics of the process and renders them for the /metrics endpoint.
+
+    Note that every gunicorn worker has its own registry, so each of them only reports the requests it has
+    served itself.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        """Returns the counter with the given name, creating it if necessary."""
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, documentation, label_names)
+        return self._metrics[name]
+
+    def histogram(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> Histogram:
+        """Returns the histogram with the given name, creating it if necessary."""
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, documentation, label_names)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry: MetricsRegistry = MetricsRegistry()
+
+stage_duration: Histogram = registry.histogram("covbot_stage_duration_seconds",
+                                               "Time spent in each stage of the pipeline.", ("stage",))
+sql_duration: Histogram = registry.histogram("covbot_sql_statement_duration_seconds",
+                                             "Time spent executing a single SQL statement.", ("statement",))
+query_results: Counter = registry.counter("covbot_query_results_total",
+                                          "Number of query results per QueryResultCode.", ("code",))
+message_validations: Counter = registry.counter("covbot_message_validations_total",
+                                                "Number of validated messages per MessageValidationCode.",
+                                                ("code",))
+date_gate_decisions: Counter = registry.counter("covbot_date_gate_decisions_total",
+                                               "Number of questions per decision of the date gate (pass or skip).",
+                                               ("result",))
+classifier_decisions: Counter = registry.counter("covbot_classifier_decisions_total",
+                                                "Number of questions per engine that recognized their topic and "
+                                                "intent (classifier or rules).", ("engine",))
+cache_requests: Counter = registry.counter("covbot_cache_requests_total",
+                                           "Number of cache lookups per cache and result (hit or miss).",
+                                           ("cache", "result"))
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """Context manager that records the time spent inside it for the given stage."""
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed(stage: str) -> Callable:
+    """Decorator that records the time spent in the decorated function for the given stage."""
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with time_stage(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Records the result of a lookup in one of the caches."""
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def get_cache_hit_rate(cache: str) -> Optional[float]:
+    """Returns the share of the lookups in one of the caches that were hits, None if there were no lookups."""
+    hits: float = cache_requests.get(cache=cache, result="hit")
+    lookups: float = hits + cache_requests.get(cache=cache, result="miss")
+    return hits / lookups if lookups > 0 else None
+
+
+_instrumented_engines: weakref.WeakSet = weakref.WeakSet()
+
+
+def time_sql_statements(engine: Engine) -> None:
+    """Records the execution time of every SQL statement that is sent over the given engine."""
+    if engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.covbot_statement_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        sql_duration.observe(time.perf_counter() - context.covbot_statement_start,
+                             statement=_statement_kind(statement))
+        # Whether SQLAlchemy found the compiled form of the statement in the compiled cache of the engine. Raw SQL
+        # and DDL statements aren't cached at all.
+        if context.cache_hit in (CACHE_HIT, CACHE_MISS):
+            record_cache_lookup("sql_compiled", context.cache_hit == CACHE_HIT)
+
+
+def _statement_kind(statement: str) -> str:
+    """Returns a short label for a SQL statement, e.g. "select_cases"."""
+    words: List[str] = [word.lower() for word in statement.split()]
+    kind: str = words[0] if words else "unknown"
+    for keyword in ("from", "into", "update", "table"):
+        if keyword in words[:-1]:
+            table: str = words[words.index(keyword) + 1].strip('"`(').split(".")[-1]
+            return f"{kind}_{table}"
+    return kind
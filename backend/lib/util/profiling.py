@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import pathlib
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Iterator, List
+
+from lib.util.logger import ServerLogger, log_path
+
+
+class RequestProfiler:
+    """Class that runs single requests under cProfile and saves the profiles to disk.
+
+    Profiling is only possible if the environment variable COVBOT_PROFILING is set to 1. A request is then
+    profiled if it was sent with the header "X-Covbot-Profile: 1", or randomly with the probability given in
+    COVBOT_PROFILE_SAMPLE_RATE (0 by default). Each profile is written to the "profiles" directory in COVBOT_LOGS
+    as "<request id>.prof" together with a "<request id>.json" file containing the query. Only the newest
+    COVBOT_PROFILE_MAX_FILES (200 by default) profiles are kept.
+    """
+    header: str = "X-Covbot-Profile"
+
+    def __init__(self, directory: pathlib.Path = log_path / "profiles"):
+        self.enabled: bool = os.environ.get("COVBOT_PROFILING", "0") == "1"
+        self.sample_rate: float = float(os.environ.get("COVBOT_PROFILE_SAMPLE_RATE", "0"))
+        self.max_profiles: int = int(os.environ.get("COVBOT_PROFILE_MAX_FILES", "200"))
+        self.directory: pathlib.Path = directory
+        self.logger: ServerLogger = ServerLogger(__name__)
+        # Only one profiler can be active at a time, so concurrent requests are simply not profiled.
+        self._lock: threading.Lock = threading.Lock()
+
+    def should_profile(self, header_value: Optional[str]) -> bool:
+        """Decides whether a request should be profiled, based on the value of the profiling header."""
+        if not self.enabled:
+            return False
+        return header_value == "1" or random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, query: str, header_value: Optional[str] = None) -> Iterator[Optional[str]]:
+        """Profiles the code inside the context if the request should be profiled.
+
+        Yields the id under which the profile is saved, or None if the request isn't profiled.
+        """
+        if not self.should_profile(header_value) or not self._lock.acquire(blocking=False):
+            yield None
+            return
+
+        request_id: str = uuid.uuid4().hex[:16]
+        profiler: cProfile.Profile = cProfile.Profile()
+        start: float = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                yield request_id
+            finally:
+                profiler.disable()
+                self._save(profiler, request_id, query, time.perf_counter() - start)
+        finally:
+            self._lock.release()
+
+    def _save(self, profiler: cProfile.Profile, request_id: str, query: str, duration: float) -> None:
+        """Writes a profile to disk and removes the oldest profiles if there are too many."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(self.directory / f"{request_id}.prof"))
+            with open(self.directory / f"{request_id}.json", "w") as metadata_file:
+                json.dump({"request_id": request_id, "query": query, "duration": duration,
+                           "created": datetime.now().isoformat()}, metadata_file)
+
+            profiles: List[pathlib.Path] = sorted(self.directory.glob("*.prof"), key=lambda path: path.stat().st_mtime)
+            for old_profile in profiles[:max(0, len(profiles) - self.max_profiles)]:
+                old_profile.unlink(missing_ok=True)
+                old_profile.with_suffix(".json").unlink(missing_ok=True)
+        except OSError:
+            self.logger.exception("Couldn't save the profile of the request %s.", request_id)
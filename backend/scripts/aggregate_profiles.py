@@ -0,0 +1,45 @@
+""" Profile aggregation script
+
+This script aggregates the request profiles saved by the web server (see lib/util/profiling.py) and prints the
+functions that took the most time across all of them, followed by the slowest profiled requests. With --query,
+only the profiles of requests whose query contains the given text are considered.
+
+Example: python scripts/aggregate_profiles.py --sort tottime --top 30 --query "vaccinated"
+"""
+import argparse
+import json
+import os
+import pathlib
+import pstats
+from typing import List
+
+parser = argparse.ArgumentParser(description="Aggregates the saved request profiles.")
+parser.add_argument("--directory", type=pathlib.Path,
+                    default=pathlib.Path(os.environ.get("COVBOT_LOGS", ".")) / "profiles",
+                    help="Directory containing the saved profiles.")
+parser.add_argument("--sort", choices=["cumulative", "tottime", "ncalls"], default="cumulative")
+parser.add_argument("--top", type=int, default=25, help="Number of functions to show.")
+parser.add_argument("--query", help="Only use profiles of queries containing this text.")
+parser.add_argument("--slowest", type=int, default=10, help="Number of slowest requests to list.")
+
+if __name__ == '__main__':
+    arguments: argparse.Namespace = parser.parse_args()
+
+    profiles: List[dict] = []
+    for metadata_path in arguments.directory.glob("*.json"):
+        with open(metadata_path) as metadata_file:
+            metadata: dict = json.load(metadata_file)
+        profile_path: pathlib.Path = metadata_path.with_suffix(".prof")
+        if profile_path.exists() and (arguments.query is None or arguments.query.lower() in metadata["query"].lower()):
+            profiles.append({**metadata, "path": profile_path})
+
+    if len(profiles) == 0:
+        raise SystemExit(f"No matching profiles found in {arguments.directory}.")
+
+    stats: pstats.Stats = pstats.Stats(*[str(profile["path"]) for profile in profiles])
+    print(f"Top {arguments.top} functions across {len(profiles)} profiled requests:")
+    stats.strip_dirs().sort_stats(arguments.sort).print_stats(arguments.top)
+
+    print(f"Slowest {arguments.slowest} profiled requests:")
+    for profile in sorted(profiles, key=lambda profile: profile["duration"], reverse=True)[:arguments.slowest]:
+        print(f"{profile['duration'] * 1000:10.1f} ms  {profile['request_id']}  {profile['query']!r}")
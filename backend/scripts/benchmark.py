@@ -0,0 +1,133 @@
+""" Benchmark script
+
+This script measures the throughput and the latency percentiles of each stage of the pipeline over the annotated
+queries (tests/annotated_queries.json) and/or the evaluation queries (evaluation_queries.csv). The queries are
+answered from a database filled with deterministic fixture data, and the date recognition is served by a stand-in
+for the CoreNLP server replaying the responses recorded in tests/corenlp_recordings.json, so that two runs on the
+same machine are comparable. Until real responses were recorded, the synthetic ones in
+tests/corenlp_synthetic_responses.json are replayed, which is marked in the output.
+
+The results are written as JSON. Passing the results of an earlier run with --compare reports every stage that got
+slower by more than --threshold and makes the script exit with a non-zero status code.
+
+Example: python scripts/benchmark.py --corpus annotated --repeat 3 --output results.json --compare baseline.json
+"""
+import argparse
+import json
+import os
+import pathlib
+import platform
+import sys
+import tempfile
+from datetime import datetime
+from typing import List, Dict
+
+from lib.benchmark.fixtures import create_fixture_database, reference_date
+from lib.benchmark.runner import PipelineBenchmark, load_annotated_queries, load_evaluation_queries
+from lib.benchmark.statistics import compare, Regression
+from lib.corenlp.recordings import RecordingStore, get_default_recordings_path
+from lib.corenlp.stand_in_server import StandInServer
+from lib.util import metrics
+
+backend_path: pathlib.Path = pathlib.Path(__file__).parent.parent
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks each stage of the Covbot pipeline.")
+    parser.add_argument("--corpus", choices=["annotated", "evaluation", "all"], default="annotated",
+                        help="The queries to run the benchmark on.")
+    parser.add_argument("--repeat", type=int, default=3, help="How many times to run over the queries.")
+    parser.add_argument("--warmup", type=int, default=5, help="Number of queries to run before measuring.")
+    parser.add_argument("--output", type=pathlib.Path, help="File to write the results to.")
+    parser.add_argument("--compare", type=pathlib.Path, help="Results of an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative change that counts as a regression when comparing (default 0.1 = 10%%).")
+    parser.add_argument("--corenlp-url", help="Use this CoreNLP server instead of the recorded responses.")
+    parser.add_argument("--db-name", default="covbot_benchmark", help="Name of the fixture database.")
+    return parser.parse_args()
+
+
+def load_queries(corpus: str) -> List[str]:
+    queries: List[str] = []
+    if corpus in ["annotated", "all"]:
+        queries += load_annotated_queries(backend_path / "tests" / "annotated_queries.json")
+    if corpus in ["evaluation", "all"]:
+        queries += load_evaluation_queries(backend_path / "evaluation_queries.csv")
+    return queries
+
+
+def main() -> int:
+    arguments: argparse.Namespace = parse_arguments()
+
+    stand_in: StandInServer = None
+    corenlp: str = arguments.corenlp_url
+    if arguments.corenlp_url is None:
+        store: RecordingStore = RecordingStore(get_default_recordings_path(backend_path / "tests"))
+        stand_in = StandInServer(store, port=0).start()
+        corenlp_url: str = stand_in.url
+        corenlp = "synthetic" if store.synthetic_count > 0 else "recorded"
+        if store.synthetic_count > 0:
+            print(f"WARNING: {store.synthetic_count} of the {len(store)} CoreNLP responses are synthetic (derived "
+                  f"from the annotations), record real ones with scripts/corenlp_stand_in.py.")
+    else:
+        corenlp_url = arguments.corenlp_url
+    # The date recognizers read the URL when they are created.
+    os.environ["COVBOT_CORENLP_URL"] = corenlp_url
+
+    print("Creating the fixture database...")
+    with tempfile.TemporaryDirectory() as data_directory:
+        create_fixture_database(arguments.db_name, pathlib.Path(data_directory))
+
+    queries: List[str] = load_queries(arguments.corpus)
+    print(f"Running the benchmark over {len(queries)} queries ({arguments.repeat} times)...")
+    benchmark: PipelineBenchmark = PipelineBenchmark(arguments.db_name, reference_date)
+    stages: Dict[str, Dict[str, float]] = benchmark.run(queries, arguments.repeat, arguments.warmup)
+
+    if stand_in is not None:
+        stand_in.stop()
+
+    results: dict = {
+        "metadata": {
+            "created": datetime.now().isoformat(),
+            "corpus": arguments.corpus,
+            "queries": len(queries),
+            "failed_queries": benchmark.failed_queries,
+            "repeat": arguments.repeat,
+            "corenlp": corenlp,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cache_hit_rates": {cache: metrics.get_cache_hit_rate(cache)
+                                for cache in ["sql_statement", "sql_compiled"]},
+        },
+        "stages": stages
+    }
+
+    print(f"{'stage':<12}{'count':>8}{'per sec':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, summary in stages.items():
+        print(f"{stage:<12}{summary['count']:>8}{summary['throughput_per_second']:>12.1f}{summary['p50_ms']:>10.2f}"
+              f"{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}")
+    if benchmark.failed_queries:
+        print(f"{len(benchmark.failed_queries)} queries raised an exception and were skipped.")
+    for cache, hit_rate in results["metadata"]["cache_hit_rates"].items():
+        if hit_rate is not None:
+            print(f"Hit rate of the {cache} cache: {hit_rate:.1%}")
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            baseline: dict = json.load(baseline_file)
+        regressions: List[Regression] = compare(stages, baseline["stages"], arguments.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions of more than {arguments.threshold:.0%} compared to {arguments.compare}.")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
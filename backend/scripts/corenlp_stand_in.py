@@ -0,0 +1,71 @@
+""" CoreNLP stand-in script
+
+This script starts a local stand-in for the CoreNLP server, so that the tests, bulk_app.py and the benchmarks can
+be run without the Java server. Point the chatbot at it by setting COVBOT_CORENLP_URL (e.g. http://127.0.0.1:9000).
+
+replay: Serves the responses from the recordings file (by default tests/corenlp_recordings.json, or the synthetic
+responses in tests/corenlp_synthetic_responses.json as long as nothing was recorded).
+record: Forwards every request to a real CoreNLP server (--upstream) and adds its response to the recordings file
+(tests/corenlp_recordings.json by default) when the server is stopped. With --record-queries, the queries from
+tests/annotated_queries.json are recorded right away and the script exits without starting the server.
+
+--latency and --jitter (in milliseconds) add an artificial delay to every response in both modes.
+
+Example: python scripts/corenlp_stand_in.py record --upstream http://corenlp:9000 --record-queries
+"""
+import argparse
+import json
+import pathlib
+from datetime import date
+
+from lib.corenlp.recordings import RecordingStore, get_default_recordings_path
+from lib.corenlp.stand_in_server import StandInServer
+
+backend_path: pathlib.Path = pathlib.Path(__file__).parent.parent
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Runs a stand-in for the CoreNLP server.")
+    parser.add_argument("mode", choices=["replay", "record"])
+    parser.add_argument("--recordings", type=pathlib.Path,
+                        help="File the recorded responses are read from and written to.")
+    parser.add_argument("--upstream", help="URL of the real CoreNLP server (record mode only).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0, help="Artificial latency per response in ms.")
+    parser.add_argument("--jitter", type=float, default=0, help="Random jitter added to the latency in ms.")
+    parser.add_argument("--exact", action="store_true",
+                        help="Only replay responses recorded for the reference date of the request, and answer "
+                             "all other requests with an error.")
+    parser.add_argument("--record-queries", action="store_true",
+                        help="Record the annotated queries and exit (record mode only).")
+    parser.add_argument("--reference-date", type=date.fromisoformat, default=date.today(),
+                        help="Reference date used with --record-queries (default: today).")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments: argparse.Namespace = parse_arguments()
+    if arguments.recordings is None:
+        arguments.recordings = backend_path / "tests" / "corenlp_recordings.json" if arguments.mode == "record" \
+            else get_default_recordings_path(backend_path / "tests")
+    store: RecordingStore = RecordingStore(arguments.recordings)
+    stand_in: StandInServer = StandInServer(store, arguments.host, arguments.port, arguments.mode, arguments.upstream,
+                                            arguments.latency / 1000, arguments.jitter / 1000, arguments.exact)
+
+    if arguments.record_queries:
+        with open(backend_path / "tests" / "annotated_queries.json") as query_file:
+            queries = json.load(query_file)
+        for query in queries:
+            stand_in.record(query["query"], arguments.reference_date)
+        store.save()
+        print(f"Recorded {len(queries)} queries to {arguments.recordings}.")
+    else:
+        print(f"Serving in {arguments.mode} mode on {stand_in.url} with {len(store)} recordings "
+              f"({store.synthetic_count} of them synthetic)...")
+        try:
+            stand_in.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stand_in.stop()
@@ -0,0 +1,110 @@
+""" NLU evaluation script
+
+This script builds the message for every query in tests/annotated_queries.json and compares it with the gold
+annotations. It prints the accuracy and the confusion matrix of the topic, of each field of the intent, of the date
+type and of the location, followed by the latency of the NLU per query. The queries are processed by a pool of
+worker processes, and the date recognition is served by the stand-in for the CoreNLP server replaying the
+responses recorded in tests/corenlp_recordings.json (or the synthetic ones in tests/corenlp_synthetic_responses.json
+until real responses were recorded, which is marked in the output).
+
+Passing the results of an earlier run with --compare makes the script exit with a non-zero status code if the
+accuracy of any field dropped, so that a speedup of the NLU can show that it didn't cost any accuracy. With
+--engine classifier, the topic and the intent are predicted by the IntentClassifier (see scripts/train_classifier.py)
+wherever it is confident enough, so that it can be compared with the rules.
+
+Example: python scripts/evaluate.py --workers 4 --output evaluation.json --compare baseline_evaluation.json
+"""
+import argparse
+import json
+import os
+import pathlib
+import sys
+from datetime import datetime
+from typing import Dict, Any, List
+
+from lib.benchmark.evaluation import NluEvaluation, evaluated_fields
+from lib.corenlp.recordings import RecordingStore, get_default_recordings_path
+from lib.corenlp.stand_in_server import StandInServer
+
+backend_path: pathlib.Path = pathlib.Path(__file__).parent.parent
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Evaluates the accuracy and latency of the NLU.")
+    parser.add_argument("--queries", type=pathlib.Path, default=backend_path / "tests" / "annotated_queries.json",
+                        help="Annotated queries to evaluate.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    parser.add_argument("--output", type=pathlib.Path, help="File to write the results to.")
+    parser.add_argument("--compare", type=pathlib.Path, help="Results of an earlier run to compare against.")
+    parser.add_argument("--corenlp-url", help="Use this CoreNLP server instead of the recorded responses.")
+    parser.add_argument("--engine", choices=["rules", "classifier"], default="rules",
+                        help="The engine that recognizes the topic and the intent.")
+    parser.add_argument("--show-mismatches", action="store_true", help="List every query with a wrong field.")
+    return parser.parse_args()
+
+
+def main() -> int:
+    arguments: argparse.Namespace = parse_arguments()
+    with open(arguments.queries) as query_file:
+        annotated_queries: List[Dict[str, Any]] = json.load(query_file)
+
+    stand_in: StandInServer = None
+    corenlp: str = arguments.corenlp_url
+    if arguments.corenlp_url is None:
+        store: RecordingStore = RecordingStore(get_default_recordings_path(backend_path / "tests"))
+        stand_in = StandInServer(store, port=0).start()
+        corenlp = "synthetic" if store.synthetic_count > 0 else "recorded"
+        if store.synthetic_count > 0:
+            print(f"WARNING: {store.synthetic_count} of the {len(store)} CoreNLP responses are synthetic (derived "
+                  f"from the annotations), so the dates are only compared with themselves.")
+    # The worker processes inherit the environment, the date recognizers read the URL when they are created.
+    os.environ["COVBOT_CORENLP_URL"] = stand_in.url if stand_in is not None else arguments.corenlp_url
+    os.environ["COVBOT_NLU_ENGINE"] = arguments.engine
+
+    print(f"Evaluating {len(annotated_queries)} queries on {arguments.workers} workers...")
+    evaluation: Dict[str, Any] = NluEvaluation(arguments.workers).run(annotated_queries)
+    if stand_in is not None:
+        stand_in.stop()
+
+    for field in evaluated_fields:
+        print(f"\n{field}: {evaluation['accuracy'][field]:.1%}")
+        print(evaluation["confusion_matrices"][field].render())
+    print(f"\nAll fields correct: {evaluation['exact_match']:.1%}")
+    latency: Dict[str, float] = evaluation["latency"]
+    print(f"NLU latency: p50 {latency['p50_ms']:.1f} ms, p95 {latency['p95_ms']:.1f} ms, "
+          f"p99 {latency['p99_ms']:.1f} ms, {latency['throughput_per_second']:.1f} queries/s")
+
+    if arguments.show_mismatches:
+        for result in evaluation["queries"]:
+            if result["mismatches"]:
+                print(f"\n{result['id']}: {result['query']}")
+                for field, values in result["mismatches"].items():
+                    print(f"  {field}: expected {values['gold']}, got {values['predicted']}")
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump({
+                "metadata": {"created": datetime.now().isoformat(), "queries": len(annotated_queries),
+                             "workers": arguments.workers, "engine": arguments.engine,
+                             "corenlp": corenlp},
+                **evaluation,
+                "confusion_matrices": {field: matrix.to_dict()
+                                       for field, matrix in evaluation["confusion_matrices"].items()},
+            }, output_file, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            baseline: Dict[str, Any] = json.load(baseline_file)
+        drops: List[str] = [field for field in evaluated_fields
+                            if evaluation["accuracy"][field] < baseline["accuracy"].get(field, 0.0)]
+        for field in drops:
+            print(f"ACCURACY DROP {field}: {baseline['accuracy'][field]:.1%} -> {evaluation['accuracy'][field]:.1%}")
+        if drops:
+            return 1
+        print(f"No field got less accurate compared to {arguments.compare}.")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+""" Load test script
+
+This script sends questions to the GET / endpoint of a running web server and reports the throughput, the latency
+percentiles and the error rate. The questions are either replayed from a messages_log written by the MessageLogger
+(--source logged), generated by combining topics, question types, locations and relative dates (--source synthetic)
+or a mix of both (--source mixed).
+
+Passing several comma-separated rates runs one test per rate after another, which shows where the latency curve
+bends (the knee) for the given number of workers. Without --rate, the clients send requests back-to-back.
+The latency is measured from the moment a request is sent. The time requests had to wait in the client because all
+--concurrency connections were busy is reported separately as the queue delay.
+
+Example: python scripts/load_test.py --url http://localhost:5200/ --source mixed --rate 5,10,20,40 --duration 60
+"""
+import argparse
+import json
+import os
+import pathlib
+from typing import List, Optional, Dict
+
+from lib.benchmark.load import LoadGenerator, SyntheticQueryGenerator, load_logged_queries
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generates load on the Covbot web server.")
+    parser.add_argument("--url", default="http://localhost:5200/", help="URL of the endpoint answering questions.")
+    parser.add_argument("--source", choices=["logged", "synthetic", "mixed"], default="synthetic")
+    parser.add_argument("--messages-log", type=pathlib.Path,
+                        default=pathlib.Path(os.environ.get("COVBOT_LOGS", ".")) / "messages_log",
+                        help="Log file to replay the questions from.")
+    parser.add_argument("--synthetic-queries", type=int, default=1000,
+                        help="Number of different synthetic questions to generate.")
+    parser.add_argument("--rate", help="Requests per second, or a comma-separated list of rates to sweep.")
+    parser.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum number of requests in flight.")
+    parser.add_argument("--duration", type=float, default=30, help="Duration of each test in seconds.")
+    parser.add_argument("--timeout", type=float, default=30, help="Timeout of a single request in seconds.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=pathlib.Path, help="File to write the results to as JSON.")
+    return parser.parse_args()
+
+
+def load_queries(arguments: argparse.Namespace) -> List[str]:
+    queries: List[str] = []
+    if arguments.source in ["logged", "mixed"]:
+        queries += load_logged_queries(arguments.messages_log)
+    if arguments.source in ["synthetic", "mixed"]:
+        queries += SyntheticQueryGenerator(arguments.seed).generate_many(arguments.synthetic_queries)
+    return queries
+
+
+if __name__ == '__main__':
+    arguments: argparse.Namespace = parse_arguments()
+    queries: List[str] = load_queries(arguments)
+    if len(queries) == 0:
+        raise SystemExit("There are no questions to send.")
+
+    rates: List[Optional[float]] = [float(rate) for rate in arguments.rate.split(",")] if arguments.rate else [None]
+    load_generator: LoadGenerator = LoadGenerator(arguments.url, queries, arguments.concurrency, arguments.timeout,
+                                                  arguments.seed)
+
+    print(f"{'rate':>8}{'requests':>10}{'per sec':>10}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'queue p95 ms':>14}")
+    runs: List[Dict[str, object]] = []
+    for rate in rates:
+        run: Dict[str, object] = load_generator.run(arguments.duration, rate, arguments.arrival)
+        runs.append(run)
+        print(f"{'closed' if rate is None else rate:>8}{run['requests']:>10}{run['throughput_per_second']:>10.1f}"
+              f"{run['error_rate']:>9.1%}{run['p50_ms']:>10.1f}{run['p95_ms']:>10.1f}{run['p99_ms']:>10.1f}"
+              f"{run['queue_delay_p95_ms']:>14.1f}")
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump({"url": arguments.url, "source": arguments.source, "queries": len(queries), "runs": runs},
+                      output_file, indent=2)
@@ -0,0 +1,140 @@
+""" Classifier training script
+
+This script trains the IntentClassifier on the queries in tests/annotated_queries.json and on variants of them
+created by the QueryAugmenter, and saves it to lib/nlu/intent_classifier.npz, where the MessageBuilder loads it from
+if COVBOT_NLU_ENGINE is set to "classifier".
+
+Before training the final model, the accuracy is estimated with a k-fold cross-validation. The variants of a query
+are always in the same fold as the query itself, and only the original queries are evaluated, so that the estimate
+isn't inflated by near-duplicates. The script reports the accuracy of each field, the share of the queries for which
+the classifier is confident enough to be used instead of the rules, the accuracy on those queries and the latency of
+the prediction. To compare the whole NLU against the rules, run scripts/evaluate.py with --engine classifier.
+
+Example: python scripts/train_classifier.py --augmentations 20 --folds 5 --threshold 0.6
+"""
+import argparse
+import json
+import pathlib
+import random
+import time
+from typing import List, Dict, Any, Optional
+
+from spacy.tokens import Doc
+
+from lib.benchmark.augmentation import QueryAugmenter
+from lib.benchmark.statistics import summarize
+from lib.nlu.classifier import IntentClassifier, ClassifierPrediction, default_model_path
+from lib.spacy_components.custom_spacy import get_spacy
+
+backend_path: pathlib.Path = pathlib.Path(__file__).parent.parent
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Trains the linear intent classifier.")
+    parser.add_argument("--queries", type=pathlib.Path, default=backend_path / "tests" / "annotated_queries.json",
+                        help="Annotated queries to train on.")
+    parser.add_argument("--augmentations", type=int, default=20, help="Number of variants of each query.")
+    parser.add_argument("--folds", type=int, default=5, help="Number of folds of the cross-validation.")
+    parser.add_argument("--epochs", type=int, default=300, help="Number of epochs of the gradient descent.")
+    parser.add_argument("--threshold", type=float, default=0.6,
+                        help="Confidence below which the rules are used instead of the classifier.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the augmentation and of the folds.")
+    parser.add_argument("--output", type=pathlib.Path, default=default_model_path, help="File to save the model to.")
+    return parser.parse_args()
+
+
+def get_labels(query: Dict[str, Any]) -> Dict[str, str]:
+    return {"topic": query["topic"], **query["intent"]}
+
+
+def extract_features(queries: List[Dict[str, Any]]) -> List[List[str]]:
+    docs: List[Doc] = list(get_spacy().pipe(query["query"] for query in queries))
+    return [IntentClassifier.extract_features(doc[:]) for doc in docs]
+
+
+def cross_validate(queries: List[Dict[str, Any]], variants: List[Dict[str, Any]], arguments: argparse.Namespace) \
+        -> Dict[str, Any]:
+    """Trains a classifier for each fold and evaluates it on the original queries of the fold."""
+    ids: List[Any] = sorted({query["id"] for query in queries})
+    random.Random(arguments.seed).shuffle(ids)
+    fold_of: Dict[Any, int] = {query_id: index % arguments.folds for index, query_id in enumerate(ids)}
+    query_features: List[List[str]] = extract_features(queries)
+    variant_features: List[List[str]] = extract_features(variants)
+
+    predictions: List[Optional[ClassifierPrediction]] = [None] * len(queries)
+    for fold in range(arguments.folds):
+        train_indexes: List[int] = [index for index, query in enumerate(queries) if fold_of[query["id"]] != fold]
+        train_variants: List[int] = [index for index, variant in enumerate(variants) if fold_of[variant["id"]] != fold]
+        test_indexes: List[int] = [index for index, query in enumerate(queries) if fold_of[query["id"]] == fold]
+        classifier: IntentClassifier = IntentClassifier.train(
+            [query_features[index] for index in train_indexes] + [variant_features[index] for index in train_variants],
+            [get_labels(queries[index]) for index in train_indexes]
+            + [get_labels(variants[index]) for index in train_variants], epochs=arguments.epochs)
+        # Labels that only occur in the test fold can't be predicted, the prediction simply counts as wrong.
+        for index, prediction in zip(test_indexes, classifier.predict_features(
+                [query_features[index] for index in test_indexes])):
+            predictions[index] = prediction
+
+    correct: List[Dict[str, bool]] = [
+        {field: IntentClassifier.get_label(prediction, field) == get_labels(query)[field]
+         for field in IntentClassifier.fields} for prediction, query in zip(predictions, queries)]
+    confident: List[int] = [index for index, prediction in enumerate(predictions)
+                            if prediction.confidence >= arguments.threshold]
+    return {
+        "accuracy": {field: sum(result[field] for result in correct) / len(queries)
+                     for field in IntentClassifier.fields},
+        "exact_match": sum(all(result.values()) for result in correct) / len(queries),
+        "coverage": len(confident) / len(queries),
+        "confident_exact_match": sum(all(correct[index].values()) for index in confident) / len(confident)
+        if confident else 0.0,
+    }
+
+
+def measure_latency(classifier: IntentClassifier, queries: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Measures the prediction for single questions and for all questions in one batch, without spaCy."""
+    spans = [doc[:] for doc in get_spacy().pipe(query["query"] for query in queries)]
+    durations: List[float] = []
+    start: float = time.perf_counter()
+    for span in spans:
+        single_start: float = time.perf_counter()
+        classifier.predict([span])
+        durations.append(time.perf_counter() - single_start)
+    single: Dict[str, float] = summarize(durations, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    classifier.predict(spans)
+    batch_duration: float = time.perf_counter() - start
+    return {"single": single, "batch": {"total_ms": batch_duration * 1000,
+                                        "per_query_ms": batch_duration * 1000 / len(spans)}}
+
+
+def main() -> None:
+    arguments: argparse.Namespace = parse_arguments()
+    with open(arguments.queries) as query_file:
+        queries: List[Dict[str, Any]] = json.load(query_file)
+    variants: List[Dict[str, Any]] = QueryAugmenter(arguments.seed).augment_many(queries, arguments.augmentations)
+    print(f"Training on {len(queries)} queries and {len(variants)} variants.")
+
+    evaluation: Dict[str, Any] = cross_validate(queries, variants, arguments)
+    print(f"\n{arguments.folds}-fold cross-validation on the original queries:")
+    for field, accuracy in evaluation["accuracy"].items():
+        print(f"  {field}: {accuracy:.1%}")
+    print(f"  All fields correct: {evaluation['exact_match']:.1%}")
+    print(f"  Confident (>= {arguments.threshold}): {evaluation['coverage']:.1%} of the queries, "
+          f"{evaluation['confident_exact_match']:.1%} of them fully correct")
+
+    classifier: IntentClassifier = IntentClassifier.train(
+        extract_features(queries + variants), [get_labels(query) for query in queries + variants],
+        epochs=arguments.epochs)
+    classifier.threshold = arguments.threshold
+    classifier.save(arguments.output)
+    print(f"\nSaved the model with {len(classifier.features)} features to {arguments.output}.")
+
+    latency: Dict[str, Dict[str, float]] = measure_latency(classifier, queries)
+    print(f"Prediction latency (without spaCy): p50 {latency['single']['p50_ms']:.3f} ms, "
+          f"p99 {latency['single']['p99_ms']:.3f} ms per question, "
+          f"{latency['batch']['per_query_ms']:.3f} ms per question in one batch of {len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
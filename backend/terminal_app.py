@@ -16,9 +16,11 @@ if __name__ == '__main__':
         if question == "quit":
             break
 
+        message_builder.prefetch(question)
         sentence = spacy(question)[:]
-        message = message_builder.create_message(sentence)
-        print(message)
-        query_result = querier.query_intent(message)
-        answer = answer_generator.generate_answer(query_result)
+        messages = message_builder.create_messages(sentence)
+        for message in messages:
+            print(message)
+        query_results = querier.query_intents(messages)
+        answer = answer_generator.generate_answers(query_results)
         print(answer)
\ No newline at end of file
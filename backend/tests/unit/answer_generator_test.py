@@ -0,0 +1,106 @@
+from datetime import date
+
+import pytest
+
+from lib.database.querier import QueryResult, QueryResultCode
+from lib.nlg.answer_generator import AnswerGenerator
+from lib.nlg.answer_template import AnswerTemplate
+from lib.nlu.intent import Intent, CalculationType, ValueType, ValueDomain, MeasurementType
+from lib.nlu.message import Message
+from lib.nlu.slot import Slots
+from lib.nlu.slot.date import Date
+from lib.nlu.topic import Topic
+
+
+def test_template_variants():
+    template = AnswerTemplate("There have been {result} new positive cases< in {location}>< {date}>.")
+    assert template.required_fields == {"result"}
+    assert template.optional_fields == {"location", "date"}
+    assert len(template.variants) == 4
+
+    assert template.format({"result": "1,000"}) == "There have been 1,000 new positive cases."
+    assert template.format({"result": "1,000", "location": "Austria"}) == \
+           "There have been 1,000 new positive cases in Austria."
+    assert template.format({"result": "1,000", "date": "today"}) == "There have been 1,000 new positive cases today."
+    assert template.format({"result": "1,000", "location": "Austria", "date": "today", "unused": "x"}) == \
+           "There have been 1,000 new positive cases in Austria today."
+
+
+def test_template_missing_required_field():
+    template = AnswerTemplate("I don't have any data on {location}.")
+    with pytest.raises(KeyError):
+        template.format({})
+
+
+def test_missing_template_fails_at_load(monkeypatch):
+    original_compile = AnswerGenerator._compile_success_templates
+
+    def compile_without_one_template(self, success_answers: dict):
+        del success_answers["POSITIVE_CASES"]["NUMBER"]["SUM"]
+        return original_compile(self, success_answers)
+
+    monkeypatch.setattr(AnswerGenerator, "_compile_success_templates", compile_without_one_template)
+    with pytest.raises(ValueError):
+        AnswerGenerator()
+
+
+def test_every_valid_intent_has_a_template():
+    answer_generator = AnswerGenerator()
+    for key in AnswerGenerator.get_valid_intent_keys():
+        assert len(answer_generator._success_templates[key]) > 0
+
+
+def test_success_answer():
+    answer_generator = AnswerGenerator()
+    intent = Intent(CalculationType.RAW_VALUE, ValueType.NUMBER, ValueDomain.POSITIVE_CASES, MeasurementType.DAILY)
+    message = Message(Topic.CASES, intent, Slots(Date("DAY", date(2022, 2, 24), "yesterday"), "Austria"))
+    query_result = QueryResult(message, QueryResultCode.SUCCESS, 1234, {"location": "Austria"})
+
+    answer = answer_generator.generate_answer(query_result)
+    assert answer.startswith("There have been 1,234 new positive cases in Austria ")
+    assert "<" not in answer and "{" not in answer
+
+
+def test_ranking_answer():
+    answer_generator = AnswerGenerator()
+    intent = Intent(CalculationType.MAXIMUM, ValueType.LOCATION, ValueDomain.ADMINISTERED_VACCINES,
+                    MeasurementType.DAILY)
+    message = Message(Topic.VACCINATIONS, intent, Slots(None, None, 3))
+    query_result = QueryResult(message, QueryResultCode.SUCCESS,
+                               [("Austria", 3000), ("United Kingdom", 2500), ("Germany", 1200)], {})
+
+    assert answer_generator.generate_answer(query_result) == \
+           "The 3 countries with the highest number of daily performed vaccinations against COVID are " \
+           "Austria (3,000), the United Kingdom (2,500) and Germany (1,200)."
+
+
+def test_average_answer():
+    answer_generator = AnswerGenerator()
+    intent = Intent(CalculationType.RAW_VALUE, ValueType.NUMBER, ValueDomain.POSITIVE_CASES,
+                    MeasurementType.AVERAGE_7_DAYS)
+    message = Message(Topic.CASES, intent, Slots(None, "Austria"))
+    query_result = QueryResult(message, QueryResultCode.SUCCESS, 10835.142857, {"location": "Austria"})
+
+    assert answer_generator.generate_answer(query_result) == \
+           "The 7-day average of new positive cases in Austria has been 10,835.1 per day."
+
+
+def test_missing_value_answer():
+    answer_generator = AnswerGenerator()
+    intent = Intent(CalculationType.RAW_VALUE, ValueType.NUMBER, ValueDomain.POSITIVE_CASES,
+                    MeasurementType.AVERAGE_7_DAYS)
+    message = Message(Topic.CASES, intent, Slots(None, "Austria"))
+    query_result = QueryResult(message, QueryResultCode.SUCCESS, float("nan"), {"location": "Austria"})
+
+    assert answer_generator.generate_answer(query_result) == \
+           "Sorry, I'm afraid I don't have any data on cases for Austria. Maybe try a different question."
+
+
+def test_ranking_answer_leaves_out_missing_values():
+    answer_generator = AnswerGenerator()
+    intent = Intent(CalculationType.MAXIMUM, ValueType.LOCATION, ValueDomain.ADMINISTERED_VACCINES,
+                    MeasurementType.DAILY)
+    message = Message(Topic.VACCINATIONS, intent, Slots(None, None, 2))
+    query_result = QueryResult(message, QueryResultCode.SUCCESS, [("Austria", 3000), ("Germany", float("nan"))], {})
+
+    assert answer_generator.generate_answer(query_result).endswith(" are Austria (3,000).")
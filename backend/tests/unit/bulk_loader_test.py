@@ -0,0 +1,52 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, inspect, select
+
+from lib.database.bulk_loader import BulkLoader
+from lib.database.entities import Ranking, create_tables
+
+
+def get_rankings() -> pd.DataFrame:
+    return pd.DataFrame({
+        "id": np.arange(1, 6),
+        "metric": ["cases"] * 5,
+        "period_type": ["DAY", "DAY", "DAY", "ALL", "ALL"],
+        "period_start": [date(2022, 1, 1), date(2022, 1, 1), date(2022, 1, 2), None, None],
+        "rank": [1, 2, 1, 1, 2],
+        "location": ["Austria", "Germany", "Austria", "Germany", np.nan],
+        "location_normalized": ["austria", "germany", "austria", "germany", np.nan],
+        "value": [300, 200, 100, 500, 400],
+    })
+
+
+def test_load():
+    engine = create_engine("sqlite://")
+    create_tables(engine, [Ranking.__table__])
+
+    with engine.begin() as db_connection:
+        BulkLoader(batch_size=2).load(db_connection, Ranking.__table__, get_rankings())
+
+    with engine.connect() as db_connection:
+        rows = db_connection.execute(select(Ranking.__table__).order_by(Ranking.id)).all()
+    assert [tuple(row) for row in rows] == [
+        (1, "cases", "DAY", date(2022, 1, 1), 1, "Austria", "austria", 300),
+        (2, "cases", "DAY", date(2022, 1, 1), 2, "Germany", "germany", 200),
+        (3, "cases", "DAY", date(2022, 1, 2), 1, "Austria", "austria", 100),
+        (4, "cases", "ALL", None, 1, "Germany", "germany", 500),
+        (5, "cases", "ALL", None, 2, None, None, 400),
+    ]
+    # The index is built again after the load.
+    assert [index["name"] for index in inspect(engine).get_indexes("rankings")] == ["ix_rankings_lookup"]
+
+
+def test_load_is_part_of_the_transaction():
+    engine = create_engine("sqlite://")
+    create_tables(engine, [Ranking.__table__])
+
+    with engine.connect() as db_connection:
+        transaction = db_connection.begin()
+        BulkLoader().load(db_connection, Ranking.__table__, get_rankings())
+        transaction.rollback()
+        assert db_connection.execute(select(Ranking.id)).all() == []
@@ -0,0 +1,44 @@
+import json
+from datetime import date
+
+from lib.benchmark.bulk import read_queries, prepare_output, serialize_message
+from lib.nlu.intent import Intent, CalculationType, ValueType, ValueDomain, MeasurementType
+from lib.nlu.message import Message
+from lib.nlu.slot import Slots
+from lib.nlu.slot.date import Date
+from lib.nlu.topic import Topic
+
+
+def test_read_queries(tmp_path):
+    jsonl_path = tmp_path / "queries.jsonl"
+    jsonl_path.write_text('"How many cases in Austria?"\n\n{"query": "Where were the most vaccinations?"}\n')
+    assert list(read_queries(jsonl_path)) == ["How many cases in Austria?", "Where were the most vaccinations?"]
+
+    csv_path = tmp_path / "queries.csv"
+    csv_path.write_text('query,answer\n"How many cases, in total?",x\nvaccinations today,y\n')
+    assert list(read_queries(csv_path)) == ["How many cases, in total?", "vaccinations today"]
+
+
+def test_prepare_output(tmp_path):
+    output_path = tmp_path / "answers.jsonl"
+    output_path.write_text('{"query": "a"}\n{"query": "b"}\n{"query": "c"')
+
+    assert prepare_output(output_path, resume=True) == 2
+    assert output_path.read_text() == '{"query": "a"}\n{"query": "b"}\n'
+
+    assert prepare_output(output_path, resume=False) == 0
+    assert output_path.read_text() == ""
+    assert prepare_output(tmp_path / "missing.jsonl", resume=True) == 0
+
+
+def test_serialize_message():
+    intent = Intent(CalculationType.SUM, ValueType.NUMBER, ValueDomain.POSITIVE_CASES, MeasurementType.DAILY)
+    message = Message(Topic.CASES, intent, Slots(Date("WEEK", date(2022, 2, 14), "last week"), "austria"))
+
+    serialized = serialize_message(message)
+    assert json.loads(json.dumps(serialized)) == {
+        "topic": "CASES",
+        "intent": {"calculation_type": "SUM", "value_type": "NUMBER", "value_domain": "POSITIVE_CASES",
+                   "measurement_type": "DAILY"},
+        "slots": {"timeframe": {"type": "WEEK", "text": "last week", "value": "2022-02-14"}, "location": "austria"},
+    }
@@ -0,0 +1,109 @@
+import json
+import pathlib
+
+import numpy as np
+import spacy
+from spacy.tokens import Doc
+
+from lib.benchmark.augmentation import QueryAugmenter
+from lib.nlu.classifier import IntentClassifier
+from lib.nlu.intent import CalculationType, ValueType, ValueDomain, MeasurementType
+from lib.nlu.topic.topic import Topic
+
+tests_path: pathlib.Path = pathlib.Path(__file__).parent.parent
+
+# The English vocabulary knows which words are punctuation, no trained pipeline is needed for the features.
+vocab = spacy.blank("en").vocab
+
+cases_labels = {"topic": "CASES", "calculation_type": "RAW_VALUE", "value_type": "NUMBER",
+                "value_domain": "POSITIVE_CASES", "measurement_type": "DAILY"}
+vaccinations_labels = {"topic": "VACCINATIONS", "calculation_type": "MAXIMUM", "value_type": "LOCATION",
+                       "value_domain": "VACCINATED_PEOPLE", "measurement_type": "CUMULATIVE"}
+
+
+def get_classifier() -> IntentClassifier:
+    batch = [["stem=case", "stem=new", "wh=how"], ["stem=case", "stem=today"], ["stem=vaccin", "wh=which"],
+             ["stem=vaccin", "stem=most", "wh=which"]]
+    return IntentClassifier.train(batch, [cases_labels, cases_labels, vaccinations_labels, vaccinations_labels],
+                                  min_count=1)
+
+
+def test_predict():
+    predictions = get_classifier().predict_features([["stem=case", "wh=how"], ["stem=vaccin", "stem=unseen"]])
+
+    assert predictions[0].topic == Topic.CASES
+    assert predictions[0].intent.value_domain == ValueDomain.POSITIVE_CASES
+    assert predictions[0].intent.measurement_type == MeasurementType.DAILY
+    assert predictions[1].topic == Topic.VACCINATIONS
+    assert predictions[1].intent.calculation_type == CalculationType.MAXIMUM
+    assert predictions[1].intent.value_type == ValueType.LOCATION
+    assert set(predictions[0].confidences) == set(IntentClassifier.fields)
+    assert 0.5 < predictions[0].confidence <= 1
+
+
+def test_batch_and_single_predictions_are_equal():
+    classifier = get_classifier()
+    batch = [["stem=case"], ["stem=vaccin", "wh=which"], []]
+
+    for features, prediction in zip(batch, classifier.predict_features(batch)):
+        single = classifier.predict_features([features])[0]
+        assert (single.topic, single.intent) == (prediction.topic, prediction.intent)
+        assert np.allclose(list(single.confidences.values()), list(prediction.confidences.values()))
+
+
+def test_save_and_load(tmp_path):
+    classifier = get_classifier()
+    classifier.threshold = 0.8
+    classifier.save(tmp_path / "classifier.npz")
+    loaded = IntentClassifier.load(tmp_path / "classifier.npz")
+
+    assert loaded.features == classifier.features
+    assert loaded.labels == classifier.labels
+    assert loaded.threshold == 0.8
+    batch = [["stem=case"], ["stem=vaccin"]]
+    assert [prediction.confidences for prediction in loaded.predict_features(batch)] == \
+           [prediction.confidences for prediction in classifier.predict_features(batch)]
+
+
+def test_extract_features():
+    doc = Doc(vocab, words=["How", "many", "cases", "were", "reported", "?"], heads=[1, 2, 4, 4, 4, 4],
+              deps=["advmod", "amod", "nsubjpass", "auxpass", "ROOT", "punct"],
+              tags=["WRB", "JJ", "NNS", "VBD", "VBN", "."], lemmas=["how", "many", "case", "be", "report", "?"])
+    features = IntentClassifier.extract_features(doc[:])
+
+    assert "stem=case" in features and "stem=report" in features
+    assert "dep=nsubjpass:report>case" in features
+    assert "first_wh=how" in features
+    assert not any(feature.startswith("stem=?") for feature in features)
+
+    doc = Doc(vocab, words=["What", "is", "the", "average"], heads=[1, 1, 3, 1], deps=["attr", "ROOT", "det", "nsubj"],
+              tags=["WP", "VBZ", "DT", "NN"], lemmas=["what", "be", "the", "average"])
+    assert "text=average" in IntentClassifier.extract_features(doc[:])
+
+
+def test_from_environment(monkeypatch, tmp_path):
+    monkeypatch.delenv("COVBOT_NLU_ENGINE", raising=False)
+    assert IntentClassifier.from_environment() is None
+
+    monkeypatch.setenv("COVBOT_NLU_ENGINE", "classifier")
+    monkeypatch.setenv("COVBOT_CLASSIFIER_PATH", str(tmp_path / "missing.npz"))
+    assert IntentClassifier.from_environment() is None
+
+    get_classifier().save(tmp_path / "classifier.npz")
+    monkeypatch.setenv("COVBOT_CLASSIFIER_PATH", str(tmp_path / "classifier.npz"))
+    monkeypatch.setenv("COVBOT_CLASSIFIER_THRESHOLD", "0.9")
+    assert IntentClassifier.from_environment().threshold == 0.9
+
+
+def test_augmentation_keeps_the_annotations():
+    with open(tests_path / "annotated_queries.json") as query_file:
+        queries = {query["id"]: query for query in json.load(query_file)}
+
+    for variant in QueryAugmenter(seed=1).augment_many(list(queries.values()), 5):
+        query = queries[variant["id"]]
+        assert (variant["topic"], variant["intent"]) == (query["topic"], query["intent"])
+        if variant["slots"]["timeframe"] is not None:
+            assert variant["slots"]["timeframe"]["type"] == query["slots"]["timeframe"]["type"]
+            assert variant["slots"]["timeframe"]["text"] in variant["query"]
+        if variant["slots"]["location"] != query["slots"]["location"]:
+            assert variant["slots"]["location"] in variant["query"].lower()
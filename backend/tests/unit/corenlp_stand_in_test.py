@@ -0,0 +1,81 @@
+import json
+import pathlib
+from datetime import date
+
+import pytest
+import requests
+
+from lib.corenlp.recordings import RecordingStore, get_default_recordings_path
+from lib.corenlp.stand_in_server import StandInServer
+
+recordings_path: pathlib.Path = get_default_recordings_path(pathlib.Path(__file__).parent.parent)
+reference_date: date = date(2022, 2, 24)
+
+
+def send_request(url: str, sentence: str, day: date = reference_date) -> requests.Response:
+    properties: dict = {"date": f"{day.isoformat()}T12:00:00", "annotators": "ner", "outputFormat": "json"}
+    return requests.post(f"{url}/?properties={json.dumps(properties)}", data=sentence.encode("utf-8"))
+
+
+@pytest.fixture
+def replay_server():
+    server = StandInServer(RecordingStore(recordings_path), port=0).start()
+    yield server
+    server.stop()
+
+
+def test_recordings_cover_annotated_queries():
+    store = RecordingStore(recordings_path)
+    with open(recordings_path.parent / "annotated_queries.json") as query_file:
+        queries = json.load(query_file)
+
+    for query in queries:
+        assert store.get(query["query"], reference_date, exact=True) is not None
+
+
+def test_replay_returns_recorded_response(replay_server):
+    response = send_request(replay_server.url, "How many cases did we have yesterday?").json()
+
+    mention = response["sentences"][0]["entitymentions"][0]
+    assert mention["text"] == "yesterday"
+    assert mention["timex"]["value"] == "2022-02-23"
+
+
+def test_replay_unknown_sentence_has_no_entities(replay_server):
+    response = send_request(replay_server.url, "This sentence was never recorded.").json()
+
+    assert response == {"sentences": []}
+    assert replay_server.misses == 1
+
+
+def test_exact_replay_rejects_other_reference_dates():
+    server = StandInServer(RecordingStore(recordings_path), port=0, exact=True).start()
+    try:
+        assert send_request(server.url, "How many cases did we have yesterday?").status_code == 200
+        assert send_request(server.url, "How many cases did we have yesterday?",
+                            date(2022, 3, 1)).status_code == 500
+    finally:
+        server.stop()
+
+
+def test_record_stores_upstream_response(replay_server, tmp_path):
+    store = RecordingStore(tmp_path / "recordings.json")
+    recorder = StandInServer(store, port=0, mode="record", upstream_url=replay_server.url).start()
+    try:
+        response = send_request(recorder.url, "How many people got vaccinated today?").json()
+    finally:
+        recorder.stop()
+
+    assert response["sentences"][0]["entitymentions"][0]["text"] == "today"
+    recordings = RecordingStore(tmp_path / "recordings.json")
+    assert recordings.get("How many people got vaccinated today?", reference_date, exact=True) == response
+    assert recordings.synthetic_count == 0
+
+
+def test_recorded_response_replaces_synthetic_one(tmp_path):
+    store = RecordingStore(recordings_path)
+    synthetic_count = store.synthetic_count
+    store.add("How many cases did we have yesterday?", reference_date, {"sentences": []})
+    store.save(tmp_path / "recordings.json")
+
+    assert RecordingStore(tmp_path / "recordings.json").synthetic_count == max(synthetic_count - 1, 0)
@@ -0,0 +1,165 @@
+import itertools
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from lib.config.dataset_registry import get_dataset_registry
+from lib.database.data_store import DataStore, DataTable, build_range_index, build_prefix_sums
+from lib.database.dataset_handler import DatasetHandler
+from lib.database.entities import create_tables
+from lib.database.querier import Querier
+from lib.database.snapshot import Snapshot
+from lib.nlu.intent.calculation_type import CalculationType
+from lib.nlu.intent.intent import Intent
+from lib.nlu.intent.measurement_type import MeasurementType
+from lib.nlu.intent.value_domain import ValueDomain
+from lib.nlu.intent.value_type import ValueType
+from lib.nlu.message import Message
+from lib.nlu.slot.date import Date
+from lib.nlu.slot.slots import Slots
+from lib.nlu.topic.topic import Topic
+
+cases = get_dataset_registry().datasets["cases"]
+
+
+def get_data(factor: int = 1) -> pd.DataFrame:
+    data = pd.DataFrame({
+        "date": ["2022-01-01", "2022-01-02", "2022-01-04", "2022-01-01", "2022-01-02", "2022-01-03", "2022-01-01",
+                 "2022-01-03"],
+        "location": ["Austria", "Austria", "Austria", "World", "World", "World", "Germany", "Germany"],
+        "location_normalized": ["austria", "austria", "austria", "world", "world", "world", "germany", "germany"],
+        "cases": [10.0 * factor, np.nan, 5.0, 100.0, 200.0, 300.0, 3.0, 7.0],
+        "cumulative_cases": [10 * factor, 10 * factor, 10 * factor + 5, 100, 300, 600, 3, 10],
+    })
+    for column in cases.derived_columns:
+        data[column] = np.arange(len(data)) / 4
+    data["id"] = np.arange(1, len(data) + 1)
+    return data
+
+
+def get_snapshot(data: pd.DataFrame) -> Snapshot:
+    return Snapshot("cases", "source", str(pd.util.hash_pandas_object(data).sum()), data)
+
+
+def test_publish_round_trip(tmp_path):
+    DataStore.publish(tmp_path, [(cases, get_snapshot(get_data()))])
+    table = DataStore(directory=tmp_path).get_table("cases")
+
+    assert table.start_date == date(2022, 1, 1) and table.days == 4
+    assert table.location_names == ["Austria", "Germany", "World"]
+    row = table.get_location_row(["austria"])
+    np.testing.assert_array_equal(table.present[row], [1, 1, 0, 1])
+    np.testing.assert_array_equal(table.columns["cases"][row], [10.0, np.nan, np.nan, 5.0])
+    np.testing.assert_array_equal(table.columns["cumulative_cases"][row], [10, 10, np.nan, 15])
+    assert table.to_result("cases", 5.0) == 5 and isinstance(table.to_result("cases", 5.0), int)
+    assert isinstance(table.to_result("cases_per_100k", 5.0), float)
+    assert table.get_day_range((date(2021, 12, 1), date(2022, 1, 2))) == (0, 2)
+
+
+def test_refresh(tmp_path):
+    store = DataStore(directory=tmp_path)
+    assert store.get_table("cases") is None
+
+    first_version = DataStore.publish(tmp_path, [(cases, get_snapshot(get_data()))])
+    assert store.refresh() and store.version == first_version
+    old_table = store.get_table("cases")
+    # Publishing the same data again doesn't create a new version.
+    assert DataStore.publish(tmp_path, [(cases, get_snapshot(get_data()))]) == first_version
+    assert not store.refresh()
+
+    second_version = DataStore.publish(tmp_path, [(cases, get_snapshot(get_data(2)))])
+    assert second_version != first_version
+    assert store.refresh() and store.version == second_version
+    assert store.get_table("cases").columns["cases"][0, 0] == 20.0
+    # Queries that still use the previous version can finish with it.
+    assert old_table.columns["cases"][0, 0] == 10.0
+
+
+def test_extreme_day():
+    random = np.random.default_rng(0)
+    values = random.integers(0, 50, (3, 300)).astype(float)
+    values[random.random(values.shape) < 0.3] = np.nan
+    values[2, :] = np.nan
+    table = DataTable(date(2022, 1, 1), 300, {}, [], np.ones(values.shape), {"cases": values}, set(),
+                      {"cases": {"max": build_range_index(values), "min": build_range_index(-values)}})
+
+    for start, end in [(0, 300), (5, 6), (3, 40), (31, 97), (64, 128), (100, 299)] + \
+            [tuple(sorted(random.integers(0, 301, 2).tolist())) for _ in range(200)]:
+        for row in range(3):
+            for maximum in [True, False]:
+                keys = values[row, start:end] if maximum else -values[row, start:end]
+                expected = None if np.isnan(keys).all() else start + int(np.nanargmax(keys))
+                assert table.get_extreme_day("cases", row, start, end, maximum) == expected
+
+
+def test_sum():
+    values = np.array([[1.0, np.nan, 2.0, np.nan], [np.nan, np.nan, np.nan, 4.0]])
+    sums, counts = build_prefix_sums(values)
+    table = DataTable(date(2022, 1, 1), 4, {}, [], np.ones(values.shape), {"cases": values}, set(),
+                      {"cases": {"sum": sums, "count": counts}})
+
+    np.testing.assert_array_equal(table.get_sum("cases", 0, 4), [3.0, 4.0])
+    np.testing.assert_array_equal(table.get_sum("cases", 1, 3), [2.0, np.nan])
+    assert np.isnan(table.get_sum("cases", 1, 2, 0))
+    assert np.isnan(table.get_sum("cases", 2, 2, 1))
+
+
+@pytest.fixture
+def queriers(tmp_path):
+    data = get_data()
+    data["date"] = pd.to_datetime(data["date"]).dt.date
+    engine = create_engine("sqlite://")
+    create_tables(engine)
+    locations = DatasetHandler.build_locations(data, pd.DataFrame({"id": [], "name": []}))
+    locations.to_sql(name="locations", con=engine, if_exists="append", index=False)
+    DatasetHandler.build_entries(data, locations).to_sql(name="cases", con=engine, if_exists="append", index=False)
+    DataStore.publish(tmp_path, [(cases, get_snapshot(data))])
+    return Querier(engine=engine), Querier(engine=engine, data_store=DataStore(directory=tmp_path))
+
+
+@pytest.mark.parametrize("calculation_type", [CalculationType.RAW_VALUE, CalculationType.SUM,
+                                              CalculationType.MAXIMUM, CalculationType.MINIMUM])
+def test_store_answers_like_database(queriers, calculation_type, monkeypatch):
+    sql_querier, store_querier = queriers
+    # All of these queries can be answered from the store alone.
+    monkeypatch.setattr(store_querier, "_query_number", None)
+    dates = [None, Date("DAY", date(2022, 1, 2), ""), Date("DAY", date(2022, 1, 3), ""),
+             Date("WEEK", date(2022, 1, 4), ""), Date("MONTH", date(2022, 1, 1), ""),
+             Date("MONTH", date(2022, 2, 1), ""), Date("RANGE", date(2022, 1, 2), "", date(2022, 1, 4)),
+             Date("RANGE", date(2021, 12, 1), "", date(2021, 12, 31))]
+    for slot_date, location, measurement_type in itertools.product(
+            dates, [None, "austria", "atlantis"], [MeasurementType.DAILY, MeasurementType.CUMULATIVE]):
+        msg = Message(Topic.CASES, Intent(calculation_type, ValueType.NUMBER, ValueDomain.POSITIVE_CASES,
+                                          measurement_type), Slots(slot_date, location))
+        today = date(2022, 3, 1)
+        assert store_querier.query_intent(msg, today) == sql_querier.query_intent(msg, today)
+
+
+@pytest.mark.parametrize("calculation_type", [CalculationType.MAXIMUM, CalculationType.MINIMUM])
+def test_store_answers_days_like_database(queriers, calculation_type, monkeypatch):
+    sql_querier, store_querier = queriers
+    monkeypatch.setattr(store_querier, "_query_date", None)
+    dates = [None, Date("DAY", date(2022, 1, 2), ""), Date("WEEK", date(2022, 1, 3), ""),
+             Date("RANGE", date(2022, 1, 2), "", date(2022, 1, 3)), Date("MONTH", date(2021, 12, 1), "")]
+    for slot_date, location, measurement_type in itertools.product(
+            dates, [None, "austria", "atlantis"], [MeasurementType.DAILY, MeasurementType.CUMULATIVE]):
+        msg = Message(Topic.CASES, Intent(calculation_type, ValueType.DAY, ValueDomain.POSITIVE_CASES,
+                                          measurement_type), Slots(slot_date, location))
+        today = date(2022, 3, 1)
+        assert store_querier.query_intent(msg, today) == sql_querier.query_intent(msg, today)
+
+
+@pytest.mark.parametrize("calculation_type", [CalculationType.MAXIMUM, CalculationType.MINIMUM])
+def test_store_ranks_locations_like_database(queriers, calculation_type, monkeypatch):
+    sql_querier, store_querier = queriers
+    monkeypatch.setattr(store_querier, "_query_location", None)
+    for slot_date, count in itertools.product([Date("RANGE", date(2022, 1, 1), "", date(2022, 1, 3)),
+                                               Date("RANGE", date(2022, 1, 3), "", date(2022, 1, 4))], [None, 2]):
+        msg = Message(Topic.CASES, Intent(calculation_type, ValueType.LOCATION, ValueDomain.POSITIVE_CASES,
+                                          MeasurementType.DAILY), Slots(slot_date, None))
+        msg.slots.count = count
+        today = date(2022, 3, 1)
+        assert store_querier.query_intent(msg, today) == sql_querier.query_intent(msg, today)
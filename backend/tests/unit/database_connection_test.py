@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+from sqlalchemy import insert, select, inspect
+from sqlalchemy.exc import IntegrityError
+
+from lib.database.bulk_loader import BulkLoader
+from lib.database.database_connection import DatabaseSettings, DatabaseConnection
+from lib.database.entities import Ranking, create_tables, drop_tables
+
+
+def test_settings_from_environment(monkeypatch):
+    for variable in ["COVBOT_DB_URL", "COVBOT_DB_POOL_SIZE", "COVBOT_DB_MAX_OVERFLOW", "COVBOT_DB_POOL_RECYCLE",
+                     "COVBOT_DB_POOL_PRE_PING", "COVBOT_SQLITE_JOURNAL_MODE", "COVBOT_SQLITE_SYNCHRONOUS",
+                     "COVBOT_SQLITE_MMAP_SIZE", "COVBOT_SQLITE_CACHE_SIZE"]:
+        monkeypatch.delenv(variable, raising=False)
+    assert DatabaseSettings.from_environment() == DatabaseSettings()
+
+    monkeypatch.setenv("COVBOT_DB_URL", "mysql+mysqldb://covbot@localhost:3306")
+    monkeypatch.setenv("COVBOT_DB_POOL_SIZE", "20")
+    monkeypatch.setenv("COVBOT_DB_POOL_PRE_PING", "false")
+    monkeypatch.setenv("COVBOT_SQLITE_JOURNAL_MODE", "delete")
+    monkeypatch.setenv("COVBOT_SQLITE_CACHE_SIZE", "")
+    settings = DatabaseSettings.from_environment()
+
+    assert settings.url == "mysql+mysqldb://covbot@localhost:3306"
+    assert settings.pool_size == 20
+    assert settings.pool_pre_ping is False
+    assert settings.sqlite_journal_mode == "DELETE"
+    assert settings.sqlite_cache_size == DatabaseSettings().sqlite_cache_size
+
+
+def test_settings_validate_pragmas():
+    assert DatabaseSettings(sqlite_synchronous="full").sqlite_synchronous == "FULL"
+
+    with pytest.raises(ValueError):
+        DatabaseSettings(sqlite_journal_mode="WAL; DROP TABLE cases")
+    with pytest.raises(ValueError):
+        DatabaseSettings(sqlite_synchronous="SOMETIMES")
+
+
+def test_failed_load_keeps_the_previous_data(tmp_path, monkeypatch):
+    monkeypatch.setenv("COVBOT_DB_PATH", str(tmp_path))
+    engine = DatabaseConnection(DatabaseSettings()).create_engine("covbot_test")
+    table = Ranking.__table__
+    create_tables(engine, [table])
+    with engine.begin() as db_connection:
+        db_connection.execute(insert(table).values(id=1, metric="cases", period_type="ALL", rank=1, value=100))
+
+    # The second batch repeats an id, so the load fails after the table was dropped and the first batch was inserted.
+    rankings = pd.DataFrame({"id": [1, 2, 2], "metric": ["cases"] * 3, "period_type": ["ALL"] * 3,
+                             "rank": [1, 2, 3], "value": [300, 200, 100]})
+    with pytest.raises(IntegrityError):
+        with engine.begin() as db_connection:
+            drop_tables(db_connection, [table])
+            create_tables(db_connection, [table])
+            BulkLoader(batch_size=2).load(db_connection, table, rankings)
+
+    with engine.connect() as db_connection:
+        assert db_connection.execute(select(table.c.id, table.c.value)).all() == [(1, 100)]
+    assert [index["name"] for index in inspect(engine).get_indexes("rankings")] == ["ix_rankings_lookup"]
+    engine.dispose()
@@ -0,0 +1,71 @@
+from datetime import date
+
+import pandas as pd
+
+from lib.database.dataset_handler import DatasetHandler
+from lib.database.entities import LocationKind, day_number_epoch
+
+
+def test_build_rankings():
+    data = pd.DataFrame({
+        "date": ["2022-02-21", "2022-02-22", "2022-02-21", "2022-02-22", "2022-02-21", "2022-02-28"],
+        "location": ["Austria", "Austria", "Germany", "Germany", "World", "Germany"],
+        "location_normalized": ["austria", "austria", "germany", "germany", "world", "germany"],
+        "cases": [100, 300, 250, None, 1000, 50],
+    })
+    rankings = DatasetHandler().build_rankings(data, {"cases": "sum"})
+
+    def ranking(period_type, period_start):
+        rows = rankings[(rankings["period_type"] == period_type) & (rankings["period_start"] == period_start)]
+        return list(rows.sort_values("rank")[["location", "value"]].itertuples(index=False, name=None))
+
+    # The world isn't a country, and days without data aren't ranked.
+    assert ranking("DAY", pd.Timestamp("2022-02-21").date()) == [("Germany", 250), ("Austria", 100)]
+    assert ranking("DAY", pd.Timestamp("2022-02-22").date()) == [("Austria", 300)]
+    assert ranking("WEEK", pd.Timestamp("2022-02-21").date()) == [("Austria", 400), ("Germany", 250)]
+    assert ranking("MONTH", pd.Timestamp("2022-02-01").date()) == [("Austria", 400), ("Germany", 300)]
+    assert ranking("YEAR", pd.Timestamp("2022-01-01").date()) == [("Austria", 400), ("Germany", 300)]
+    assert list(rankings[rankings["period_type"] == "ALL"].sort_values("rank")["location"]) == ["Austria", "Germany"]
+    assert rankings["id"].is_unique
+
+
+def test_rolling_averages_and_per_capita_values():
+    data = pd.DataFrame({
+        "date": ["2022-01-01", "2022-01-02", "2022-01-04", "2022-01-08", "2022-01-01", "2022-01-01"],
+        "location": ["Austria", "Austria", "Austria", "Austria", "Atlantis", "Germany"],
+        "location_normalized": ["austria", "austria", "austria", "austria", "atlantis", "germany"],
+        "cases": [10, 20, None, 60, 5, 40],
+    })
+    handler = DatasetHandler()
+    data = handler._add_per_capita_values(handler._add_rolling_averages(data, ["cases"]), ["cases"])
+    austria = data[data["location"] == "Austria"]
+
+    # The window is 7 calendar days, so the 1st isn't part of the average on the 8th, and missing days are skipped.
+    assert list(austria["cases_7_day_average"]) == [10, 15, 15, 40]
+    assert list(austria["cases_14_day_average"]) == [10, 15, 15, 30]
+    # The groups don't mix.
+    assert data[data["location"] == "Germany"]["cases_7_day_average"].iloc[0] == 40
+
+    population = DatasetHandler.load_population()
+    assert austria["cases_per_100k"].iloc[-1] == 60 / population["austria"] * 100_000
+    assert data[data["location"] == "Atlantis"]["cases_per_100k"].isna().all()
+
+
+def test_build_locations_and_entries():
+    data = pd.DataFrame({
+        "date": ["2022-02-21", "2022-02-22", "2022-02-21", "2022-02-21"],
+        "location": ["Austria", "Austria", "Europe", "World"],
+        "location_normalized": ["austria", "austria", "europe", "world"],
+        "cases": [100, 300, 250, 1000],
+    })
+    existing = pd.DataFrame({"id": [1], "name": ["Germany"], "name_normalized": ["germany"],
+                             "kind": [LocationKind.COUNTRY.value]})
+    locations = DatasetHandler.build_locations(data, existing)
+
+    assert locations.values.tolist() == [[2, "Austria", "austria", LocationKind.COUNTRY],
+                                         [3, "Europe", "europe", LocationKind.CONTINENT],
+                                         [4, "World", "world", LocationKind.WORLD]]
+    entries = DatasetHandler.build_entries(data, pd.concat([existing, locations]))
+    assert entries["location_id"].tolist() == [2, 2, 3, 4]
+    assert entries["day"].tolist() == [(date(2022, 2, 21) - day_number_epoch).days + offset for offset in [0, 1, 0, 0]]
+    assert "date" not in entries and "location" not in entries
@@ -0,0 +1,81 @@
+import copy
+
+import pytest
+import yaml
+
+from lib.config.dataset_registry import DatasetRegistry, get_dataset_registry, check_members
+from lib.database.dataset_handler import DatasetHandler
+from lib.database.snapshot import SnapshotStore
+from lib.nlu.topic import Topic
+
+deaths_declaration = {
+    "deaths": {
+        "url": "https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/jhu/new_deaths.csv",
+        "path_variable": "COVBOT_DEATHS_PATH",
+        "shape": "wide",
+        "table": "deaths",
+        "entity": "Death",
+        "topic": "DEATHS",
+        "trigger_words": ["death", "die", "fatality"],
+        "excluded_locations": ["international"],
+        "columns": {"deaths": "BigInteger"},
+        "cumulative_columns": {"cumulative_deaths": "deaths"},
+        "value_domains": {"DEATHS": {"daily": "deaths", "cumulative": "cumulative_deaths"}},
+    }
+}
+
+
+def test_registry():
+    registry = get_dataset_registry()
+    assert registry.topics == ["CASES", "VACCINATIONS"]
+    vaccinations = registry.get_dataset_by_topic("VACCINATIONS")
+    assert vaccinations.default_value_domain.name == "ADMINISTERED_VACCINES"
+    assert vaccinations.ranking_metrics == {"daily_vaccinations": "sum", "daily_people_vaccinated": "sum",
+                                            "total_vaccinations": "max", "people_vaccinated": "max"}
+    assert registry.datasets["cases"].value_domains[0].measurement_columns["AVERAGE_14_DAYS"] == \
+           "cases_14_day_average"
+    assert registry.get_default_dataset().topic == "CASES"
+    assert registry.get_dataset_by_value_domain("VACCINATED_PEOPLE").topic == "VACCINATIONS"
+
+
+def test_check_members():
+    topics = get_dataset_registry().topics
+    check_members(Topic, topics, ["AMBIGUOUS", "UNKNOWN"])
+
+    with pytest.raises(ValueError):
+        check_members(Topic, topics + ["DEATHS"], ["AMBIGUOUS", "UNKNOWN"])
+    with pytest.raises(ValueError):
+        check_members(Topic, ["CASES"], ["AMBIGUOUS", "UNKNOWN"])
+
+
+def test_load_new_dataset(tmp_path, monkeypatch):
+    registry_path = tmp_path / "datasets.yaml"
+    registry_path.write_text(yaml.safe_dump(deaths_declaration))
+    data_path = tmp_path / "new_deaths.csv"
+    data_path.write_text("date,Austria,International,World\n2022-01-01,3,1,10\n2022-01-02,,1,20\n2022-01-03,5,1,30\n")
+    monkeypatch.setenv("COVBOT_DEATHS_PATH", str(data_path))
+
+    deaths = DatasetRegistry(registry_path).datasets["deaths"]
+    data = DatasetHandler(SnapshotStore(tmp_path / "snapshots")).load_dataset(deaths)
+
+    assert set(data["location"]) == {"Austria", "World"}
+    austria = data[data["location"] == "Austria"]
+    assert list(austria["cumulative_deaths"]) == [3, 8]
+    assert list(austria["deaths_7_day_average"]) == [3, 4]
+    assert set(deaths.derived_columns) <= set(data.columns)
+
+
+def test_inconsistent_declaration(tmp_path):
+    declaration = copy.deepcopy(deaths_declaration)
+    declaration["deaths"]["value_domains"]["DEATHS"]["cumulative"] = "total_deaths"
+    registry_path = tmp_path / "datasets.yaml"
+    registry_path.write_text(yaml.safe_dump(declaration))
+
+    with pytest.raises(ValueError):
+        DatasetRegistry(registry_path)
+
+    declaration = {**copy.deepcopy(deaths_declaration), "cases": copy.deepcopy(deaths_declaration["deaths"])}
+    declaration["deaths"]["default_topic"] = declaration["cases"]["default_topic"] = True
+    registry_path.write_text(yaml.safe_dump(declaration))
+    with pytest.raises(ValueError):
+        DatasetRegistry(registry_path)
@@ -0,0 +1,51 @@
+import json
+import pathlib
+
+import pytest
+
+from lib.benchmark.load import SyntheticQueryGenerator
+from lib.corenlp.recordings import get_default_recordings_path
+from lib.nlu.slot.date_gate import DateGate
+
+tests_path: pathlib.Path = pathlib.Path(__file__).parent.parent
+
+with open(get_default_recordings_path(tests_path)) as recordings_file:
+    recordings = json.load(recordings_file)
+
+with open(tests_path / "annotated_queries.json") as query_file:
+    annotated_queries = json.load(query_file)
+
+
+def get_date_mentions(response: dict) -> list:
+    return [mention for sentence in response["sentences"] for mention in sentence.get("entitymentions", [])
+            if mention["ner"] in ["DATE", "TIME"]]
+
+
+@pytest.mark.parametrize("recording", recordings, ids=lambda recording: recording["sentence"])
+def test_gate_passes_every_date_of_the_responses(recording):
+    # The responses are synthetic until they are recorded from a CoreNLP server, see get_default_recordings_path.
+    for mention in get_date_mentions(recording["response"]):
+        # Every span containing the date has to pass, not only the whole sentence.
+        assert DateGate.could_contain_date(mention["text"])
+
+
+@pytest.mark.parametrize("query", annotated_queries, ids=lambda query: query["query"])
+def test_gate_passes_every_annotated_date(query):
+    if query["slots"]["timeframe"] is not None:
+        assert DateGate.could_contain_date(query["slots"]["timeframe"]["text"])
+        assert DateGate.could_contain_date(query["query"])
+
+
+def test_gate_passes_every_synthetic_date():
+    for date in SyntheticQueryGenerator.dates:
+        assert DateGate.could_contain_date(date)
+
+
+def test_gate_skips_questions_without_dates():
+    skipped = [recording["sentence"] for recording in recordings
+               if not DateGate.could_contain_date(recording["sentence"])]
+
+    assert all(not get_date_mentions(recording["response"]) for recording in recordings
+               if recording["sentence"] in skipped)
+    assert "Which country has had the most corona cases?" in skipped
+    assert "How many people are vaccinated in Europe?" in skipped
@@ -1,12 +1,16 @@
 import json
 import pathlib
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import List, Optional, Tuple
+from urllib.parse import urlencode, unquote_plus
 
 import pytest
-from spacy import Language
+from spacy import Language, blank
 from spacy.tokens import Doc
 
+from lib.nlu.slot import date as date_module
 from lib.nlu.slot.date import DateRecognizer, Date
 from tests.common import queries, spacy, date_recognizer
 
@@ -32,6 +36,19 @@ date_tuples = [
     (Date("YEAR", datetime(2022, 1, 1).date(), None), "this year"),
     (Date("YEAR", datetime(2023, 2, 8).date(), None), "next year"),
     (Date("YEAR", datetime(2020, 2, 8).date(), None), "in 2020"),
+    (Date("RANGE", datetime(2022, 1, 3).date(), None, datetime(2022, 2, 20).date()),
+     "between January 3rd 2022 and February 20th 2022"),
+]
+
+range_tuples = [
+    ("between March 3 and April 20", [("March 3", "2022-03-03"), ("April 20", "2022-04-20")],
+     Date("RANGE", datetime(2022, 3, 3).date(), "March 3 - April 20", datetime(2022, 4, 20).date())),
+    ("from March to May", [("March", "2022-03"), ("May", "2022-05")],
+     Date("RANGE", datetime(2022, 3, 1).date(), "March - May", datetime(2022, 5, 31).date())),
+    ("on March 3 and April 20", [("March 3", "2022-03-03"), ("April 20", "2022-04-20")],
+     Date("DAY", datetime(2022, 3, 3).date(), "March 3")),
+    ("from April 20 to March 3", [("April 20", "2022-04-20"), ("March 3", "2022-03-03")],
+     Date("DAY", datetime(2022, 4, 20).date(), "April 20")),
 ]
 
 
@@ -50,3 +67,109 @@ def test_dates(query):
 @pytest.mark.parametrize("date_tuple", date_tuples)
 def test_date_to_string(date_tuple: Tuple):
     assert Date.generate_date_message(date_tuple[0], today=today) == date_tuple[1]
+
+
+@pytest.mark.parametrize("range_tuple", range_tuples)
+def test_date_ranges(range_tuple: Tuple):
+    text, mentions, expected_date = range_tuple
+    first, second = [{"text": mention, "value": value, "begin": text.index(mention),
+                      "end": text.index(mention) + len(mention)} for mention, value in mentions]
+    if DateRecognizer._is_range(text, first, second):
+        assert date_recognizer._parse_range(first, second) == expected_date
+    else:
+        assert date_recognizer._parse_date(first) == expected_date
+
+
+def test_prefetched_dates_are_only_requested_once(monkeypatch):
+    recognizer = DateRecognizer()
+    sentences = []
+    dates = [{"text": "yesterday", "type": "DATE", "value": "2022-02-23", "begin": 21, "end": 30}]
+
+    def send_request(sentence):
+        sentences.append(sentence)
+        time.sleep(0.05)
+        return dates
+
+    monkeypatch.setattr(recognizer, "send_request", send_request)
+    recognizer.prefetch("How many cases were yesterday?")
+    recognizer.prefetch("How many cases were yesterday?")
+    assert recognizer._request_dates("How many cases were yesterday?") == dates
+    assert recognizer._request_dates("How many cases were yesterday?") == dates
+    assert sentences == ["How many cases were yesterday?"]
+
+
+def test_prefetched_dates_time_out(monkeypatch):
+    monkeypatch.setenv("COVBOT_CORENLP_TIMEOUT", "0.2")
+    recognizer = DateRecognizer()
+    response = threading.Event()
+    monkeypatch.setattr(recognizer, "send_request", lambda sentence: response.wait() and [])
+
+    recognizer.prefetch("How many cases were there yesterday?")
+    assert recognizer._request_dates("How many cases were there yesterday?") == []
+    # The other questions of the message don't wait for the same request again.
+    start = time.perf_counter()
+    assert recognizer._request_dates("How many cases were there yesterday?") == []
+    assert time.perf_counter() - start < 0.1
+    response.set()
+
+
+def test_failed_prefetch_is_answered_without_dates(monkeypatch):
+    recognizer = DateRecognizer()
+    sentences = []
+
+    def send_request(sentence):
+        sentences.append(sentence)
+        raise ConnectionError("CoreNLP is down")
+
+    monkeypatch.setattr(recognizer, "send_request", send_request)
+    recognizer.prefetch("How many cases were there yesterday?")
+    assert recognizer._request_dates("How many cases were there yesterday?") == []
+    assert recognizer._request_dates("How many cases were there yesterday?") == []
+    assert sentences == ["How many cases were there yesterday?"]
+
+    # The next message tries again.
+    recognizer.prefetch("How many cases were there yesterday?")
+    assert recognizer._request_dates("How many cases were there yesterday?") == []
+    assert len(sentences) == 2
+
+
+class CoreNLPResponse:
+    """The response of the CoreNLP server to a request for the dates in the body."""
+    def __init__(self, body: str, mentions: List[Tuple[str, str]]):
+        self.body: str = body
+        self.mentions: List[Tuple[str, str]] = mentions
+
+    def json(self) -> dict:
+        # The server annotates the whole body, so the offsets are offsets into the body, like in the server's output.
+        return {"sentences": [{"index": 0, "entitymentions": [{
+            "text": text,
+            "characterOffsetBegin": self.body.index(text),
+            "characterOffsetEnd": self.body.index(text) + len(text),
+            "ner": "DATE",
+            "normalizedNER": value,
+            "timex": {"tid": f"t{index + 1}", "type": "DATE", "value": value},
+        } for index, (text, value) in enumerate(self.mentions)]}]}
+
+
+def test_dates_are_found_in_their_question(monkeypatch):
+    monkeypatch.setenv("COVBOT_DATE_GATE", "0")
+    bodies = []
+
+    def post(url, data):
+        # Form data arrives at the server encoded, with the "data=" in front of the text.
+        body = data.decode("utf-8") if isinstance(data, bytes) else unquote_plus(urlencode(data))
+        bodies.append(body)
+        return CoreNLPResponse(body, [("yesterday", "2022-03-01"), ("last week", "2022-W08")])
+
+    monkeypatch.setattr(date_module.requests, "post", post)
+    doc = blank("en")("How many cases were there in Germany yesterday? And in Austria last week?")
+    question_end = doc.text.index("?") + 1
+    first_question = doc.char_span(0, question_end)
+    second_question = doc.char_span(question_end + 1, len(doc.text))
+
+    recognizer = DateRecognizer()
+    assert recognizer.recognize_date(first_question) == Date("DAY", datetime(2022, 3, 1).date(), "yesterday")
+    assert recognizer.recognize_date(second_question) == \
+        Date("WEEK", datetime(2022, 2, 21).date(), "last week")
+    # The text is sent as it is, so the offsets of the dates are offsets into the text.
+    assert bodies == [doc.text]
@@ -0,0 +1,31 @@
+from lib.benchmark.evaluation import ConfusionMatrix, get_evaluated_fields
+
+
+def test_confusion_matrix():
+    matrix = ConfusionMatrix()
+    for gold, predicted in [("DAY", "DAY"), ("DAY", "DAY"), ("WEEK", "DAY"), ("NONE", "NONE")]:
+        matrix.add(gold, predicted)
+
+    assert matrix.total == 4
+    assert matrix.accuracy == 0.75
+    assert matrix.labels == ["DAY", "NONE", "WEEK"]
+    assert matrix.confusions() == [("WEEK", "DAY", 1)]
+    assert matrix.render().splitlines()[3].split() == ["WEEK", "1", "0", "0"]
+
+
+def test_get_evaluated_fields():
+    annotated_query = {
+        "query": "How many new cases have been reported in Austria today?",
+        "topic": "CASES",
+        "intent": {"calculation_type": "RAW_VALUE", "value_type": "NUMBER", "value_domain": "POSITIVE_CASES",
+                   "measurement_type": "DAILY"},
+        "slots": {"timeframe": {"type": "DAY", "text": "today"}, "location": "Austria"},
+    }
+    assert get_evaluated_fields(annotated_query) == {
+        "topic": "CASES", "calculation_type": "RAW_VALUE", "value_type": "NUMBER", "value_domain": "POSITIVE_CASES",
+        "measurement_type": "DAILY", "date_type": "DAY", "location": "austria"
+    }
+
+    annotated_query["slots"] = {"timeframe": None, "location": None}
+    fields = get_evaluated_fields(annotated_query)
+    assert fields["date_type"] == "NONE" and fields["location"] == "NONE"
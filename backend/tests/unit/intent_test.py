@@ -4,6 +4,8 @@ import pathlib
 import pytest
 
 from lib.nlu.intent import IntentRecognizer, ValueDomain, CalculationType, MeasurementType, ValueType
+from lib.nlu.intent.intent import IntentFeatures
+from lib.nlu.topic import Topic
 from tests.common import queries, spacy, intent_recognizer
 
 
@@ -33,3 +35,81 @@ def test_value_type(query):
     doc = spacy(query["query"])
     predicted_value_type = intent_recognizer.recognize_value_type(doc[:])
     assert predicted_value_type == ValueType.from_str(query["intent"]["value_type"])
+
+
+@pytest.mark.parametrize("query", queries)
+def test_intent(query):
+    doc = spacy(query["query"])
+    predicted_intent = intent_recognizer.recognize_intent(doc[:])
+    assert predicted_intent.value_domain == ValueDomain.from_str(query["intent"]["value_domain"])
+    assert predicted_intent.value_type == ValueType.from_str(query["intent"]["value_type"])
+    assert predicted_intent.calculation_type == CalculationType.from_str(query["intent"]["calculation_type"])
+    assert predicted_intent.measurement_type == MeasurementType.from_str(query["intent"]["measurement_type"])
+
+
+@pytest.mark.parametrize("matched_patterns,date_type,topic,expected", [
+    ({"how_many", "cases_trigger"}, "DAY", Topic.CASES,
+     (CalculationType.RAW_VALUE, ValueType.NUMBER, ValueDomain.POSITIVE_CASES, MeasurementType.DAILY)),
+    ({"how_many", "cases_trigger"}, None, Topic.CASES,
+     (CalculationType.RAW_VALUE, ValueType.NUMBER, ValueDomain.POSITIVE_CASES, MeasurementType.CUMULATIVE)),
+    ({"how_many", "vaccinations_trigger", "vaccinated_people_trigger"}, "WEEK", Topic.VACCINATIONS,
+     (CalculationType.SUM, ValueType.NUMBER, ValueDomain.VACCINATED_PEOPLE, MeasurementType.DAILY)),
+    ({"where", "most_trigger_word", "vaccinations_trigger"}, None, Topic.VACCINATIONS,
+     (CalculationType.MAXIMUM, ValueType.LOCATION, ValueDomain.ADMINISTERED_VACCINES, MeasurementType.CUMULATIVE)),
+    ({"when", "least_trigger_word", "cases_trigger"}, "MONTH", Topic.CASES,
+     (CalculationType.MINIMUM, ValueType.DAY, ValueDomain.POSITIVE_CASES, MeasurementType.DAILY)),
+    ({"what_country"}, None, Topic.UNKNOWN,
+     (CalculationType.UNKNOWN, ValueType.LOCATION, ValueDomain.UNKNOWN, MeasurementType.CUMULATIVE)),
+    (set(), None, Topic.UNKNOWN,
+     (CalculationType.UNKNOWN, ValueType.UNKNOWN, ValueDomain.UNKNOWN, MeasurementType.UNKNOWN)),
+    ({"cases_trigger", "average"}, "WEEK", Topic.CASES,
+     (CalculationType.RAW_VALUE, ValueType.NUMBER, ValueDomain.POSITIVE_CASES, MeasurementType.AVERAGE_7_DAYS)),
+    ({"maximum_number", "vaccinations_trigger", "average", "two_weeks"}, None, Topic.VACCINATIONS,
+     (CalculationType.MAXIMUM, ValueType.NUMBER, ValueDomain.ADMINISTERED_VACCINES, MeasurementType.AVERAGE_14_DAYS)),
+    ({"how_many", "cases_trigger", "per_capita"}, None, Topic.CASES,
+     (CalculationType.RAW_VALUE, ValueType.NUMBER, ValueDomain.POSITIVE_CASES, MeasurementType.CUMULATIVE_PER_100K)),
+    ({"when", "most_trigger_word", "cases_trigger", "per_capita"}, None, Topic.CASES,
+     (CalculationType.MAXIMUM, ValueType.DAY, ValueDomain.POSITIVE_CASES, MeasurementType.PER_100K)),
+    ({"what_country", "most_trigger_word", "cases_trigger", "per_capita"}, None, Topic.CASES,
+     (CalculationType.MAXIMUM, ValueType.LOCATION, ValueDomain.POSITIVE_CASES, MeasurementType.UNKNOWN)),
+    ({"where", "most_trigger_word", "vaccinations_trigger", "average"}, "WEEK", Topic.VACCINATIONS,
+     (CalculationType.MAXIMUM, ValueType.LOCATION, ValueDomain.ADMINISTERED_VACCINES, MeasurementType.UNKNOWN)),
+])
+def test_decision_tables(matched_patterns, date_type, topic, expected):
+    intent = IntentRecognizer().resolve_intent(IntentFeatures(frozenset(matched_patterns), date_type, topic))
+    assert (intent.calculation_type, intent.value_type, intent.value_domain, intent.measurement_type) == expected
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("What is the 7-day average of new cases in Austria?", True),
+    ("What was the rolling mean of vaccinations?", True),
+    ("What is the fourteen day mean of cases?", True),
+    ("What was the mean of new cases over the last 7 days?", True),
+    ("What do you mean by cases?", False),
+    ("I mean the cases in Austria.", False),
+])
+def test_average_pattern(text, expected):
+    assert bool(IntentRecognizer.text_patterns["average"].search(text.lower())) == expected
+
+
+@pytest.mark.parametrize("query", queries)
+def test_topic_and_intent(query):
+    doc = spacy(query["query"])
+    topic, intent = intent_recognizer.recognize_topic_and_intent(doc[:])
+    assert topic == Topic.from_str(query["topic"])
+    assert intent == intent_recognizer.recognize_intent(doc[:])
+
+
+def test_features_are_extracted_once_per_span(monkeypatch):
+    recognizer = IntentRecognizer()
+    dates = []
+    monkeypatch.setattr(recognizer._date_recognizer, "recognize_date", lambda span: dates.append(span) and None)
+    doc = spacy("How many cases were there in Austria?")
+
+    recognizer.recognize_value_type(doc[:])
+    recognizer.recognize_value_domain(doc[:])
+    recognizer.recognize_measurement_type(doc[:])
+    assert len(dates) == 1
+
+    recognizer.recognize_value_type(doc[:3])
+    assert len(dates) == 2
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+import requests
+
+from lib.benchmark.load import LoadGenerator
+
+
+class SlowSession:
+    """Stand-in for a requests session talking to a server that needs a fixed time per response."""
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def get(self, url, params=None, timeout=None):
+        time.sleep(self.delay)
+        response = requests.Response()
+        response.status_code = 200
+        return response
+
+
+def test_uniform_schedule_is_evenly_spaced():
+    schedule = list(LoadGenerator("http://localhost", ["q"])._schedule(100.0, 1.0, 4, "uniform"))
+
+    assert schedule == pytest.approx([100.25, 100.5, 100.75])
+
+
+def test_poisson_schedule_is_reproducible():
+    first = list(LoadGenerator("http://localhost", ["q"], seed=1)._schedule(0.0, 100.0, 5, "poisson"))
+    second = list(LoadGenerator("http://localhost", ["q"], seed=1)._schedule(0.0, 100.0, 5, "poisson"))
+
+    assert first == second
+    assert first == sorted(first) and 0 < first[0] and first[-1] < 100
+    # 500 arrivals are expected, the count of a poisson process is within a few standard deviations of it.
+    assert 400 < len(first) < 600
+
+
+def test_queue_delay_is_not_counted_as_latency():
+    load_generator = LoadGenerator("http://localhost", ["q"])
+    load_generator._local.session = SlowSession(0.05)
+
+    result = load_generator._send("q", time.perf_counter() - 0.2)
+
+    assert result.error is None
+    assert result.latency == pytest.approx(0.05, abs=0.03)
+    assert result.queue_delay == pytest.approx(0.2, abs=0.03)
+
+
+def test_open_loop_reports_queue_delay_of_saturated_client(monkeypatch):
+    monkeypatch.setattr(requests, "Session", lambda: SlowSession(0.1))
+    # A single connection can send 10 requests per second, so at 40 per second the requests queue up in the client.
+    run = LoadGenerator("http://localhost", ["q"], concurrency=1).run(0.5, rate=40, arrival="uniform")
+
+    assert run["requests"] == 19
+    assert run["p99_ms"] < 180
+    assert run["queue_delay_p99_ms"] > 1000
@@ -0,0 +1,18 @@
+import logging
+import queue
+
+from lib.util.logger import _DeferredQueueHandler
+
+
+def test_arguments_are_formatted_when_queued():
+    records = queue.SimpleQueue()
+    logger = logging.Logger("test")
+    logger.addHandler(_DeferredQueueHandler(records))
+
+    counts = {"cases": 1}
+    logger.info("Counts: %s", counts)
+    counts["cases"] = 2
+
+    record = records.get_nowait()
+    assert record.getMessage() == "Counts: {'cases': 1}"
+    assert record.args is None
@@ -1,6 +1,6 @@
 import pytest
 
-from lib.nlu.message import MessageValidationCode, Message
+from lib.nlu.message import MessageValidationCode, Message, MessageBuilder
 from tests.common import queries, spacy, message_builder
 
 
@@ -9,4 +9,16 @@ from tests.common import queries, spacy, message_builder
 def test_message_validation(query):
     new_sent = spacy(query["query"])[:]
     message = message_builder.create_message(new_sent)
-    assert Message.validate_message(message) not in MessageValidationCode.get_server_side_error_codes()
\ No newline at end of file
+    assert Message.validate_message(message) not in MessageValidationCode.get_server_side_error_codes()
+
+
+@pytest.mark.parametrize("query,questions", [
+    ("How many cases were there in Austria today?", ["How many cases were there in Austria today?"]),
+    ("How many cases in Austria today and how many vaccinations in Germany?",
+     ["How many cases in Austria today", "how many vaccinations in Germany?"]),
+    ("How many cases were there in Austria and Germany yesterday?",
+     ["How many cases were there in Austria and Germany yesterday?"]),
+])
+def test_split_questions(query, questions):
+    doc = spacy(query)
+    assert [question.text for question in MessageBuilder.split_questions(doc[:])] == questions
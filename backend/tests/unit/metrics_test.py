@@ -0,0 +1,102 @@
+import pytest
+
+from lib.nlu.slot.date import DateRecognizer
+from lib.util.metrics import MetricsRegistry, record_cache_lookup, get_cache_hit_rate, cache_requests, content_type
+
+
+def test_counter_renders_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("covbot_test_total", "Test counter.", ("code", "engine"))
+    counter.inc(code="OK", engine="rules")
+    counter.inc(2, code="OK", engine="rules")
+    counter.inc(code="NO_DATA", engine="classifier")
+
+    assert counter.get(code="OK", engine="rules") == 3
+    assert counter.get(code="OK", engine="classifier") == 0
+    assert counter.render() == [
+        "# HELP covbot_test_total Test counter.",
+        "# TYPE covbot_test_total counter",
+        'covbot_test_total{code="NO_DATA",engine="classifier"} 1',
+        'covbot_test_total{code="OK",engine="rules"} 3',
+    ]
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("covbot_test_seconds", "Test histogram.", ("stage",))
+    histogram.buckets = (0.1, 1.0)
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value, stage="spacy")
+
+    assert histogram.render() == [
+        "# HELP covbot_test_seconds Test histogram.",
+        "# TYPE covbot_test_seconds histogram",
+        'covbot_test_seconds_bucket{stage="spacy",le="0.1"} 2',
+        'covbot_test_seconds_bucket{stage="spacy",le="1.0"} 3',
+        'covbot_test_seconds_bucket{stage="spacy",le="+Inf"} 4',
+        'covbot_test_seconds_sum{stage="spacy"} 2.65',
+        'covbot_test_seconds_count{stage="spacy"} 4',
+    ]
+
+
+def test_histogram_without_labels():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("covbot_test_seconds", "Test histogram.")
+    histogram.buckets = (1.0,)
+    histogram.observe(3)
+
+    assert histogram.render()[2:] == [
+        'covbot_test_seconds_bucket{le="1.0"} 0',
+        'covbot_test_seconds_bucket{le="+Inf"} 1',
+        "covbot_test_seconds_sum 3.0",
+        "covbot_test_seconds_count 1",
+    ]
+
+
+def test_cache_lookups():
+    assert get_cache_hit_rate("test") is None
+
+    record_cache_lookup("test", False)
+    record_cache_lookup("test", True)
+    record_cache_lookup("test", True)
+    record_cache_lookup("test", True)
+
+    assert cache_requests.get(cache="test", result="hit") == 3
+    assert cache_requests.get(cache="test", result="miss") == 1
+    assert get_cache_hit_rate("test") == 0.75
+
+
+def test_corenlp_cache_lookups(monkeypatch):
+    recognizer = DateRecognizer(cache_size=1)
+    sentences = []
+    monkeypatch.setattr(recognizer, "send_request", lambda sentence: sentences.append(sentence) or [])
+    hits = cache_requests.get(cache="corenlp", result="hit")
+    misses = cache_requests.get(cache="corenlp", result="miss")
+
+    recognizer._request_dates("How many cases were there yesterday?")
+    recognizer._request_dates("How many cases were there yesterday?")
+    # The cache only holds one response, so the first one is evicted by the second sentence.
+    recognizer._request_dates("How many cases were there today?")
+    recognizer._request_dates("How many cases were there yesterday?")
+
+    assert cache_requests.get(cache="corenlp", result="hit") == hits + 1
+    assert cache_requests.get(cache="corenlp", result="miss") == misses + 3
+    assert sentences == ["How many cases were there yesterday?", "How many cases were there today?",
+                         "How many cases were there yesterday?"]
+
+
+def test_response():
+    # Flask 2.0 can't be imported together with Werkzeug 3, which isn't pinned in the requirements.
+    flask = pytest.importorskip("flask", exc_type=ImportError)
+    registry = MetricsRegistry()
+    registry.counter("covbot_test_total", "Test counter.", ("code",)).inc(code="OK")
+    # The same response as the one of the /metrics endpoint of app.py, whose import starts the web server.
+    app = flask.Flask(__name__)
+    app.add_url_rule("/metrics", view_func=lambda: flask.Response(registry.render(), mimetype=content_type))
+
+    response = app.test_client().get("/metrics")
+
+    assert response.content_type == "text/plain; version=0.0.4; charset=utf-8"
+    assert response.get_data(as_text=True) == "# HELP covbot_test_total Test counter.\n" \
+                                              "# TYPE covbot_test_total counter\n" \
+                                              'covbot_test_total{code="OK"} 1\n'
@@ -1,14 +1,20 @@
+import dataclasses
 import json
+import os
 import pathlib
 from datetime import datetime, timedelta
 from typing import Optional
 
+import pandas as pd
 import pytest
 from spacy.tokens import Span
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from lib.benchmark.bulk import QueryAnswerer
+from lib.database.database_connection import DatabaseConnection, DatabaseSettings
 from lib.database.database_manager import DatabaseManager
-from lib.database.entities import Vaccination, Case
+from lib.database.entities import Vaccination, Case, Ranking, LocationDimension, LocationKind
 from lib.database.querier import Querier, QueryResult, QueryResultCode
 from lib.nlu.intent.calculation_type import CalculationType
 from lib.nlu.intent.intent import Intent
@@ -25,10 +31,26 @@ from lib.spacy_components.custom_spacy import get_spacy
 # If this is changed, most test cases will need to be changed
 current_day = datetime(2022, 2, 24).date()
 
-
-@pytest.fixture(scope="session")
-def db_manager():
-    db_manager = DatabaseManager("covbot_test")
+# The locations that the entries in the tests refer to, they are added to the location dimension in every test.
+test_locations = [
+    (1, "Austria", "austria", LocationKind.COUNTRY), (2, "Germany", "germany", LocationKind.COUNTRY),
+    (3, "Ukraine", "ukraine", LocationKind.COUNTRY), (4, "World", "world", LocationKind.WORLD),
+    # A location with the same normalized name as another one.
+    (5, "Germany", "ukraine", LocationKind.COUNTRY),
+]
+location_ids = {"Austria": 1, "Germany": 2, "Ukraine": 3, "World": 4, "Germany (Ukraine)": 5}
+
+
+@pytest.fixture(scope="session", params=["sqlite", "server"])
+def db_manager(request):
+    if request.param == "server":
+        # The tests also run against a database server (e.g. MySQL) if one is configured.
+        if not os.environ.get("COVBOT_TEST_DB_URL"):
+            pytest.skip("COVBOT_TEST_DB_URL is not set.")
+        settings = DatabaseSettings(url=os.environ["COVBOT_TEST_DB_URL"])
+    else:
+        settings = dataclasses.replace(DatabaseSettings.from_environment(), url=None)
+    db_manager = DatabaseManager("covbot_test", DatabaseConnection(settings))
     db_manager.create_tables()
 
     yield db_manager
@@ -39,29 +61,31 @@ def db_manager():
 @pytest.fixture(autouse=True)
 def session(db_manager: DatabaseManager):
     session = Session(db_manager.engine)
+    session.add_all([LocationDimension(id=location_id, name=name, name_normalized=name_normalized, kind=kind)
+                     for location_id, name, name_normalized, kind in test_locations])
     yield session
     session.rollback()
 
 
 def add_austria_cases(session):
     cases = [
-        Case(id=1, date=current_day - timedelta(days=9), location="Austria", location_normalized="austria", cases=15000,
+        Case(id=1, day=current_day - timedelta(days=9), location_id=location_ids["Austria"], cases=15000,
              cumulative_cases=15000),
-        Case(id=2, date=current_day - timedelta(days=8), location="Austria", location_normalized="austria", cases=16345,
+        Case(id=2, day=current_day - timedelta(days=8), location_id=location_ids["Austria"], cases=16345,
              cumulative_cases=31345),
-        Case(id=3, date=current_day - timedelta(days=7), location="Austria", location_normalized="austria", cases=8450,
+        Case(id=3, day=current_day - timedelta(days=7), location_id=location_ids["Austria"], cases=8450,
              cumulative_cases=39795),
-        Case(id=4, date=current_day - timedelta(days=6), location="Austria", location_normalized="austria", cases=4560,
+        Case(id=4, day=current_day - timedelta(days=6), location_id=location_ids["Austria"], cases=4560,
              cumulative_cases=40251),
-        Case(id=5, date=current_day - timedelta(days=5), location="Austria", location_normalized="austria", cases=7054,
+        Case(id=5, day=current_day - timedelta(days=5), location_id=location_ids["Austria"], cases=7054,
              cumulative_cases=45060),
-        Case(id=6, date=current_day - timedelta(days=4), location="Austria", location_normalized="austria", cases=10450,
+        Case(id=6, day=current_day - timedelta(days=4), location_id=location_ids["Austria"], cases=10450,
              cumulative_cases=61859),
-        Case(id=7, date=current_day - timedelta(days=2), location="Austria", location_normalized="austria", cases=15392,
+        Case(id=7, day=current_day - timedelta(days=2), location_id=location_ids["Austria"], cases=15392,
              cumulative_cases=77251),
-        Case(id=8, date=current_day - timedelta(days=1), location="Austria", location_normalized="austria", cases=19509,
+        Case(id=8, day=current_day - timedelta(days=1), location_id=location_ids["Austria"], cases=19509,
              cumulative_cases=96760),
-        Case(id=9, date=current_day, location="Austria", location_normalized="austria", cases=12000,
+        Case(id=9, day=current_day, location_id=location_ids["Austria"], cases=12000,
              cumulative_cases=108760),
     ]
     session.add_all(cases)
@@ -69,22 +93,22 @@ def add_austria_cases(session):
 
 def add_austria_vaccinations(session):
     vaccinations = [
-        Vaccination(id=1, date=current_day - timedelta(days=6), location="Austria", location_normalized="austria",
+        Vaccination(id=1, day=current_day - timedelta(days=6), location_id=location_ids["Austria"],
                     total_vaccinations=1200, people_vaccinated=1200, daily_vaccinations=1200,
                     daily_people_vaccinated=1200),
-        Vaccination(id=2, date=current_day - timedelta(days=5), location="Austria", location_normalized="austria",
+        Vaccination(id=2, day=current_day - timedelta(days=5), location_id=location_ids["Austria"],
                     total_vaccinations=2700, people_vaccinated=2500, daily_vaccinations=1500,
                     daily_people_vaccinated=1300),
-        Vaccination(id=3, date=current_day - timedelta(days=4), location="Austria", location_normalized="austria",
+        Vaccination(id=3, day=current_day - timedelta(days=4), location_id=location_ids["Austria"],
                     total_vaccinations=3500, people_vaccinated=3100, daily_vaccinations=800,
                     daily_people_vaccinated=600),
-        Vaccination(id=4, date=current_day - timedelta(days=3), location="Austria", location_normalized="austria",
+        Vaccination(id=4, day=current_day - timedelta(days=3), location_id=location_ids["Austria"],
                     total_vaccinations=6900, people_vaccinated=6100, daily_vaccinations=3400,
                     daily_people_vaccinated=3000),
-        Vaccination(id=5, date=current_day - timedelta(days=2), location="Austria", location_normalized="austria",
+        Vaccination(id=5, day=current_day - timedelta(days=2), location_id=location_ids["Austria"],
                     total_vaccinations=10500, people_vaccinated=9300, daily_vaccinations=3600,
                     daily_people_vaccinated=3200),
-        Vaccination(id=6, date=current_day - timedelta(days=1), location="Austria", location_normalized="austria",
+        Vaccination(id=6, day=current_day - timedelta(days=1), location_id=location_ids["Austria"],
                     total_vaccinations=11000, people_vaccinated=9600, daily_vaccinations=500,
                     daily_people_vaccinated=300),
     ]
@@ -93,13 +117,13 @@ def add_austria_vaccinations(session):
 
 def add_different_countries_vaccinations(session):
     vaccinations = [
-        Vaccination(id=7, date=current_day - timedelta(days=2), location="Austria", location_normalized="austria",
+        Vaccination(id=7, day=current_day - timedelta(days=2), location_id=location_ids["Austria"],
                     total_vaccinations=1200, people_vaccinated=1000, daily_vaccinations=1200,
                     daily_people_vaccinated=1000),
-        Vaccination(id=8, date=current_day - timedelta(days=2), location="Ukraine", location_normalized="ukraine",
+        Vaccination(id=8, day=current_day - timedelta(days=2), location_id=location_ids["Ukraine"],
                     total_vaccinations=3000, people_vaccinated=2400, daily_vaccinations=3000,
                     daily_people_vaccinated=2400),
-        Vaccination(id=9, date=current_day - timedelta(days=2), location="Germany", location_normalized="ukraine",
+        Vaccination(id=9, day=current_day - timedelta(days=2), location_id=location_ids["Germany (Ukraine)"],
                     total_vaccinations=4000, people_vaccinated=1000, daily_vaccinations=4000,
                     daily_people_vaccinated=1000),
     ]
@@ -230,6 +254,33 @@ def test_check_new_cases_this_week_in_austria(querier, session):
     assert qr.result == 46901
 
 
+def test_check_new_cases_in_custom_range_in_austria(querier, session):
+    msg: Message = get_cases_message(calculation_type=CalculationType.SUM,
+                                     slot_date=Date("RANGE", current_day - timedelta(days=8), "",
+                                                    current_day - timedelta(days=5)))
+
+    add_austria_cases(session)
+
+    qr: QueryResult = querier.query_intent(msg, current_day)
+
+    assert qr.result_code == QueryResultCode.SUCCESS
+    assert qr.result == 36409
+
+
+def test_statements_are_reused_for_the_same_intent_shape(querier, session):
+    add_austria_cases(session)
+    querier.query_intent(get_cases_message(slot_date=Date("DAY", current_day, "today")), current_day)
+    statements, misses = len(querier.statement_cache), querier.statement_cache.misses
+
+    # Only the date differs, so the same statements are used.
+    qr: QueryResult = querier.query_intent(get_cases_message(slot_date=Date("DAY", current_day - timedelta(days=1),
+                                                                            "yesterday")), current_day)
+
+    assert qr.result == 19509
+    assert len(querier.statement_cache) == statements and querier.statement_cache.misses == misses
+    assert querier.statement_cache.hit_rate > 0
+
+
 def test_check_new_cases_cumulative_in_austria(querier, session):
     msg: Message = get_cases_message(measurement_type=MeasurementType.CUMULATIVE)
 
@@ -300,6 +351,19 @@ def test_check_when_maximum_new_cases_in_austria(querier, session):
     assert qr.result.value == current_day - timedelta(days=1)
 
 
+def test_check_when_maximum_new_cases_in_austria_in_range(querier, session):
+    msg: Message = get_cases_message(calculation_type=CalculationType.MAXIMUM, value_type=ValueType.DAY,
+                                     slot_date=Date("RANGE", current_day - timedelta(days=9), "",
+                                                    current_day - timedelta(days=5)))
+
+    add_austria_cases(session)
+
+    qr: QueryResult = querier.query_intent(msg, current_day)
+
+    assert qr.result_code == QueryResultCode.SUCCESS
+    assert qr.result.value == current_day - timedelta(days=8)
+
+
 with open(pathlib.Path(__file__).parent.parent / "annotated_queries.json") as query_file:
     queries = json.load(query_file)
 
@@ -316,3 +380,87 @@ def test_all_annotated_queries(querier, query, session):
     add_austria_vaccinations(session)
 
     querier.query_intent(msg, current_day)
+
+
+def test_reply_to_two_questions(querier, session):
+    # Answers the questions the same way get_reply in app.py does.
+    answerer = QueryAnswerer(today=current_day, querier=querier)
+
+    add_austria_cases(session)
+    add_austria_vaccinations(session)
+
+    record = answerer.answer("How many new cases have been reported in Austria today? And how many people got "
+                             "vaccinated in Austria yesterday?")
+
+    assert "error" not in record
+    assert [message["topic"] for message in record["messages"]] == ["CASES", "VACCINATIONS"]
+    assert record["result_codes"] == ["SUCCESS", "SUCCESS"]
+    assert "12,000" in record["answer"] and "300" in record["answer"]
+
+
+def add_different_countries_cases(session):
+    cases = [
+        Case(id=20 + index, day=current_day - timedelta(days=days_ago), location_id=location_ids[location],
+             cases=cases, cumulative_cases=None)
+        for index, (days_ago, location, cases) in enumerate([
+            (3, "Austria", 500), (2, "Austria", 700), (3, "Germany", 900), (2, "Germany", 100), (3, "Ukraine", 400),
+            (2, "Ukraine", 450), (2, "World", 5000)
+        ])
+    ]
+    session.add_all(cases)
+
+
+def read_cases(session) -> pd.DataFrame:
+    """Reads the cases with the names of their locations and their dates, as in the preprocessed data."""
+    statement = select(Case.__table__, LocationDimension.name.label("location"),
+                       LocationDimension.name_normalized.label("location_normalized")).join_from(Case, LocationDimension)
+    return pd.read_sql(statement, session.connection()).rename(columns={"day": "date"})
+
+
+def test_check_top_countries_with_most_cases_this_week(querier, session):
+    msg: Message = get_cases_message(calculation_type=CalculationType.MAXIMUM, value_type=ValueType.LOCATION,
+                                     slot_date=Date("WEEK", current_day - timedelta(days=3), "this week"),
+                                     slot_location=None)
+    msg.slots.count = 2
+
+    add_different_countries_cases(session)
+
+    qr: QueryResult = querier.query_intent(msg, current_day)
+
+    assert qr.result_code == QueryResultCode.SUCCESS
+    assert qr.result == [("Austria", 1200), ("Germany", 1000)]
+
+
+def test_check_top_countries_with_fewest_cases_from_rankings(querier, session, db_manager):
+    msg: Message = get_cases_message(calculation_type=CalculationType.MINIMUM, value_type=ValueType.LOCATION,
+                                     slot_date=Date("WEEK", current_day - timedelta(days=3), "this week"),
+                                     slot_location=None)
+    msg.slots.count = 3
+
+    add_different_countries_cases(session)
+    session.flush()
+    cases = read_cases(session)
+    rankings = db_manager.dataset_handler.build_rankings(cases, {"cases": "sum"})
+    session.add_all([Ranking(**row) for row in rankings.to_dict("records")])
+
+    qr: QueryResult = querier.query_intent(msg, current_day)
+
+    assert qr.result_code == QueryResultCode.SUCCESS
+    assert qr.result == [("Ukraine", 850), ("Germany", 1000), ("Austria", 1200)]
+
+
+def test_check_latest_7_day_average_cases_in_austria(querier, session, db_manager):
+    msg: Message = get_cases_message(measurement_type=MeasurementType.AVERAGE_7_DAYS, slot_date=None)
+
+    add_austria_cases(session)
+    session.flush()
+    cases = read_cases(session)
+    averages = db_manager.dataset_handler._add_rolling_averages(cases, ["cases"])
+    for row in averages.itertuples():
+        session.get(Case, row.id).cases_7_day_average = row.cases_7_day_average
+
+    qr: QueryResult = querier.query_intent(msg, current_day)
+
+    assert qr.result_code == QueryResultCode.SUCCESS
+    # The 7 days up to today, without the missing day 3 days ago.
+    assert qr.result == pytest.approx((4560 + 7054 + 10450 + 15392 + 19509 + 12000) / 6)
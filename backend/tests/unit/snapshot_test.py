@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from lib.config.dataset_registry import get_dataset_registry
+from lib.database.snapshot import SnapshotStore
+
+cases = get_dataset_registry().datasets["cases"]
+
+
+def get_data():
+    return pd.DataFrame({
+        "date": ["2022-01-01", "2022-01-02", "2022-01-01"],
+        "location": ["Austria", "Austria", None],
+        "cases": [10.0, np.nan, 3.0],
+        "id": [1, 2, 3],
+    })
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = SnapshotStore(tmp_path)
+    saved = store.save(cases, get_data(), "source")
+
+    loaded = store.load(cases, "source")
+    pd.testing.assert_frame_equal(loaded.data, get_data())
+    assert loaded.content_hash == saved.content_hash
+    # The snapshot is only valid for the sources it was built from.
+    assert store.load(cases, "other source") is None
+
+
+def test_content_hash(tmp_path):
+    store = SnapshotStore(tmp_path)
+    first = store.save(cases, get_data(), "source")
+    second = store.save(cases, get_data(), "other source")
+    changed_data = get_data()
+    changed_data.loc[0, "cases"] = 11.0
+    third = store.save(cases, changed_data, "third source")
+
+    assert first.content_hash == second.content_hash != third.content_hash
+    # Only the latest snapshot is kept.
+    assert len([path for path in (tmp_path / "cases").iterdir() if path.is_dir()]) == 1